@@ -1,8 +1,8 @@
-from flask import Flask, g, render_template, request, redirect, url_for, flash, session
+from flask import Flask, g, render_template, request, redirect, url_for, flash, session, abort, Response
 # from flask_wtf.csrf import CSRFProtect  # Add this import at the top
 from datetime import timedelta
 from config.db_config import DBConfig
-from db import PostgresConnector
+from db import PostgresConnector, ConnectionChecks, TimedQueuePool
 import secrets
 import os
 import time
@@ -21,6 +21,13 @@ from sqlalchemy import text
 from flask.cli import with_appcontext
 
 from extensions import csrf, limiter
+from utils.rate_limit_storage import database_storage_uri  # Registers the ratelimit+postgresql:// storage
+from utils.health import ReadinessCheck
+from utils.read_replicas import init_read_replicas
+from utils.query_stats import init_query_stats
+from utils.metrics import init_request_metrics
+from utils.slow_queries import init_slow_query_log
+from utils.profiling import init_request_profiler
 
 from blueprint.auth import auth_bp
 from blueprint.profile import profile_bp
@@ -69,7 +76,7 @@ else:
         os.environ['RECAPTCHA_SECRET_KEY'] = '6LeIxAcTAAAAAGG-vFI1TnRWxMZNFuojJ4WifJWe'  # Google test key
 
 from blueprint.models import db, User, Profile, Booking, Payment, Report, Rating, TimeSlot, Message
-from blueprint.models import Favourite, AuditLog, PasswordHistory
+from blueprint.models import Favourite, AuditLog, PasswordHistory, PaymentToken, RatingAggregate
 
 app = Flask(__name__)
 
@@ -172,8 +179,115 @@ def str2bool(val, default=False):
         return default
     return val.lower() in ("1", "true", "yes", "y", "on")
 
+# Production (HTTPS, SES, shared counters) or development; several defaults below depend on it
+is_production = os.getenv('FLASK_ENV') == 'production' or os.getenv('ENVIRONMENT') == 'production'
+
+# Validate required environment variables
+required_vars = [
+    "DATABASE_HOST",
+    "DATABASE_PORT",
+    "DATABASE_NAME",
+    "DATABASE_USERNAME",
+    "DATABASE_PASSWORD",
+]
+
+for var in required_vars:
+    if var not in os.environ:
+        print(var)
+        raise EnvironmentError(f"Missing required environment variable: {var}")
+
+# Log non-sensitive variables (for development only)
+if os.environ.get("FLASK_ENV") == "development":
+    print(f"[INFO] Connecting to DB host: {os.environ['DATABASE_HOST']}")
+    print(f"[INFO] DB port: {os.environ['DATABASE_PORT']}")
+    print(f"[INFO] DB name: {os.environ['DATABASE_NAME']}")
+
+# Persistent database connection
+config = DBConfig(
+    # Matches the service name in docker-compose.yml
+    host=os.environ["DATABASE_HOST"],
+    # Internal port (not the mapped host port)
+    # port=int(os.environ["DATABASE_PORT"]),
+    port=int(os.environ["DATABASE_PORT"]),
+    database=os.environ["DATABASE_NAME"],
+    user=os.environ["DATABASE_USERNAME"],
+    password=os.environ["DATABASE_PASSWORD"],
+)
+
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# One pool per process for the ORM and PostgresConnector: size, overflow, recycle, pre-ping and SSL
+# TimedQueuePool reports checkout waits to the request metrics
+engine_options = {**config.engine_options(), 'poolclass': TimedQueuePool}
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+# Streaming replicas for read_only() queries (comma-separated URLs); reads fall back to the primary when
+# a replica lags more than the max lag, and a browser session reads from the primary for that long after writing
+app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS', '')
+app.config['DATABASE_REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('DATABASE_REPLICA_MAX_LAG_SECONDS', '5'))
+app.config['DATABASE_REPLICA_LAG_CHECK_SECONDS'] = float(os.getenv('DATABASE_REPLICA_LAG_CHECK_SECONDS', '1'))
+
+# Payment tokens: 'database' is shared by all gunicorn workers, 'memory' is per-process (tests/dev)
+app.config['PAYMENT_TOKEN_STORE'] = os.getenv('PAYMENT_TOKEN_STORE', 'database')
+app.config['PAYMENT_TOKEN_TTL_SECONDS'] = int(os.getenv('PAYMENT_TOKEN_TTL_SECONDS', '300'))
+
+# /readyz result is cached per worker for this long
+app.config['HEALTH_READY_TTL_SECONDS'] = float(os.getenv('HEALTH_READY_TTL_SECONDS', '5'))
+
+# Audit log: 'async' batches inserts on a background thread, 'sync' writes inline (always used when TESTING)
+app.config['AUDIT_LOG_MODE'] = os.getenv('AUDIT_LOG_MODE', 'async')
+app.config['AUDIT_LOG_BATCH_SIZE'] = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '100'))
+app.config['AUDIT_LOG_FLUSH_INTERVAL'] = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+app.config['AUDIT_LOG_QUEUE_SIZE'] = int(os.getenv('AUDIT_LOG_QUEUE_SIZE', '10000'))
+# audit_log is partitioned by month: partitions created ahead, and months older than the retention dropped
+app.config['AUDIT_LOG_PARTITIONS_AHEAD'] = int(os.getenv('AUDIT_LOG_PARTITIONS_AHEAD', '3'))
+app.config['AUDIT_LOG_RETENTION_MONTHS'] = int(os.getenv('AUDIT_LOG_RETENTION_MONTHS', '12'))
+
+# Rate limit counters: 'database' shares them across workers and hosts, 'memory' is per process.
+# RATELIMIT_STORAGE_URI overrides both with any limits backend, e.g. redis://host:6379
+app.config['RATE_LIMIT_STORE'] = os.getenv('RATE_LIMIT_STORE', 'database')
+app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI') or (
+    database_storage_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    if app.config['RATE_LIMIT_STORE'] == 'database' else 'memory://'
+)
+if app.config['RATE_LIMIT_STORE'] == 'database' and not os.getenv('RATELIMIT_STORAGE_URI'):
+    # Counters go through the app's pool (DBConfig) rather than a second pool per worker
+    app.config['RATELIMIT_STORAGE_OPTIONS'] = {'engine': lambda: db.engine}
+# fixed-window or sliding-window-counter
+app.config['RATELIMIT_STRATEGY'] = os.getenv('RATELIMIT_STRATEGY', 'fixed-window')
+# Failed-login counters per IP/email: 'memory' (per worker) or 'shared' (the rate limit storage).
+# Production shares them, or each gunicorn worker would allow its own MAX_FAILED_ATTEMPTS before a lockout
+app.config['LOGIN_THROTTLE_STORE'] = os.getenv('LOGIN_THROTTLE_STORE', 'shared' if is_production else 'memory')
+app.config['LOGIN_THROTTLE_WINDOW_SECONDS'] = int(os.getenv('LOGIN_THROTTLE_WINDOW_SECONDS', '900'))
+# If the counter store is unreachable, count in memory rather than failing requests
+app.config['RATELIMIT_IN_MEMORY_FALLBACK_ENABLED'] = True
+app.config['RATELIMIT_SWALLOW_ERRORS'] = True
+
+# Dashboard tiles are cached per worker for this long (0 disables caching). Changes invalidate them in
+# every worker through per-user version counters in DASHBOARD_VERSION_STORAGE_URI: any limits backend,
+# e.g. redis://host:6379 to keep the check on each cache hit off the database. Defaults to the rate
+# limit storage; memory:// only invalidates the worker that made the change
+app.config['DASHBOARD_CACHE_TTL_SECONDS'] = int(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', '30'))
+if os.getenv('DASHBOARD_VERSION_STORAGE_URI'):
+    app.config['DASHBOARD_VERSION_STORAGE_URI'] = os.getenv('DASHBOARD_VERSION_STORAGE_URI')
+else:
+    app.config['DASHBOARD_VERSION_STORAGE_URI'] = app.config['RATELIMIT_STORAGE_URI']
+    app.config['DASHBOARD_VERSION_STORAGE_OPTIONS'] = app.config.get('RATELIMIT_STORAGE_OPTIONS', {})
+
+# Outgoing email is queued in email_outbox and sent by `flask email-worker` via smtp, ses or console.
+# Production defaults to SES, which sent this mail before the outbox; console only prints it
+app.config['EMAIL_TRANSPORT'] = os.getenv('EMAIL_TRANSPORT', 'ses' if is_production else 'console')
+app.config['EMAIL_SENDER'] = os.getenv('EMAIL_SENDER') or os.getenv('SES_SENDER_EMAIL') or os.getenv('SMTP_USERNAME')
+app.config['SMTP_SERVER'] = os.getenv('SMTP_SERVER')
+app.config['SMTP_PORT'] = int(os.getenv('SMTP_PORT', '587'))
+app.config['SMTP_USERNAME'] = os.getenv('SMTP_USERNAME')
+app.config['SMTP_PASSWORD'] = os.getenv('SMTP_PASSWORD')
+app.config['SMTP_STARTTLS'] = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+app.config['EMAIL_WORKER_BATCH_SIZE'] = int(os.getenv('EMAIL_WORKER_BATCH_SIZE', '50'))
+app.config['EMAIL_WORKER_POLL_SECONDS'] = float(os.getenv('EMAIL_WORKER_POLL_SECONDS', '5'))
+# Touched on every worker loop; the email-worker container's healthcheck checks it is recent
+app.config['EMAIL_WORKER_HEARTBEAT_FILE'] = os.getenv('EMAIL_WORKER_HEARTBEAT_FILE')
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', '5'))
+app.config['EMAIL_RETRY_BASE_SECONDS'] = int(os.getenv('EMAIL_RETRY_BASE_SECONDS', '30'))
 
 # CSRF Configuration
 app.config['WTF_CSRF_ENABLED'] = True
@@ -182,8 +296,6 @@ app.config['WTF_CSRF_SECRET_KEY'] = os.getenv('CSRF_SECRET_KEY')
 
 # Secure Session Configuration
 # Check if we're in production (HTTPS) or development (HTTP)
-is_production = os.getenv('FLASK_ENV') == 'production' or os.getenv('ENVIRONMENT') == 'production'
-
 if is_production:
     # Production security settings (HTTPS required)
     app.config['WTF_CSRF_SSL_STRICT'] = True  # Require HTTPS for CSRF
@@ -202,6 +314,9 @@ app.config['SESSION_COOKIE_NAME'] = 'safe_companions_session'  # Custom session
 
 csrf.init_app(app)
 
+# Load tests log in more users per minute than the auth limits allow from one IP; never off in production
+app.config['RATELIMIT_ENABLED'] = is_production or os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+
 # Initialize rate limiter
 limiter.init_app(app)
 
@@ -227,8 +342,40 @@ def inject_csrf_token():
         sitekey=os.environ.get('SITEKEY')  # No default - validated at startup
     )
 
+# Per-request query counts and N+1 detection (utils/query_stats.py). Over-budget requests are logged
+# ('warn'), raise QueryBudgetExceeded ('raise', for tests) or not checked ('off')
+app.config['QUERY_BUDGET_MODE'] = os.getenv('QUERY_BUDGET_MODE', 'warn')
+app.config['QUERY_BUDGET_MAX_QUERIES'] = int(os.getenv('QUERY_BUDGET_MAX_QUERIES', '50'))
+app.config['QUERY_BUDGET_MAX_REPEATS'] = int(os.getenv('QUERY_BUDGET_MAX_REPEATS', '10'))
+# X-DB-Queries and Server-Timing response headers
+app.config['QUERY_STATS_HEADER'] = os.getenv('QUERY_STATS_HEADER', str(not is_production)).lower() == 'true'
+
+# Request metrics at /metrics; METRICS_DIR lets every gunicorn worker's counts be summed (utils/metrics.py)
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+app.config['METRICS_DIR'] = os.getenv('METRICS_DIR', '')
+app.config['METRICS_FLUSH_SECONDS'] = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+# Statements over the threshold go to rotating per-worker logs, a sample with EXPLAIN plans (utils/slow_queries.py)
+app.config['SLOW_QUERY_LOG_ENABLED'] = os.getenv('SLOW_QUERY_LOG_ENABLED', 'true').lower() == 'true'
+app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+app.config['SLOW_QUERY_LOG_DIR'] = os.getenv('SLOW_QUERY_LOG_DIR', os.path.join(app.root_path, 'logs', 'slow_queries'))
+app.config['SLOW_QUERY_LOG_MAX_BYTES'] = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+app.config['SLOW_QUERY_LOG_BACKUPS'] = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '3'))
+# Fraction of slow SELECTs re-run as EXPLAIN (ANALYZE, BUFFERS); this runs them a second time
+app.config['SLOW_QUERY_EXPLAIN_SAMPLE_RATE'] = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', '0'))
+app.config['SLOW_QUERY_EXPLAIN_TIMEOUT_MS'] = int(os.getenv('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', '10000'))
+
+# Opt-in request profiling (utils/profiling.py): a sampled fraction of requests, plus any request sending
+# X-Profile: <PROFILING_HEADER_TOKEN>. Both unset (the default) leaves it off
+app.config['PROFILING_SAMPLE_RATE'] = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+app.config['PROFILING_HEADER_TOKEN'] = os.getenv('PROFILING_HEADER_TOKEN', '')
+app.config['PROFILING_INTERVAL_MS'] = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+app.config['PROFILING_DIR'] = os.getenv('PROFILING_DIR', os.path.join(app.root_path, 'logs', 'profiles'))
+app.config['PROFILING_MAX_FILES'] = int(os.getenv('PROFILING_MAX_FILES', '50'))  # Per endpoint
+
 # Initialize extensions
 db.init_app(app)
+init_query_stats(app)
 migrate = Migrate(app, db)
 
 BOOKINGS = {
@@ -394,7 +541,160 @@ def reset_database():
         print("❌ Cancelled.")
 
 app.cli.add_command(reset_database)
+
+
+@app.cli.command("recompute-ratings")
+@click.option("--check", is_flag=True, help="Only report users whose rating counters have drifted.")
+@with_appcontext
+def recompute_ratings(check):
+    """Rebuilds per-user rating aggregates and Profile.rating from the rating table."""
+    from controllers.rating_controller import RatingController
+
+    mismatched = RatingController.recompute_rating_aggregates(dry_run=check)
+    if check:
+        if mismatched:
+            print(f"⚠️ {len(mismatched)} users have inconsistent rating aggregates: {mismatched}")
+            raise SystemExit(1)
+        print("✅ Rating aggregates are consistent.")
+    else:
+        print(f"✅ Rating aggregates rebuilt ({len(mismatched)} users updated).")
+
+
+@app.cli.command("audit-partitions")
+@click.option("--retention-months", type=int, default=None, help="Drop audit months older than this (defaults to AUDIT_LOG_RETENTION_MONTHS).")
+@with_appcontext
+def audit_partitions(retention_months):
+    """Creates upcoming monthly audit_log partitions and drops expired ones."""
+    from utils.audit_partitions import ensure_partitions, drop_expired_partitions, is_partitioned
+
+    if retention_months is None:
+        retention_months = app.config['AUDIT_LOG_RETENTION_MONTHS']
+    with db.engine.begin() as conn:
+        if not is_partitioned(conn):
+            print("⚠️ audit_log is not a partitioned table; run `flask db upgrade` first.")
+            raise SystemExit(1)
+        created = ensure_partitions(conn, months_ahead=app.config['AUDIT_LOG_PARTITIONS_AHEAD'])
+        dropped = drop_expired_partitions(conn, retention_months=retention_months)
+    print(f"✅ Audit partitions created: {created or 'none'}; dropped: {dropped or 'none'}.")
+
+
+@app.cli.command("email-worker")
+@click.option("--once", is_flag=True, help="Send one batch of due messages and exit.")
+@with_appcontext
+def email_worker(once):
+    """Delivers queued email from email_outbox until stopped (SIGTERM/SIGINT)."""
+    import signal
+    import threading
+    from utils.email_outbox import EmailWorker, build_transport
+
+    if is_production and app.config['EMAIL_TRANSPORT'] == 'console':
+        print("❌ EMAIL_TRANSPORT=console only prints mail; set ses or smtp in production.")
+        raise SystemExit(1)
+    worker = EmailWorker(
+        build_transport(app.config),
+        batch_size=app.config['EMAIL_WORKER_BATCH_SIZE'],
+        max_attempts=app.config['EMAIL_MAX_ATTEMPTS'],
+        retry_base_seconds=app.config['EMAIL_RETRY_BASE_SECONDS'],
+        heartbeat_file=app.config['EMAIL_WORKER_HEARTBEAT_FILE']
+    )
+    if once:
+        counts = worker.run_once()
+        worker.transport.close()
+        print(f"✅ Email batch: {counts['sent']} sent, {counts['retried']} to retry, {counts['dead']} dead-lettered.")
+        return
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    print(f"📧 Email worker started ({app.config['EMAIL_TRANSPORT']}).")
+    worker.run(poll_interval=app.config['EMAIL_WORKER_POLL_SECONDS'], stop_event=stop)
+    print("✅ Email worker stopped.")
+
+
+@app.cli.command("email-requeue")
+@click.option("--id", "ids", type=int, multiple=True, help="Only requeue these outbox ids (default: all dead letters).")
+@with_appcontext
+def email_requeue(ids):
+    """Moves dead-lettered email back to pending so the worker retries it."""
+    from utils.email_outbox import requeue_dead
+
+    requeued = requeue_dead(ids)
+    db.session.commit()
+    print(f"✅ Requeued {requeued} dead-lettered emails.")
+
+
+@app.cli.command("password-hash-status")
+@with_appcontext
+def password_hash_status():
+    """Reports how many users' password hashes use the current Argon2 parameters."""
+    from sqlalchemy import func, and_, not_
+    from utils.password_hashing import get_password_service
+
+    prefix = get_password_service().current_hash_prefix()
+    current, outdated, legacy, total = db.session.query(
+        func.count(User.id).filter(User.password_hash.startswith(prefix)),
+        func.count(User.id).filter(and_(User.password_hash.startswith('$argon2'),
+                                        not_(User.password_hash.startswith(prefix)))),
+        func.count(User.id).filter(not_(User.password_hash.startswith('$argon2'))),
+        func.count(User.password_hash)
+    ).one()
+    print(f"Current parameters ({prefix}): {current}/{total}")
+    print(f"Outdated Argon2 (rehashed on next login): {outdated}")
+    print(f"Legacy PBKDF2 (rehashed on next login): {legacy}")
         
+@app.cli.command("profile-merge")
+@click.option("--endpoint", default=None, help="Only merge profiles of this endpoint (e.g. browse.browseEscort).")
+@click.option("--output", "-o", type=click.File("w"), default="-", help="Collapsed-stack file to write (default: stdout).")
+def profile_merge(endpoint, output):
+    """Merges sampled request profiles into one collapsed-stack file for flame graph tools."""
+    from utils.profiling import merge_collapsed, write_collapsed
+
+    paths = app.extensions['request_profiler'].profiles(endpoint)
+    if not paths:
+        click.echo(f"⚠️ No profiles in {app.config['PROFILING_DIR']}" + (f" for {endpoint}" if endpoint else ""), err=True)
+        raise SystemExit(1)
+    stacks = merge_collapsed(paths)
+    write_collapsed(stacks, output)
+    click.echo(f"✅ Merged {len(paths)} profiles ({sum(stacks.values())} samples).", err=True)
+
+@app.cli.command("bench-seed")
+@click.option("--users", type=int, default=100_000, show_default=True, help="Users in total, escorts included.")
+@click.option("--escorts", type=int, default=10_000, show_default=True)
+@click.option("--messages", type=int, default=5_000_000, show_default=True)
+@click.option("--bookings", type=int, default=1_000_000, show_default=True)
+@click.option("--reports", type=int, default=2_000, show_default=True)
+@click.option("--skew", type=float, default=0.8, show_default=True, help="Zipf exponent; higher concentrates activity on fewer users.")
+@click.option("--random-seed", type=int, default=1, show_default=True, help="Same seed and volumes give the same data.")
+@click.option("--replace", is_flag=True, help="Delete existing bench accounts and their rows first.")
+@with_appcontext
+def bench_seed(users, escorts, messages, bookings, reports, skew, random_seed, replace):
+    """Loads production-scale synthetic data for benchmarks (bench/) and load tests."""
+    from utils.bench_seed import BenchVolumes, DEFAULT_PASSWORD, count_bench_users, remove_bench_data, seed_bench_data
+
+    if is_production:
+        print("❌ bench-seed is not allowed in production.")
+        raise SystemExit(1)
+    if escorts >= users:
+        raise click.BadParameter("must be lower than --users", param_hint="--escorts")
+    volumes = BenchVolumes(users=users, escorts=escorts, messages=messages, bookings=bookings, reports=reports, skew=skew)
+
+    connection = db.engine.raw_connection()
+    try:
+        existing = count_bench_users(connection)
+        if existing and not replace:
+            print(f"❌ {existing} bench accounts already exist; pass --replace to delete them first.")
+            raise SystemExit(1)
+        if existing:
+            print(f"-> Deleting {existing} bench accounts and their data...")
+            remove_bench_data(connection)
+        started = time.perf_counter()
+        counts = seed_bench_data(connection, volumes, random_seed=random_seed)
+    finally:
+        connection.close()
+    print(f"\n✅ Bench data loaded in {time.perf_counter() - started:.0f}s ({sum(counts.values()):,} rows).")
+    print(f"Accounts (password: '{DEFAULT_PASSWORD}'): bench-admin@bench.example.com, "
+          f"bench-seeker-1..{volumes.seekers}@bench.example.com, bench-escort-1..{volumes.escorts}@bench.example.com")
+
 # --- Add a command to seed the database ---
 @app.cli.command("seed")
 @with_appcontext
@@ -406,10 +706,12 @@ def seed_database():
 
     # 1. Clean up existing data (proper order to handle foreign keys)
     print("-> Deleting existing data...")
+    db.session.query(RatingAggregate).delete()
     db.session.query(Rating).delete()
     db.session.query(Message).delete()
     db.session.query(Report).delete()
     db.session.query(Payment).delete()
+    db.session.query(PaymentToken).delete()
     db.session.query(Booking).delete()
     db.session.query(TimeSlot).delete()
     
@@ -512,20 +814,20 @@ def seed_database():
         db.session.add(booking)
     print("   - Created 30 bookings.")
 
-    # 4. Create Payments
+    # 4. Create Payments (at most one completed payment per booking)
     print("-> Creating payments...")
     bookings = Booking.query.all()  # Fetch all bookings
-    for _ in range(50):
-        booking = random.choice(bookings) if bookings else None
+    paid_bookings = random.sample(bookings, min(len(bookings), 20))
+    for booking in paid_bookings:
         payment = Payment(
-            user_id=booking.seeker_id if booking else random.choice(seekers).id,
-            booking_id=booking.id if booking else None,
+            user_id=booking.seeker_id,
+            booking_id=booking.id,
             amount=round(random.uniform(50.0, 500.0), 2),
             transaction_id=str(uuid.uuid4()),
             created_at=faker.date_time_between(start_date='-1y', end_date='now')
         )
         db.session.add(payment)
-    print("   - Created 50 payments.")
+    print(f"   - Created {len(paid_bookings)} payments.")
 
     # 5. Create Reports
     print("-> Creating reports...")
@@ -556,39 +858,14 @@ def seed_database():
     print("  - Seeker:  seeker@example.com")
     print("  - Escort:  escort@example.com")
 
-# Validate required environment variables
-required_vars = [
-    "DATABASE_HOST",
-    "DATABASE_PORT",
-    "DATABASE_NAME",
-    "DATABASE_USERNAME",
-    "DATABASE_PASSWORD",
-]
-
-for var in required_vars:
-    if var not in os.environ:
-        print(var)
-        raise EnvironmentError(f"Missing required environment variable: {var}")
-
-# Log non-sensitive variables (for development only)
-if os.environ.get("FLASK_ENV") == "development":
-    print(f"[INFO] Connecting to DB host: {os.environ['DATABASE_HOST']}")
-    print(f"[INFO] DB port: {os.environ['DATABASE_PORT']}")
-    print(f"[INFO] DB name: {os.environ['DATABASE_NAME']}")
+# Raw connections share the SQLAlchemy engine's pool (sized by DBConfig)
+with app.app_context():
+    pg_connector = PostgresConnector(config, db.engine)
 
-# Persistent database connection
-config = DBConfig(
-    # Matches the service name in docker-compose.yml
-    host=os.environ["DATABASE_HOST"],
-    # Internal port (not the mapped host port)
-    # port=int(os.environ["DATABASE_PORT"]),
-    port=int(os.environ["DATABASE_PORT"]),
-    database=os.environ["DATABASE_NAME"],
-    user=os.environ["DATABASE_USERNAME"],
-    password=os.environ["DATABASE_PASSWORD"],
-)
-print(config.database)
-pg_connector = PostgresConnector(config)
+# Replicas get their own pools, with the primary's SSL check and idle pre-ping
+replica_router = init_read_replicas(app, engine_options)
+for replica_engine in (replica_router.engines if replica_router else []):
+    ConnectionChecks(replica_engine, config)
 
 def get_db_conn():
     if "db_conn" not in g:
@@ -606,25 +883,17 @@ def close_db_conn(exception):
 @app.route("/")
 @app.route("/home")
 def index():
-    try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        cursor.execute("SELECT version();")
-        result = cursor.fetchone()
-        version = result[0] if result else "Unavailable"
-        cursor.close()
-    except Exception:
-        version = "Unavailable"
-
     if 'user_id' in session:
         return redirect(url_for('dashboard.dashboard'))
     return redirect(url_for('auth.auth'))
-    # return render_template("index.html", version=version)
 
 
 # --- ROUTES ---
 @app.before_request
 def make_session_permanent():
+    # Probes carry no session; don't hand them a cookie
+    if request.endpoint in ('healthz', 'readyz'):
+        return
     session.permanent = True
     app.permanent_session_lifetime = timedelta(minutes=30)
     
@@ -657,5 +926,60 @@ def session_config():
         'session_lifetime_minutes': app.permanent_session_lifetime.total_seconds() // 60
     }
 
+@app.route('/admin/db-pool')
+@role_required('admin')
+def db_pool_status():
+    """This worker's connection pool: sizes plus connect/checkout/invalidation counters"""
+    info = pg_connector.get_connection_info()
+    if replica_router:
+        info['replicas'] = replica_router.snapshot()
+    return info
+
+def pool_gauges():
+    info = pg_connector.get_connection_info()
+    return {
+        'db_pool_connections_in_use': info['active_connections'],
+        'db_pool_connections_idle': info['idle_connections'],
+        'db_pool_checkouts_total': info['checkouts'],
+        'db_pool_connections_created_total': info['connections_created'],
+        'db_pool_invalidations_total': info['invalidations'],
+        'db_pool_wait_seconds_total': info['wait_seconds_total'],
+    }
+
+request_metrics = init_request_metrics(app, gauges=pool_gauges) if app.config['METRICS_ENABLED'] else None
+
+@app.route('/metrics')
+@role_required('admin')
+def metrics():
+    """Request and pool metrics summed over all workers, in Prometheus text format"""
+    if request_metrics is None:
+        abort(404)
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+slow_query_log = init_slow_query_log(app, config.connect_args()) if app.config['SLOW_QUERY_LOG_ENABLED'] else None
+request_profiler = init_request_profiler(app)
+
+@app.route('/admin/slow-queries')
+@role_required('admin')
+def slow_queries():
+    """Recent slow statements from every worker, grouped by statement shape, with any EXPLAIN plans"""
+    if slow_query_log is None:
+        abort(404)
+    entries = slow_query_log.recent(limit=request.args.get('limit', 200, type=int))
+    return render_template('slow_queries.html', entries=entries, summary=slow_query_log.summarize(entries),
+                           threshold_ms=slow_query_log.threshold_ms)
+
+# Probes: /healthz never touches the database, /readyz is cached (see utils/health.py)
+readiness = ReadinessCheck(pg_connector, ttl_seconds=app.config['HEALTH_READY_TTL_SECONDS'])
+
+@app.route('/healthz')
+def healthz():
+    return {'status': 'ok'}
+
+@app.route('/readyz')
+def readyz():
+    report = readiness.status()
+    return report, 200 if report['status'] == 'ready' else 503
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark the key controller functions against bench-seed data.
+
+Times what the main pages run, for typical and heavy users:
+  - browse: escort search, with and without an availability filter
+  - inbox: conversation list and a conversation's messages
+  - availability: a profile's slots with bookable start times
+  - dashboard: the seeker, escort and admin summary builders (uncached)
+  - reports: admin statistics, report list, a user's report history
+"Heavy" users are the seeker with the most messages and the escort with
+the most bookings. "Typical" users are the median ones. Each case also
+records how many queries it ran. A case whose first run takes longer than
+--max-case-seconds is reported from that one run.
+
+Load data first (`flask bench-seed`, smaller with --users/--messages/...).
+Results are JSON, with row counts and the git commit, for comparing runs.
+With --baseline, each case also gets its change from that earlier file.
+Prints JSON (use --output for a file without the app's start-up messages).
+Usage: python bench/bench_controllers.py [--repeat 5] [--only inbox] [--max-case-seconds 30]
+                                         [--baseline old.json] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from blueprint.controller.browse_controller import BrowseController
+from blueprint.controller.dashboard_controller import DashboardController
+from controllers.message_controller import MessageController
+from controllers.report_controller import ReportController
+from utils.bench_seed import ADMIN_EMAIL, BENCH_EMAIL_PATTERN
+from utils.query_stats import count_queries
+
+COUNTED_TABLES = ('user', 'profile', 'time_slot', 'favourites', 'booking', 'payment', 'rating', 'message', 'report')
+
+
+def pick_users():
+    """Heavy and median seeker (by messages) and escort (by bookings), plus the bench admin"""
+    def ranked(sql):
+        return db.session.execute(db.text(sql), {'pattern': BENCH_EMAIL_PATTERN}).scalars().all()
+
+    seekers = ranked("""
+        SELECT u.id FROM "user" u JOIN message m ON m.sender_id = u.id OR m.recipient_id = u.id
+        WHERE u.role = 'seeker' AND u.email LIKE :pattern GROUP BY u.id ORDER BY count(*) DESC, u.id""")
+    escorts = ranked("""
+        SELECT b.escort_id FROM booking b JOIN "user" u ON u.id = b.escort_id
+        WHERE u.email LIKE :pattern GROUP BY b.escort_id ORDER BY count(*) DESC, b.escort_id""")
+    if not seekers or not escorts:
+        raise SystemExit("No bench data: run `flask bench-seed` first.")
+    users = {
+        'heavy_seeker': seekers[0],
+        'median_seeker': seekers[len(seekers) // 2],  # Among seekers with any messages
+        'heavy_escort': escorts[0],
+        'median_escort': escorts[len(escorts) // 2],
+        'admin': db.session.execute(db.text('SELECT id FROM "user" WHERE email = :email'), {'email': ADMIN_EMAIL}).scalar(),
+    }
+    users['heavy_partner'] = db.session.execute(db.text("""
+        SELECT CASE WHEN sender_id = :user THEN recipient_id ELSE sender_id END AS partner
+        FROM message WHERE sender_id = :user OR recipient_id = :user GROUP BY partner ORDER BY count(*) DESC LIMIT 1
+    """), {'user': users['heavy_seeker']}).scalar()
+    return users
+
+
+def profile_page(escort_id):
+    """What view_profile does: future slots, then bookable start times for each"""
+    slots = BrowseController.get_available_slots(user_id=escort_id, start_time=datetime.datetime.utcnow())
+    return [BrowseController.get_valid_start_times(slot, 15, escort_id) for slot in slots]
+
+
+def cases(users):
+    tomorrow_noon = datetime.date.today() + datetime.timedelta(days=1)
+    available_filter = {'avail_date': tomorrow_noon.isoformat(), 'avail_time': '12:00'}
+    return {
+        'browse.escorts': lambda: BrowseController.get_profiles('escort', {}, limit=15),
+        'browse.escorts_available_tomorrow_noon': lambda: BrowseController.get_profiles('escort', available_filter, limit=15),
+        'browse.seekers': lambda: BrowseController.get_profiles('seeker', {}, limit=5),
+        'inbox.conversations_heavy_seeker': lambda: MessageController.get_user_conversations(users['heavy_seeker']),
+        'inbox.conversations_median_seeker': lambda: MessageController.get_user_conversations(users['median_seeker']),
+        'inbox.conversation_messages_heavy': lambda: MessageController.get_conversation_messages(
+            users['heavy_seeker'], users['heavy_partner']),
+        'availability.profile_heavy_escort': lambda: profile_page(users['heavy_escort']),
+        'availability.profile_median_escort': lambda: profile_page(users['median_escort']),
+        'dashboard.seeker_heavy': lambda: DashboardController._build_seeker_summary(users['heavy_seeker']),
+        'dashboard.escort_heavy': lambda: DashboardController._build_escort_summary(users['heavy_escort']),
+        'dashboard.admin': lambda: DashboardController._build_admin_summary(users['admin']),
+        'reports.statistics': ReportController.get_report_statistics,
+        'reports.all_pending': lambda: ReportController.get_all_reports(status='Pending Review'),
+        'reports.received_heavy_escort': lambda: ReportController.get_user_reports(users['heavy_escort'], 'received'),
+    }
+
+
+def timed(fn, repeat, max_seconds):
+    """Each run starts from an empty session, as each request does"""
+    samples = []
+    started = time.perf_counter()
+    with count_queries() as stats:
+        fn()  # Warm-up: connections, statement caches
+    queries = stats.count
+    warm_up = time.perf_counter() - started
+    db.session.remove()
+    if warm_up > max_seconds:
+        # Too slow to repeat (e.g. an N+1 on a heavy user): report the one run
+        repeat, samples = 0, [warm_up]
+    for _ in range(repeat):
+        with count_queries() as stats:
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        queries = stats.count
+        db.session.remove()
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples) * 1000, 2),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+        'min_ms': round(samples[0] * 1000, 2),
+        'runs': len(samples),
+        'queries': queries,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    for name, result in results['cases'].items():
+        before = baseline.get('cases', {}).get(name)
+        if before and before['median_ms']:
+            result['baseline_median_ms'] = before['median_ms']
+            result['change_pct'] = round((result['median_ms'] / before['median_ms'] - 1) * 100, 1)
+
+
+def run(repeat, only=None, max_seconds=30):
+    with app.test_request_context():
+        users = pick_users()
+        results = {
+            'started_at': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'repeat': repeat,
+            'rows': {table: db.session.execute(db.text(f'SELECT count(*) FROM "{table}"')).scalar()
+                     for table in COUNTED_TABLES},
+            'users': users,
+            'cases': {},
+        }
+        for name, fn in cases(users).items():
+            if only and not name.startswith(only):
+                continue
+            results['cases'][name] = timed(fn, repeat, max_seconds)
+        db.session.remove()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help="Only cases whose name starts with this, e.g. inbox")
+    parser.add_argument('--max-case-seconds', type=float, default=30,
+                        help="Run a case only once if its warm-up takes longer than this")
+    parser.add_argument('--baseline', help="Earlier results file to compare medians against")
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.only, args.max_case_seconds)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
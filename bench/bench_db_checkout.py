@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of checking a raw connection out of the pool.
+
+Compares what PostgresConnector.get_connection paid per checkout before
+(a SELECT ssl_is_used() round trip), the pool's own pre-ping on every
+checkout, and the current setup: SSL checked once per physical connection
+and a ping only for connections idle longer than the pre-ping interval.
+Each mode gets its own one-connection pool, so every checkout reuses the
+same physical connection the way a busy worker does.
+
+Prints JSON (use --output for a file without the app's start-up messages).
+Usage: python bench/bench_db_checkout.py [--checkouts 5000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import replace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from app import app, config
+from db import ConnectionChecks
+
+
+def per_checkout_ssl_query(conn):
+    """The validation get_connection used to run on every checkout"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ssl_is_used()")
+            cursor.fetchone()
+    except Exception:
+        pass
+    conn.rollback()
+
+
+MODES = {
+    # name: (pool_pre_ping, pre-ping interval, extra work per checkout)
+    'ssl-query-per-checkout': (False, 0, per_checkout_ssl_query),
+    'pre-ping-every-checkout': (True, 0, None),
+    'validated-on-connect': (True, config.pool_pre_ping_interval, None),
+}
+
+
+def timed_checkouts(mode, checkouts):
+    pre_ping, interval, per_checkout = MODES[mode]
+    options = config.engine_options()
+    options.update(pool_size=1, max_overflow=0, pool_pre_ping=pre_ping and interval <= 0)
+    engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], **options)
+    checks = ConnectionChecks(engine, replace(config, pool_pre_ping=pre_ping, pool_pre_ping_interval=interval))
+    engine.raw_connection().close()  # Open the connection outside the timings
+
+    samples = []
+    for _ in range(checkouts):
+        started = time.perf_counter()
+        conn = engine.raw_connection()
+        if per_checkout:
+            per_checkout(conn)
+        conn.close()
+        samples.append(time.perf_counter() - started)
+    engine.dispose()
+
+    samples.sort()
+    return {
+        'mean_us': round(statistics.mean(samples) * 1e6, 1),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+        'p95_us': round(samples[int(len(samples) * 0.95)] * 1e6, 1),
+        'p99_us': round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+        **checks.snapshot(),
+    }
+
+
+def run(checkouts):
+    return {
+        'checkouts': checkouts,
+        'pre_ping_interval_seconds': config.pool_pre_ping_interval,
+        'modes': {mode: timed_checkouts(mode, checkouts) for mode in MODES},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--checkouts', type=int, default=5000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.checkouts), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark the change-password history check at history depth 5 and 20.
+
+Compares checking each hash one after another (the old behaviour) with
+User.is_password_in_history, which verifies on the hashing pool in parallel
+and stops at the first match. Two cases are timed:
+  - miss: a new password, so every hash is checked (worst case)
+  - hit:  the current password, so the first check matches
+
+Runs inside one transaction that is rolled back; prints JSON (use --output
+for a file without the app's start-up messages).
+Usage: python bench/bench_password_history.py [--repeat 3] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from blueprint.models import User, PasswordHistory, check_password_hash, generate_password_hash
+from utils.password_hashing import get_password_service
+
+DEPTHS = (5, 20)
+
+
+def sequential_check(user, password, depth):
+    """Baseline: current password then each history entry, one at a time"""
+    if check_password_hash(user.password_hash, password):
+        return True
+    entries = user.password_history.order_by(PasswordHistory.created_at.desc()).limit(depth).all()
+    return any(check_password_hash(entry.password_hash, password) for entry in entries)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {'median_ms': round(statistics.median(samples) * 1000, 1), 'min_ms': round(min(samples) * 1000, 1)}
+
+
+def run(repeat):
+    results = {'workers': get_password_service().max_workers, 'depths': {}}
+    with app.app_context():
+        for depth in DEPTHS:
+            user = User(email=f"bench-history-{depth}@example.com", role='seeker', gender='Other')
+            user.password_hash = generate_password_hash("Current-Pass-1")
+            db.session.add(user)
+            db.session.flush()
+            now = datetime.datetime.utcnow()
+            for i in range(depth):
+                db.session.add(PasswordHistory(user_id=user.id, password_hash=generate_password_hash(f"Old-Pass-{i}"),
+                                               created_at=now - datetime.timedelta(days=i + 1)))
+            db.session.flush()
+
+            results['depths'][depth] = {
+                'sequential_miss': timed(lambda: sequential_check(user, "Brand-New-Pass-9", depth), repeat),
+                'parallel_miss': timed(lambda: user.is_password_in_history("Brand-New-Pass-9", limit=depth), repeat),
+                'sequential_hit': timed(lambda: sequential_check(user, "Current-Pass-1", depth), repeat),
+                'parallel_hit': timed(lambda: user.is_password_in_history("Current-Pass-1", limit=depth), repeat),
+            }
+        db.session.rollback()
+    results['hashing_stats'] = get_password_service().stats()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.repeat), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark rate limiter overhead per request for each storage backend.
+
+Times one limit check (what Flask-Limiter does for each limit on a route)
+against memory:// and the shared Postgres storage, for the fixed-window and
+sliding-window-counter strategies. The auth route has two limits, so it pays
+twice the per-check cost.
+
+Each check uses its own key to spread out the rows, like traffic from
+many client IPs. Prints JSON (use --output for a file without the app's
+start-up messages).
+Usage: python bench/bench_rate_limiter.py [--requests 2000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+from app import app
+
+STRATEGIES = {
+    'fixed-window': FixedWindowRateLimiter,
+    'sliding-window-counter': SlidingWindowCounterRateLimiter,
+}
+CLIENTS = 200  # Distinct keys the requests are spread over
+
+
+def timed_hits(limiter, requests):
+    item = RateLimitItemPerMinute(1_000_000)
+    prefix = f"bench-{uuid.uuid4()}"
+    samples = []
+    for i in range(requests):
+        key = f"{prefix}-{i % CLIENTS}"
+        started = time.perf_counter()
+        limiter.hit(item, key)
+        samples.append(time.perf_counter() - started)
+    for i in range(CLIENTS):
+        limiter.clear(item, f"{prefix}-{i}")
+    samples.sort()
+    return {
+        'mean_us': round(statistics.mean(samples) * 1e6, 1),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+        'p95_us': round(samples[int(len(samples) * 0.95)] * 1e6, 1),
+        'p99_us': round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+    }
+
+
+def run(requests):
+    backends = {'memory': 'memory://', 'database': app.config['RATELIMIT_STORAGE_URI']}
+    results = {'requests': requests, 'backends': {}}
+    for backend, uri in backends.items():
+        storage = storage_from_string(uri)
+        storage.check()  # Connect and create the table outside the timings
+        results['backends'][backend] = {
+            strategy: timed_hits(limiter_class(storage), requests)
+            for strategy, limiter_class in STRATEGIES.items()
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.requests), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
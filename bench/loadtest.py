@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Load-test the main user journeys over HTTP against a local server.
+
+Virtual users log in as bench-seed seekers and replay journeys picked by
+weight (--mix):
+  - browse: escort search, sometimes filtered on availability, then a profile
+  - profile: an escort's profile with its bookable start times
+  - messages: the inbox poll, then the newest conversation's messages
+  - book: profile, booking request, the escort accepting it, then paying
+  - login: a fresh login with new cookies
+Each virtual user is one client with its own cookies and a fixed
+User-Agent. make_session_permanent binds the session to both, and ends it
+if either changes. CSRF tokens are read from each page's forms, as a
+browser would send them. Escorts who receive bookings log in as needed,
+with their own clients.
+
+Load data first (`flask bench-seed`). The auth route allows 5 logins per
+minute per IP, so the server must run with RATELIMIT_ENABLED=false.
+--start-server runs gunicorn that way for the test and stops it after.
+Otherwise, point --url at a server you started yourself.
+
+Reports p50/p95/p99 latency, throughput and errors per endpoint as JSON.
+CI mode: with --baseline, an endpoint whose p95 grew by more than
+--max-regression percent, or total throughput falling by more than that,
+fails the run (exit 1). Any endpoint with an error rate above
+--max-error-rate also fails it, with or without a baseline.
+Usage: python bench/loadtest.py [--start-server] [--url http://127.0.0.1:8000] [--users 16] [--duration 60]
+                                [--mix browse=30,profile=20,messages=35,book=10,login=5]
+                                [--baseline old.json] [--max-regression 20] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from utils.bench_seed import BENCH_EMAIL_PATTERN, DEFAULT_PASSWORD
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_AGENT = 'bench-loadtest/1.0'
+DEFAULT_MIX = 'browse=30,profile=20,messages=35,book=10,login=5'
+TEST_CARD = '4111111111111111'  # Accepted by the payment simulation
+
+CSRF_INPUT = re.compile(r'name="csrf_token" value="([^"]+)"')
+HIDDEN_INPUT = re.compile(r'<input type="hidden" name="(token|idempotency_key)" value="([^"]*)"')
+PROFILE_LINK = re.compile(r'/browse/profile/(\d+)')
+SLOT_STARTS = re.compile(r'"(\d+)": \[([^\]]*)\]')  # slotStartTimesMap in view_profile.html
+START_TIME = re.compile(r'"(\d{4}-\d\d-\d\d \d\d:\d\d)"')
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.journeys = Counter()
+
+    def add(self, step, seconds, error=None):
+        with self._lock:
+            self.samples[step].append(seconds)
+            if error:
+                self.errors[step][error] += 1
+
+    def fail(self, step, error):
+        """A failure seen after the response, e.g. a booking that was not created"""
+        with self._lock:
+            self.errors[step][error] += 1
+
+    def journey(self, name):
+        with self._lock:
+            self.journeys[name] += 1
+
+
+class Client:
+    """One browser: its own cookies and a User-Agent that never changes, so the session binding holds"""
+
+    def __init__(self, base_url, email, recorder, timeout):
+        self.base_url = base_url
+        self.email = email
+        self.recorder = recorder
+        self.timeout = timeout
+        self.logged_in = False
+        self.http = None
+
+    def request(self, method, step, path, expect=(200,), **kwargs):
+        """Timed request; returns the response, or None (recorded as an error) if it was not as expected"""
+        step = f"{method} {step}"
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False,
+                                         timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.add(step, time.perf_counter() - started, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+
+        error = None
+        if response.status_code not in expect:
+            error = f"HTTP {response.status_code}"
+        elif response.is_redirect and urlsplit(response.headers['Location']).path.startswith('/auth'):
+            # login_required, or make_session_permanent ending the session
+            error = 'logged out'
+            self.logged_in = False
+        self.recorder.add(step, elapsed, error)
+        return None if error else response
+
+    def get(self, step, path, **kwargs):
+        return self.request('GET', step, path, **kwargs)
+
+    def post(self, step, path, data, expect=(302,)):
+        return self.request('POST', step, path, expect=expect, data=data)
+
+    def login(self):
+        self.http = requests.Session()
+        self.http.headers['User-Agent'] = USER_AGENT
+        page = self.get('auth.auth', '/auth/')
+        if page is None:
+            return False
+        response = self.post('auth.auth', '/auth/', data={
+            'csrf_token': csrf_token(page.text),
+            'form_type': 'login',
+            'email': self.email,
+            'password': DEFAULT_PASSWORD,
+        })
+        self.logged_in = bool(response) and urlsplit(response.headers['Location']).path.startswith('/dashboard')
+        if response and not self.logged_in:
+            self.recorder.fail('POST auth.auth', 'login refused')
+        return self.logged_in
+
+
+def csrf_token(html):
+    match = CSRF_INPUT.search(html)
+    return match.group(1) if match else ''
+
+
+class VirtualUser:
+
+    def __init__(self, base_url, seeker_email, accounts, recorder, rng, timeout):
+        self.base_url = base_url
+        self.accounts = accounts
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+        self.client = Client(base_url, seeker_email, recorder, timeout)
+        self.escorts = {}  # Email -> Client of the escorts this user has booked
+
+    def escort_client(self, email):
+        client = self.escorts.get(email)
+        if client is None:
+            client = self.escorts[email] = Client(self.base_url, email, self.recorder, self.timeout)
+        if not client.logged_in and not client.login():
+            return None
+        return client
+
+    def run(self, journey):
+        if journey == 'login':
+            self.client.logged_in = False  # New cookies, as after closing the browser
+        if not self.client.logged_in and not self.client.login():
+            return
+        self.recorder.journey(journey)
+        JOURNEYS[journey](self)
+
+
+def browse(user):
+    params = {}
+    if user.rng.random() < 0.3:
+        day = datetime.date.today() + datetime.timedelta(days=user.rng.randint(1, 14))
+        params = {'avail_date': day.isoformat(), 'avail_time': f"{user.rng.randint(9, 18):02d}:00"}
+    page = user.client.get('browse.browseEscort', '/browse/browse', params=params)
+    profile_ids = PROFILE_LINK.findall(page.text) if page else []
+    if profile_ids:
+        user.client.get('browse.view_profile', f'/browse/profile/{user.rng.choice(profile_ids)}')
+
+
+def profile(user):
+    escort_id, _ = user.rng.choice(user.accounts['escorts'])
+    user.client.get('browse.view_profile', f'/browse/profile/{escort_id}')
+
+
+def messages(user):
+    inbox = user.client.get('messaging.api_conversations', '/messaging/api/conversations')
+    conversations = inbox.json()['conversations'] if inbox else []
+    if conversations:
+        user.client.get('messaging.api_messages', f"/messaging/api/messages/{conversations[0]['other_user_id']}")
+
+
+def book(user):
+    escort_id, escort_email = user.rng.choice(user.accounts['escorts'])
+    page = user.client.get('browse.view_profile', f'/browse/profile/{escort_id}')
+    if page is None:
+        return
+    starts = [(slot_id, start) for slot_id, times in SLOT_STARTS.findall(page.text) for start in START_TIME.findall(times)]
+    if not starts:
+        return  # Fully booked
+    slot_id, start = user.rng.choice(starts)
+    booked = user.client.post('booking.book', f'/booking/book/{escort_id}', data={
+        'csrf_token': csrf_token(page.text), 'slot_id': slot_id, 'start_time': start, 'duration': '15'})
+    if booked is None:
+        return
+
+    # The escort accepts: overlapping Pending/Confirmed bookings are refused, so the start time identifies it
+    escort = user.escort_client(escort_email)
+    requests_page = escort.get('booking.booking', '/booking/') if escort else None
+    if requests_page is None:
+        return
+    booking_ids = re.findall(rf'Booking #(\d+)(?:<br>)?\s+From: {re.escape(start)}', requests_page.text)
+    if not booking_ids:
+        user.recorder.fail('POST booking.book', 'booking not created')
+        return
+    booking_id = max(booking_ids, key=int)
+    if escort.post('booking.handle_booking_action', '/booking/handle', data={
+            'csrf_token': csrf_token(requests_page.text), 'booking_id': booking_id, 'action': 'accept'}) is None:
+        return
+
+    initiated = user.client.get('payment.initiate_payment', f'/payment/initiate/{booking_id}', expect=(302,))
+    if initiated is None:
+        return
+    location = urlsplit(initiated.headers['Location'])
+    form = user.client.get('payment.payment_page', f"{location.path}?{location.query}")
+    if form is None:
+        return
+    paid = user.client.post('payment.payment_page', '/payment/pay', data={
+        'csrf_token': csrf_token(form.text),
+        **dict(HIDDEN_INPUT.findall(form.text)),
+        'card_number': TEST_CARD, 'expiry': '12/30', 'cvv': '123',
+    })
+    if paid and not urlsplit(paid.headers['Location']).path.startswith('/booking'):
+        user.recorder.fail('POST payment.payment_page', 'payment refused')
+
+
+def login(user):
+    pass  # VirtualUser.run has just logged in again
+
+
+JOURNEYS = {'browse': browse, 'profile': profile, 'messages': messages, 'book': book, 'login': login}
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in JOURNEYS or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"expected journey=weight with journeys from {', '.join(JOURNEYS)}: {item!r}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def pick_accounts(seekers, escorts):
+    """Random bench seekers, and escorts with future availability to book"""
+    with app.app_context():
+        seeker_emails = db.session.execute(db.text("""
+            SELECT email FROM "user" WHERE role = 'seeker' AND email LIKE :pattern ORDER BY random() LIMIT :limit
+        """), {'pattern': BENCH_EMAIL_PATTERN, 'limit': seekers}).scalars().all()
+        bookable = db.session.execute(db.text("""
+            SELECT u.id, u.email FROM "user" u
+            WHERE u.role = 'escort' AND u.email LIKE :pattern
+              AND EXISTS (SELECT 1 FROM time_slot t WHERE t.user_id = u.id AND t.end_time > :now)
+            ORDER BY random() LIMIT :limit
+        """), {'pattern': BENCH_EMAIL_PATTERN, 'limit': escorts, 'now': datetime.datetime.utcnow()}).all()
+        db.session.remove()
+    if not seeker_emails or not bookable:
+        raise SystemExit("No bench data with future availability: run `flask bench-seed` first.")
+    return {'seekers': seeker_emails, 'escorts': [tuple(row) for row in bookable]}
+
+
+class LocalServer:
+    """gunicorn on 127.0.0.1 with the rate limits off, for the duration of the test"""
+
+    def __init__(self, port, workers):
+        self.url = f"http://127.0.0.1:{port}"
+        self.command = ['gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--timeout', '120', 'app:app']
+        self.process = None
+
+    def __enter__(self):
+        env = {**os.environ, 'RATELIMIT_ENABLED': 'false'}
+        self.process = subprocess.Popen(self.command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"gunicorn exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"{self.url}/healthz", timeout=1).ok:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        self.__exit__()
+        raise SystemExit("gunicorn did not become ready within 60s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for step in sorted(set(recorder.samples) | set(recorder.errors)):
+        samples = sorted(recorder.samples[step])
+        errors = sum(recorder.errors[step].values())
+        result = {'requests': len(samples), 'errors': errors, 'error_rate': round(errors / max(len(samples), 1), 4),
+                  'throughput_rps': round(len(samples) / elapsed, 2)}
+        if samples:
+            result.update({
+                'p50_ms': round(percentile(samples, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 0.99) * 1000, 1),
+                'max_ms': round(samples[-1] * 1000, 1),
+            })
+        if errors:
+            result['error_kinds'] = dict(recorder.errors[step])
+        endpoints[step] = result
+    requests_made = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'elapsed_s': round(elapsed, 1),
+        'requests': requests_made,
+        'throughput_rps': round(requests_made / elapsed, 2),
+        'journeys': dict(recorder.journeys),
+        'endpoints': endpoints,
+    }
+
+
+def run(base_url, users, duration, mix, accounts, think_seconds=0, timeout=30, random_seed=None):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    seed_rng = random.Random(random_seed)
+    journeys, weights = list(mix), list(mix.values())
+
+    def virtual_user(number, rng):
+        seeker = accounts['seekers'][number % len(accounts['seekers'])]
+        user = VirtualUser(base_url, seeker, accounts, recorder, rng, timeout)
+        while time.monotonic() < deadline:
+            user.run(rng.choices(journeys, weights)[0])
+            if think_seconds:
+                time.sleep(rng.uniform(0, 2 * think_seconds))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i, random.Random(seed_rng.random())), daemon=True)
+               for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, time.perf_counter() - started)
+
+
+def check(results, baseline, max_regression, max_error_rate, min_requests=20):
+    """Failures for CI; also records each endpoint's change from the baseline"""
+    failures = []
+    for step, result in results['endpoints'].items():
+        if result['error_rate'] > max_error_rate:
+            failures.append(f"{step}: error rate {result['error_rate']:.1%} > {max_error_rate:.1%}")
+        before = (baseline or {}).get('endpoints', {}).get(step)
+        if not before or not before.get('p95_ms') or 'p95_ms' not in result:
+            continue
+        result['baseline_p95_ms'] = before['p95_ms']
+        result['change_pct'] = round((result['p95_ms'] / before['p95_ms'] - 1) * 100, 1)
+        # Too few requests for a stable p95
+        if min(result['requests'], before['requests']) >= min_requests and result['change_pct'] > max_regression:
+            failures.append(f"{step}: p95 {before['p95_ms']} -> {result['p95_ms']} ms (+{result['change_pct']}%)")
+    if baseline and baseline.get('throughput_rps'):
+        results['baseline_throughput_rps'] = baseline['throughput_rps']
+        change = (results['throughput_rps'] / baseline['throughput_rps'] - 1) * 100
+        if change < -max_regression:
+            failures.append(f"throughput {baseline['throughput_rps']} -> {results['throughput_rps']} req/s ({change:.1f}%)")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server to test (ignored with --start-server)")
+    parser.add_argument('--start-server', action='store_true', help="Run gunicorn on --port for the test")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers with --start-server")
+    parser.add_argument('--users', type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Journey weights ({DEFAULT_MIX})")
+    parser.add_argument('--escorts', type=int, default=50, help="Escort accounts that receive bookings")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean pause between journeys")
+    parser.add_argument('--timeout', type=float, default=30, help="Per request, in seconds")
+    parser.add_argument('--random-seed', type=int)
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--max-regression', type=float, default=20, help="Percent of p95 growth or throughput loss")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    accounts = pick_accounts(args.users, args.escorts)
+    started_at = datetime.datetime.utcnow().isoformat(timespec='seconds')
+    settings = {'users': args.users, 'duration': args.duration, 'mix': args.mix, 'think_ms': args.think_ms}
+    if args.start_server:
+        with LocalServer(args.port, args.workers) as server:
+            results = run(server.url, args.users, args.duration, args.mix, accounts, args.think_ms / 1000,
+                          args.timeout, args.random_seed)
+        settings['workers'] = args.workers
+    else:
+        results = run(args.url, args.users, args.duration, args.mix, accounts, args.think_ms / 1000,
+                      args.timeout, args.random_seed)
+    results = {
+        'started_at': started_at,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': settings,
+        **results,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, args.max_regression, args.max_error_rate)
+    results['failures'] = failures
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    print(report)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
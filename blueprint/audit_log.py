@@ -1,34 +1,189 @@
-from flask import Blueprint, render_template, request
-from blueprint.models import AuditLog, db
+import csv
+import datetime
+import io
+import json
+
+from flask import Blueprint, render_template, request, flash, Response, abort, session
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import joinedload
+from blueprint.models import AuditLog, AUDIT_CATEGORIES, User, db
 from blueprint.decorators import role_required
+from utils.audit_writer import get_audit_writer
 
 audit_bp = Blueprint('audit', __name__, url_prefix='/admin/audit')
 
+PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+EXPORT_COLUMNS = ['created_at', 'id', 'user_id', 'email', 'role', 'category', 'action', 'details']
+
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def _parse_cursor(value):
+    """Cursors are '<created_at ISO>_<id>' of the last row shown"""
+    try:
+        created_at, log_id = value.rsplit('_', 1)
+        return datetime.datetime.fromisoformat(created_at), int(log_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _make_cursor(log):
+    return f"{log.created_at.isoformat()}_{log.id}"
+
+
+def _audit_filters(args):
+    """Build WHERE criteria from the viewer/export query string. Returns (criteria, errors)."""
+    criteria, errors = [], []
+
+    # Legacy quick filters
+    if args.get('filter') == 'fail':
+        criteria.append(AuditLog.category.in_(AuditLog.FAILURE_CATEGORIES))
+    elif args.get('filter') == 'suspicious':
+        criteria.append(AuditLog.category.in_(AuditLog.SUSPICIOUS_CATEGORIES))
+
+    category = args.get('category')
+    if category:
+        if category in AUDIT_CATEGORIES:
+            criteria.append(AuditLog.category == category)
+        else:
+            errors.append(f"Unknown category '{category}'.")
+
+    user = (args.get('user') or '').strip()
+    if user:
+        if user.isdigit():
+            criteria.append(AuditLog.user_id == int(user))
+        else:
+            criteria.append(AuditLog.user_id.in_(select(User.id).where(User.email == user)))
+
+    since, until = args.get('since'), args.get('until')
+    if since:
+        since_date = _parse_date(since)
+        if since_date:
+            criteria.append(AuditLog.created_at >= since_date)
+        else:
+            errors.append("'From' must be a date (YYYY-MM-DD).")
+    if until:
+        until_date = _parse_date(until)
+        if until_date:
+            criteria.append(AuditLog.created_at < until_date + datetime.timedelta(days=1))  # Inclusive
+        else:
+            errors.append("'To' must be a date (YYYY-MM-DD).")
+
+    return criteria, errors
+
+
 @audit_bp.route('/logs')
 @role_required('admin')
 def view_logs():
-    filter_type = request.args.get('filter')
-    query = AuditLog.query.order_by(AuditLog.created_at.desc())
-
-    if filter_type == 'fail':
-        query = query.filter(
-            AuditLog.action.contains('fail') | 
-            AuditLog.action.contains('lock')
-        )
-    elif filter_type == 'suspicious':
-        query = query.filter(
-            AuditLog.action.contains('ban') | 
-            AuditLog.action.contains('delete')
-        )
-
-    logs = query.limit(200).all()
-    return render_template('audit_log.html', logs=logs)
-
-def log_event(user_id, action, details=None):
-    log = AuditLog(
-        user_id=user_id,
-        action=action,
-        details=details
+    criteria, errors = _audit_filters(request.args)
+    for error in errors:
+        flash(error, 'warning')
+
+    # Keyset pagination on (created_at, id): each page is an index range scan,
+    # however deep into the history it is
+    key = tuple_(AuditLog.created_at, AuditLog.id)
+    query = AuditLog.query.options(joinedload(AuditLog.user)).filter(*criteria)
+    before = _parse_cursor(request.args.get('before'))
+    after = _parse_cursor(request.args.get('after'))
+    if after:
+        # Newer page: walk forwards from the cursor, then show newest first
+        rows = query.filter(key > tuple_(*after)).order_by(
+            AuditLog.created_at.asc(), AuditLog.id.asc()
+        ).limit(PAGE_SIZE + 1).all()
+        has_newer = len(rows) > PAGE_SIZE
+        logs = list(reversed(rows[:PAGE_SIZE]))
+        has_older = True
+    else:
+        if before:
+            query = query.filter(key < tuple_(*before))
+        rows = query.order_by(
+            AuditLog.created_at.desc(), AuditLog.id.desc()
+        ).limit(PAGE_SIZE + 1).all()
+        has_older = len(rows) > PAGE_SIZE
+        logs = rows[:PAGE_SIZE]
+        has_newer = before is not None
+
+    # Filters carried over to paging and export links
+    filters = {k: v for k, v in request.args.items() if k not in ('before', 'after', 'format') and v}
+    return render_template(
+        'audit_log.html',
+        logs=logs,
+        filters=filters,
+        categories=AUDIT_CATEGORIES,
+        older_cursor=_make_cursor(logs[-1]) if logs and has_older else None,
+        newer_cursor=_make_cursor(logs[0]) if logs and has_newer else None
     )
-    db.session.add(log)
-    db.session.commit()
+
+
+def _csv_safe(value):
+    # Cells starting with these are evaluated as formulas by spreadsheet apps
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+@audit_bp.route('/export')
+@role_required('admin')
+def export_logs():
+    """Stream matching audit rows as CSV or NDJSON, oldest first, in constant memory"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        abort(400)
+    criteria, errors = _audit_filters(request.args)
+    if errors:
+        abort(400)
+
+    statement = select(
+        AuditLog.created_at, AuditLog.id, AuditLog.user_id, User.email, User.role,
+        AuditLog.category, AuditLog.action, AuditLog.details
+    ).outerjoin(User, AuditLog.user_id == User.id).where(
+        *criteria
+    ).order_by(AuditLog.created_at.asc(), AuditLog.id.asc())
+    engine = db.engine
+    log_event(session.get('user_id'), 'admin audit export',
+              f"Exported audit log as {export_format} with filters {dict(request.args)}")
+
+    def generate():
+        # A dedicated connection with stream_results uses a server-side cursor,
+        # so only EXPORT_CHUNK_SIZE rows are held in memory at a time
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE).execute(statement)
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_COLUMNS)
+                for chunk in result.partitions():
+                    for row in chunk:
+                        writer.writerow([_csv_safe(value) for value in row])
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for chunk in result.partitions():
+                    yield ''.join(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n'
+                        for row in chunk
+                    )
+
+    filename = f"audit_log_{datetime.datetime.utcnow():%Y%m%d_%H%M%S}.{export_format}"
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def log_event(user_id, action, details=None, in_transaction=False):
+    if in_transaction:
+        # Added to db.session so it commits (or rolls back) with the caller's changes
+        db.session.add(AuditLog(user_id=user_id, action=action, category=AuditLog.categorize(action),
+                                details=details, created_at=datetime.datetime.utcnow()))
+        return
+    # Queued for the background writer; does not touch (or commit) db.session
+    get_audit_writer().submit(user_id, action, details)
@@ -7,9 +7,9 @@ from blueprint.audit_log import log_event
 from utils.utils import send_verification_email, verify_email_token, generate_otp, validate_phone_number, send_otp_sms, verify_otp_code, resend_otp, validate_password_strength, send_reset_email, verify_reset_token, consume_reset_token  # Import reset functions
 from flask_wtf.csrf import generate_csrf  # Add this import
 from utils.owasp_auth_security import OWASPAuthSecurity, progressive_delay_required  # OWASP Security
+from utils.password_hashing import PasswordHashingBusy
+from utils.email_outbox import enqueue_email
 
-import boto3
-from botocore.exceptions import ClientError
 from flask import current_app
 
 # Configure security logging
@@ -21,6 +21,16 @@ security_logger.setLevel(logging.INFO)
 # auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+
+@auth_bp.errorhandler(PasswordHashingBusy)
+def password_hashing_busy(error):
+    """Login storm: the hashing pool is saturated, so ask the user to retry instead of queueing forever"""
+    db.session.rollback()
+    security_logger.warning(f"Password hashing busy for {request.path} from IP {request.remote_addr}")
+    flash("We're handling a lot of sign-ins right now. Please try again in a moment.", "warning")
+    return redirect(request.url)
+
+
 def verify_recaptcha(token):
     """Verify reCAPTCHA token. Requires secret key to be configured."""
     recaptcha_secret = os.environ.get('RECAPTCHA_SECRET_KEY')
@@ -93,7 +103,8 @@ def auth():
                 return redirect(url_for('auth.auth', mode='register'))'''
 
         if form_type == 'login':
-            user = User.query.filter_by(email=email).first()
+            # Shared with progressive_delay_required: one query, login columns only
+            user = OWASPAuthSecurity.load_login_user(email)
             print("Submitted for login\n");
             if user:
                 # Check if user has been soft deleted
@@ -108,18 +119,23 @@ def auth():
                     flash(status_message, "danger")
                     return redirect(url_for('auth.auth', mode='login'))
                 
+                # Read before the commit so nothing is reloaded after it
+                user_id, user_email, user_role = user.id, user.email, user.role
+                
                 # Check password
-                if user.check_password(password):
+                if user.check_password(password, upgrade=True):
                     # OWASP Security: Handle successful login
                     OWASPAuthSecurity.handle_successful_login(user, request.remote_addr)
                     
                     if not user.active:
+                        db.session.commit()
                         return redirect(url_for('auth.auth', mode='locked'))
                     
                     # Check if password has expired
                     if user.is_password_expired() or user.password_change_required:
+                        db.session.commit()
                         flash("Your password has expired. Please change your password to continue.", "warning")
-                        return redirect(url_for('auth.change_password', user_id=user.id, force=True))
+                        return redirect(url_for('auth.change_password', user_id=user_id, force=True))
                     
                     # Check if password expires soon (within 7 days)
                     days_left = user.days_until_password_expires()
@@ -128,15 +144,17 @@ def auth():
                     
                     # Check if email is verified
                     if not user.email_verified:
+                        db.session.commit()
                         flash("Please verify your email address before logging in. Check your inbox for the verification link.", "warning")
                         return redirect(url_for('auth.auth', mode='login'))
                     
-                    # Successful login
-                    session['user_id'] = user.id
-                    session['role'] = user.role
-                    session['username'] = user.email
-                    log_event(user.id, 'login success', f"User {user.email} logged in successfully.")
-                    security_logger.info(f"Successful login for user {user.email} from IP {request.remote_addr}")
+                    # Successful login: counter reset and audit record in one transaction
+                    log_event(user_id, 'login success', f"User {user_email} logged in successfully.", in_transaction=True)
+                    db.session.commit()
+                    session['user_id'] = user_id
+                    session['role'] = user_role
+                    session['username'] = user_email
+                    security_logger.info(f"Successful login for user {user_email} from IP {request.remote_addr}")
                     
                     return redirect(url_for('dashboard.dashboard'))
                 else:
@@ -147,16 +165,25 @@ def auth():
                         request.headers.get('User-Agent', 'Unknown')
                     )
                     
-                    flash(message, "danger")
+                    # Log failed login attempt with additional security context,
+                    # committed together with any lockout
+                    log_event(user_id, 'login_failed_owasp', 
+                             f"Failed login for {user_email}: {message} (IP: {request.remote_addr})",
+                             in_transaction=True)
+                    db.session.commit()
                     
-                    # Log failed login attempt with additional security context
-                    log_event(user.id, 'login_failed_owasp', 
-                             f"Failed login for {user.email}: {message} (IP: {request.remote_addr})")
+                    flash(message, "danger")
                     
                     return redirect(url_for('auth.auth', mode='login'))
             else:
-                # Invalid user email
+                # Invalid user email: counted in the login throttle like any other failure
                 security_logger.warning(f"Login attempt with invalid email {email} from IP {request.remote_addr}")
+                OWASPAuthSecurity.handle_failed_login(
+                    None,
+                    request.remote_addr,
+                    request.headers.get('User-Agent', 'Unknown'),
+                    email=email
+                )
                 flash("Invalid credentials.", "danger")
 
         elif form_type == 'register':
@@ -545,40 +572,17 @@ def forgot_password():
 # AWS SES
 
 def send_email_ses(to_email, subject, body_text, body_html=None):
-    SENDER = "Your Name <13eddie07@gmail.com>"
-    CHARSET = "UTF-8"
-
-    client = boto3.client('ses', region_name="us-east-1")  # Replace with your SES region
-
+    """Queue an email for the email worker, which delivers it via EMAIL_TRANSPORT (e.g. SES)"""
     try:
-        response = client.send_email(
-            Destination={
-                'ToAddresses': [to_email],
-            },
-            Message={
-                'Body': {
-                    'Html': {
-                        'Charset': CHARSET,
-                        'Data': body_html or body_text,
-                    },
-                    'Text': {
-                        'Charset': CHARSET,
-                        'Data': body_text,
-                    },
-                },
-                'Subject': {
-                    'Charset': CHARSET,
-                    'Data': subject,
-                },
-            },
-            Source=SENDER,
-        )
-    except ClientError as e:
-        current_app.logger.error(f"SES Error: {e.response['Error']['Message']}")
+        enqueue_email(to_email, subject, body_text, body_html)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Could not queue email: {e}")
         return False
     else:
         return True
-   
+
 
 def send_verification_email_ses(user):
     """Send email verification using AWS SES"""
@@ -635,7 +639,7 @@ Safe Companion Team
         success = send_email_ses(user.email, subject, body_text, body_html)
         
         if success:
-            print(f"✅ Email verification sent successfully to {user.email}")
+            print(f"✅ Email verification queued for {user.email}")
             print(f"📧 Verification URL: {verification_url}")
             return True
         else:
@@ -10,6 +10,7 @@ from sqlalchemy.orm import joinedload, contains_eager
 from sqlalchemy.sql import func
 
 from controllers.security_controller import SecurityController
+from blueprint.controller.dashboard_controller import DashboardController
 
 booking_bp = Blueprint('booking', __name__, url_prefix='/booking')
 logger = logging.getLogger(__name__)
@@ -192,6 +193,7 @@ def book(escort_id):
             )
             db.session.add(new_booking)
         db.session.commit()
+        DashboardController.invalidate(seeker_id, escort_id)
         flash("Booking request sent successfully.", "success")
         logger.info(f"Seeker {seeker_id} booked escort {escort_id} from {requested_start} to {requested_end}.")
     except Exception as e:
@@ -300,4 +302,5 @@ def handle_booking_action():
         return redirect(url_for('booking.booking'))
 
     db.session.commit()
+    DashboardController.invalidate(booking.seeker_id, booking.escort_id)
     return redirect(url_for('booking.booking'))
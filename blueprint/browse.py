@@ -8,6 +8,8 @@ from sqlalchemy import and_
 from flask import jsonify
 from datetime import timedelta
 from blueprint.controller.browse_controller import BrowseController
+from blueprint.controller.dashboard_controller import DashboardController
+from utils.read_replicas import read_only
 
 
 browse_bp = Blueprint('browse', __name__, url_prefix='/browse')
@@ -15,6 +17,7 @@ browse_bp = Blueprint('browse', __name__, url_prefix='/browse')
 # Should have 1 for escorts to see
 @browse_bp.route('/browseSeeker', methods=['GET', 'POST'])
 @login_required
+@read_only
 def browseSeeker():
 	user_id = session['user_id']
 	if not user_id:
@@ -65,6 +68,7 @@ def browseSeeker():
 # havent seen
 @browse_bp.route('/profile/<int:user_id>')
 @login_required
+@read_only
 def view_profile(user_id):
 
 	profile = BrowseController.get_specific_profile(user_id, False, True)
@@ -114,17 +118,20 @@ def toggle_favourite(user_id):
 	if existing:
 		db.session.delete(existing)
 		db.session.commit()
+		DashboardController.invalidate(current_user_id)
 		return jsonify({'status': 'removed'})
 	else:
 		new_fav = Favourite(user_id=current_user_id, favourite_user_id=user_id)
 		db.session.add(new_fav)
 		db.session.commit()
+		DashboardController.invalidate(current_user_id)
 		return jsonify({'status': 'added'})
 
 
 
 @browse_bp.route('/browse', methods=['GET'])
 @login_required
+@read_only
 def browseEscort():
 	user_role = 'seeker'
 # query = BrowseController.get_profile('escort', False, True)
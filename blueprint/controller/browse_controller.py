@@ -2,6 +2,7 @@
 
 from blueprint.models import Profile, User, TimeSlot, Booking, Favourite
 from extensions import db
+from blueprint.controller.dashboard_controller import DashboardController
 from sqlalchemy import and_
 from datetime import datetime, time, timedelta
 
@@ -137,11 +138,13 @@ class BrowseController:
         if existing:
             db.session.delete(existing)
             db.session.commit()
+            DashboardController.invalidate(current_user_id)
             return 'removed'
         else:
             new_fav = Favourite(user_id=current_user_id, favourite_user_id=target_user_id)
             db.session.add(new_fav)
             db.session.commit()
+            DashboardController.invalidate(current_user_id)
             return 'added'
 
     '''@staticmethod
@@ -1,128 +1,271 @@
 # controllers/dashboard_controller.py
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from flask import current_app
+from limits.storage import MemoryStorage, storage_from_string
+
 from blueprint.models import Booking, User, Favourite, Profile, Payment, Report
 from extensions import db
-from sqlalchemy import func, text
- 
+from sqlalchemy import func, select, and_
+from utils.ttl_cache import TTLCache
+from utils.read_replicas import primary
+
+logger = logging.getLogger(__name__)
+
+# Dashboard tiles are cached per user in each worker for DASHBOARD_CACHE_TTL_SECONDS.
+# Booking, payment and favourite changes bump the user's version counter in
+# DASHBOARD_VERSION_STORAGE_URI, shared by every worker, and a cached entry is
+# only served while its version is still current.
+DEFAULT_CACHE_TTL_SECONDS = 30
+# Far longer than the cache TTL, so a counter that expires and restarts cannot match a live entry
+DASHBOARD_VERSION_TTL_SECONDS = 7 * 24 * 60 * 60
+MONTHLY_BREAKDOWN_MONTHS = 6
+
+
+def _dashboard_cache():
+    """This worker's dashboard cache"""
+    cache = current_app.extensions.get('dashboard_cache')
+    if cache is None:
+        cache = TTLCache(ttl_seconds=current_app.config.get('DASHBOARD_CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS))
+        current_app.extensions['dashboard_cache'] = cache
+    return cache
+
+
+def _version_store():
+    """The limits storage (DASHBOARD_VERSION_STORAGE_URI) holding per-user dashboard versions"""
+    store = current_app.extensions.get('dashboard_versions')
+    if store is None:
+        store = storage_from_string(current_app.config.get('DASHBOARD_VERSION_STORAGE_URI', 'memory://'),
+                                    **current_app.config.get('DASHBOARD_VERSION_STORAGE_OPTIONS', {}))
+        if isinstance(store, MemoryStorage):
+            logger.warning("Dashboard versions are kept per process (memory://): changes only invalidate "
+                           "cached dashboards in the worker that made them")
+        current_app.extensions['dashboard_versions'] = store
+    return store
+
+
+def _version_key(user_id):
+    return f"dashboard:version:{user_id}"
+
+
+@dataclass(frozen=True)
+class MonthlyTotal:
+    month: str  # YYYY-MM
+    total: float
+
+
+@dataclass(frozen=True)
+class FavouriteProfile:
+    """Plain copy of the Profile fields the dashboard shows - safe to cache across requests"""
+    user_id: int
+    name: Optional[str]
+    bio: Optional[str]
+    photo: Optional[str]
+    rating: Optional[float]
+    age: Optional[int]
+
+
+@dataclass(frozen=True)
+class SeekerDashboard:
+    upcoming_bookings_count: int
+    pending_bookings_count: int
+    total_spent: float
+    completed_bookings: int  # Number of payments made
+    monthly_breakdown: List[MonthlyTotal] = field(default_factory=list)
+    favourite_profiles: List[FavouriteProfile] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class EscortDashboard:
+    booking_requests_count: int
+    upcoming_bookings_count: int
+    total_earned: float
+    paid_bookings: int
+    monthly_breakdown: List[MonthlyTotal] = field(default_factory=list)
+    favourite_profiles: List[FavouriteProfile] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class AdminDashboard:
+    total_users: int
+    total_reports: int  # Reports pending review
+    seeker_to_escort_requests: int
+    escort_to_seeker_requests: int
+    favourite_profiles: List[FavouriteProfile] = field(default_factory=list)
+
+
 class DashboardController:
- 
+
     @staticmethod
-    def get_user_spending_summary(user_id):
+    def get_dashboard_summary(user_id, role):
+        """Return the typed dashboard summary for a user, served from cache when fresh"""
         if not user_id:
             return None
- 
-        total_spent = db.session.query(func.sum(Payment.amount)).filter_by(user_id=user_id).scalar() or 0
-        total_transactions = db.session.query(func.count(Payment.id)).filter_by(user_id=user_id).scalar() or 0
- 
-        monthly_breakdown = db.session.query(
-            func.date_trunc('month', Payment.created_at).label('month'),
-            func.sum(Payment.amount).label('total')
-        ).filter(
-            Payment.user_id == user_id
-        ).group_by(
-            func.date_trunc('month', Payment.created_at)
-        ).order_by(text('month desc')).limit(1).all()
- 
-        breakdown = []
-        for month, total in monthly_breakdown:  # or monthly_earnings
-            try:
-                breakdown.append({
-            		"month": month.strftime("%Y-%m"),
-            		"total": float(total)
-        		})
-            except Exception as e:
-                print(f"[DEBUG] Error formatting month/total: month={month}, total={total}, error={e}")
-                continue  # Skip the bad entry
-    
-        return {
-            "total_spent": round(float(total_spent), 2),
-            "transaction_count": total_transactions,
-            "monthly_breakdown": breakdown
+        builders = {
+            'seeker': DashboardController._build_seeker_summary,
+            'escort': DashboardController._build_escort_summary,
+            'admin': DashboardController._build_admin_summary,
         }
- 
-    @staticmethod
-    def get_user_earning_summary(user_id):
-        if not user_id:
+        if role not in builders:
             return None
- 
-        total_earned = db.session.query(func.sum(Payment.amount))\
-            .join(Booking, Payment.booking_id == Booking.id)\
-            .filter(Booking.escort_id == user_id).scalar() or 0
- 
-        total_paid_bookings = db.session.query(func.count(Payment.id))\
-            .join(Booking, Payment.booking_id == Booking.id)\
-            .filter(Booking.escort_id == user_id).scalar() or 0
- 
-        monthly_earnings = db.session.query(
-            func.date_trunc('month', Payment.created_at).label('month'),
-            func.sum(Payment.amount).label('total')
-        ).join(Booking, Payment.booking_id == Booking.id)\
-         .filter(Booking.escort_id == user_id)\
-         .group_by(func.date_trunc('month', Payment.created_at))\
-         .order_by(text('month desc')).limit(6).all()
- 
-        breakdown = [
-            {"month": month.strftime("%Y-%m"), "total": float(total)}
-            for month, total in monthly_earnings
-        ]
- 
-        return {
-            "total_earned": round(float(total_earned), 2),
-            "paid_bookings": total_paid_bookings,
-            "monthly_breakdown": breakdown
-        }
- 
-    @staticmethod
-    def get_favourite_profiles(user_id):
-        favourite_ids = [f.favourite_user_id for f in Favourite.query.filter_by(user_id=user_id).all()]
-        # # favourite_ids = [f.favourite_user_id for f in Favourite.query.filter_by(user_id=session['user_id']).all()]
-        # if favourite_ids:
-        #     return Profile.query.filter(Profile.user_id.in_(favourite_ids)).all()
-        # else: 
-        #     return []
-        
+        cache = _dashboard_cache()
+        if cache.ttl_seconds <= 0:
+            return builders[role](user_id)
         try:
-            favourite_ids = [f.favourite_user_id for f in Favourite.query.filter_by(user_id=user_id).all()]
-            if favourite_ids:
-                return Profile.query.filter(Profile.user_id.in_(favourite_ids)).all()
-            return []
+            version = _version_store().get(_version_key(user_id))
         except Exception as e:
-            print("Error fetching favourites:", e)
-            return []
- 
-    # @staticmethod
-    def get_upcoming_bookings_count(user_id):
-        return db.session.query(Booking).join(
+            # Without the version another worker may have invalidated the entry, so build fresh
+            logger.warning("Dashboard version lookup failed: %s", e)
+            return builders[role](user_id)
+        cached = cache.get((user_id, role))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # The version is read before building, so a change made meanwhile still invalidates this entry
+        summary = builders[role](user_id)
+        cache.set((user_id, role), (version, summary))
+        return summary
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """Drop cached dashboards for these users in every worker, e.g. after a booking or payment changes"""
+        targets = {user_id for user_id in user_ids if user_id}
+        for user_id in targets:
+            try:
+                _version_store().incr(_version_key(user_id), DASHBOARD_VERSION_TTL_SECONDS)
+            except Exception as e:
+                logger.warning("Dashboard version bump failed for user %s: %s", user_id, e)
+        _dashboard_cache().invalidate_where(lambda key: key[0] in targets)
+
+    # Summaries are cached under the version read before building, so they are built on the
+    # primary: a lagging replica could miss the change that bumped the version
+    @staticmethod
+    @primary
+    def _build_seeker_summary(user_id):
+        # 1. Booking tiles in a single pass, counting only bookings with available escorts
+        upcoming, pending = db.session.query(
+            func.count(Booking.id).filter(Booking.status == 'Confirmed'),
+            func.count(Booking.id).filter(Booking.status == 'Pending')
+        ).join(
             User, Booking.escort_id == User.id
         ).filter(
             Booking.seeker_id == user_id,
-            Booking.status == 'Confirmed',
-            User.deleted == False,
-            User.active == True,
-            User.activate == True
-        ).count()
- 
+            DashboardController._is_available(User)
+        ).one()
+
+        # 2. Spending per month; totals are summed from the same rows
+        months = DashboardController._monthly_totals(
+            db.session.query(
+                func.date_trunc('month', Payment.created_at).label('month'),
+                func.sum(Payment.amount),
+                func.count(Payment.id)
+            ).filter(Payment.user_id == user_id)
+        )
+
+        return SeekerDashboard(
+            upcoming_bookings_count=upcoming,
+            pending_bookings_count=pending,
+            total_spent=round(sum(total for _, total, _ in months), 2),
+            completed_bookings=sum(count for _, _, count in months),
+            monthly_breakdown=DashboardController._breakdown(months),
+            favourite_profiles=DashboardController.get_favourite_profiles(user_id)
+        )
+
     @staticmethod
-    def get_booking_requests_count(user_id):
-        return db.session.query(Booking).join(
+    @primary
+    def _build_escort_summary(user_id):
+        requests, upcoming = db.session.query(
+            func.count(Booking.id).filter(Booking.status == 'Pending'),
+            func.count(Booking.id).filter(Booking.status == 'Confirmed')
+        ).join(
             User, Booking.seeker_id == User.id
         ).filter(
             Booking.escort_id == user_id,
-            Booking.status == 'Pending',
-            User.deleted == False,
-            User.active == True,
-            User.activate == True
-        ).count()
- 
-    # @staticmethod
-    # def get_admin_dashboard_counts():
-    #     total_users = User.query.count()
-    #     total_reports = Report.query.filter_by(status='Pending Review').count()
-    #     seeker_to_escort = User.query.filter(User.role == 'seeker', User.pending_role == 'escort').count()
-    #     escort_to_seeker = User.query.filter(User.role == 'escort', User.pending_role == 'seeker').count()
- 
-    #     return {
-    #         'total_users': total_users,
-    #         'total_reports': total_reports,
-    #         'seeker_to_escort_requests': seeker_to_escort,
-    #         'escort_to_seeker_requests': escort_to_seeker
-    #     }
+            DashboardController._is_available(User)
+        ).one()
+
+        months = DashboardController._monthly_totals(
+            db.session.query(
+                func.date_trunc('month', Payment.created_at).label('month'),
+                func.sum(Payment.amount),
+                func.count(Payment.id)
+            ).join(
+                Booking, Payment.booking_id == Booking.id
+            ).filter(Booking.escort_id == user_id)
+        )
+
+        return EscortDashboard(
+            booking_requests_count=requests,
+            upcoming_bookings_count=upcoming,
+            total_earned=round(sum(total for _, total, _ in months), 2),
+            paid_bookings=sum(count for _, _, count in months),
+            monthly_breakdown=DashboardController._breakdown(months),
+            favourite_profiles=DashboardController.get_favourite_profiles(user_id)
+        )
+
+    @staticmethod
+    @primary
+    def _build_admin_summary(user_id):
+        pending_reports = select(func.count(Report.id)).where(
+            Report.status == 'Pending Review'
+        ).scalar_subquery()
+
+        total_users, seeker_to_escort, escort_to_seeker, total_reports = db.session.query(
+            func.count(User.id),
+            func.count(User.id).filter(User.role == 'seeker', User.pending_role == 'escort'),
+            func.count(User.id).filter(User.role == 'escort', User.pending_role == 'seeker'),
+            pending_reports
+        ).one()
+
+        return AdminDashboard(
+            total_users=total_users,
+            total_reports=total_reports,
+            seeker_to_escort_requests=seeker_to_escort,
+            escort_to_seeker_requests=escort_to_seeker
+        )
+
+    @staticmethod
+    @primary
+    def get_favourite_profiles(user_id):
+        """Profiles the user has favourited, in one join"""
+        try:
+            profiles = Profile.query.join(
+                Favourite, Favourite.favourite_user_id == Profile.user_id
+            ).filter(
+                Favourite.user_id == user_id
+            ).order_by(Favourite.created_at.desc()).all()
+            return [
+                FavouriteProfile(
+                    user_id=p.user_id, name=p.name, bio=p.bio,
+                    photo=p.photo, rating=p.rating, age=p.age
+                )
+                for p in profiles
+            ]
+        except Exception as e:
+            print("Error fetching favourites:", e)
+            return []
+
+    @staticmethod
+    def _is_available(user_model):
+        return and_(
+            user_model.deleted == False,
+            user_model.active == True,
+            user_model.activate == True
+        )
+
+    @staticmethod
+    def _monthly_totals(query):
+        """Run a (month, sum, count) query grouped by month, newest first"""
+        month = func.date_trunc('month', Payment.created_at)
+        rows = query.group_by(month).order_by(month.desc()).all()
+        return [(month, float(total or 0), count) for month, total, count in rows]
+
+    @staticmethod
+    def _breakdown(months):
+        breakdown = []
+        for month, total, _ in months[:MONTHLY_BREAKDOWN_MONTHS]:
+            if month is None:
+                continue  # Payments without a timestamp still count towards totals
+            breakdown.append(MonthlyTotal(month=month.strftime("%Y-%m"), total=total))
+        return breakdown
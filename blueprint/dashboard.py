@@ -28,71 +28,9 @@ dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 def dashboard():
     role = session.get('role')
     user_id = session.get('user_id')
-    data = {}
-    
-    # Initialize default values for all variables
-    summary = None
-    favourite_profiles = []
-
-    if role == 'seeker':
-        data['upcoming_bookings_count'] =DashboardController.get_upcoming_bookings_count(user_id)
-        # data['upcoming_bookings_count'] = db.session.query(Booking).join(
-        #     User, Booking.escort_id == User.id
-        # ).filter(
-        #     Booking.seeker_id == user_id,
-        #     Booking.status == 'Confirmed',
-        #     User.deleted == False,
-        #     User.active == True,
-        #     User.activate == True
-        # ).count()
-
-        # Fetch favourite escorts for this seeker
-        # favourite_ids = [f.favourite_user_id for f in Favourite.query.filter_by(user_id=user_id).all()]
-        favourite_ids = DashboardController.get_favourite_profiles(user_id)
-        if favourite_ids:
-            favourite_profiles = Profile.query.filter(Profile.user_id.in_(favourite_ids)).all()
-        else:
-            favourite_profiles = []
-        summary = DashboardController.get_user_spending_summary(user_id)
-        
-    elif role == 'escort':
-        data['booking_requests_count'] = DashboardController.get_booking_requests_count(user_id)
-        # db.session.query(Booking).join(
-        #     User, Booking.seeker_id == User.id
-        # ).filter(
-        #     Booking.escort_id == user_id,
-        #     Booking.status == 'Pending',
-        #     User.deleted == False,
-        #     User.active == True,
-        #     User.activate == True
-        # ).count()
-        
-        # Fetch favourite seeker
-        favourite_ids = [f.favourite_user_id for f in Favourite.query.filter_by(user_id=user_id).all()]
-        if favourite_ids:
-            favourite_profiles = Profile.query.filter(Profile.user_id.in_(favourite_ids)).all()
-        else:
-            favourite_profiles = []
-        summary = DashboardController.get_user_earning_summary(user_id)
-        
-    elif role == 'admin':
-        data['total_users'] = User.query.count()
-        data['total_reports'] = Report.query.filter_by(
-            status='Pending Review').count()
-        data['seeker_to_escort_requests'] = User.query.filter(
-            User.role == 'seeker',
-            User.pending_role == 'escort'
-        ).count()
-
-        data['escort_to_seeker_requests'] = User.query.filter(
-            User.role == 'escort',
-            User.pending_role == 'seeker'
-        ).count()
-        
-        # Admin doesn't need summary or favourite_profiles, but initialize them to avoid errors
-        summary = None
-        favourite_profiles = []
-
-    return render_template('dashboard.html', role=role, data=data, summary=summary, favourite_profiles=favourite_profiles)
 
+    # One typed summary per role (seeker/escort/admin), cached briefly per user
+    summary = DashboardController.get_dashboard_summary(user_id, role)
+    favourite_profiles = summary.favourite_profiles if summary else []
 
+    return render_template('dashboard.html', role=role, data=summary, summary=summary, favourite_profiles=favourite_profiles)
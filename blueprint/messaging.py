@@ -4,6 +4,7 @@ from blueprint.models import Message, User, Profile
 from extensions import db
 from blueprint.decorators import login_required
 from controllers.message_controller import MessageController
+from utils.read_replicas import read_only
 import json
 import os
 
@@ -66,6 +67,7 @@ def serialize_message(msg):
 
 @messaging_bp.route('/')
 @login_required
+@read_only
 def messaging():
     """Main messaging page - shows conversations list"""
     user_id = session['user_id']
@@ -293,6 +295,7 @@ def delete_conversation(user_id):
 
 @messaging_bp.route('/api/conversations')
 @login_required
+@read_only
 def api_conversations():
     """API endpoint to get conversations (for AJAX refresh)"""
     user_id = session['user_id']
@@ -351,6 +354,7 @@ def api_messages(user_id):
 
 @messaging_bp.route('/stats')
 @login_required
+@read_only
 def messaging_stats():
     """Get messaging statistics for current user"""
     user_id = session['user_id']
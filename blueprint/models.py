@@ -2,10 +2,12 @@
 from flask_sqlalchemy import SQLAlchemy
 import datetime
 import logging
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError, HashingError
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from extensions import db  # ✅ Correct place to import from
+from sqlalchemy import event
+from utils.audit_partitions import create_initial_partitions
+from utils.password_hashing import get_password_service
 # db = SQLAlchemy()
 
 # Configure logging for security events
@@ -15,34 +17,11 @@ security_logger.setLevel(logging.INFO)
 
 
 def generate_argon2_hash(password):
-    try:
-        ph = PasswordHasher(
-            memory_cost=65536,      # 64 MB memory usage (increased from 19.5 MB)
-            time_cost=3,            # 3 iterations (increased from 2)
-            parallelism=2,          # 2 threads (increased from 1)
-            hash_len=32,            # 32-byte hash output
-            salt_len=16,            # 16-byte salt
-        )
-        return ph.hash(password)
-    except HashingError as e:
-        raise ValueError(f"Password hashing failed: {e}")
+    # Runs on the shared, bounded hashing pool (utils/password_hashing.py)
+    return get_password_service().hash(password)
 
 def verify_argon2_hash(password_hash, password):
-    try:
-        ph = PasswordHasher(
-            memory_cost=65536,      # Match generation parameters
-            time_cost=3,            # Match generation parameters
-            parallelism=2,          # Match generation parameters
-            hash_len=32,
-            salt_len=16,
-        )
-        ph.verify(password_hash, password)
-        return True
-    except VerifyMismatchError:
-        return False
-    except Exception:
-        # Fail silently for security - any other exception means verification failed
-        return False
+    return get_password_service().verify(password_hash, password)
 
 def is_argon2_hash(password_hash):
     if not password_hash:
@@ -56,13 +35,7 @@ def generate_password_hash(password):
 
 def check_password_hash(password_hash, password):
     """Drop-in replacement for Werkzeug's check_password_hash that supports both Argon2 and legacy PBKDF2"""
-    if is_argon2_hash(password_hash):
-        # Use Argon2 verification for new hashes
-        return verify_argon2_hash(password_hash, password)
-    else:
-        # Fall back to Werkzeug's verification for legacy PBKDF2 hashes
-        from werkzeug.security import check_password_hash as werkzeug_check
-        return werkzeug_check(password_hash, password)
+    return get_password_service().verify(password_hash, password)
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -174,22 +147,19 @@ class User(db.Model):
             return False
             
         try:
-            history_entries = self.password_history.order_by(PasswordHistory.created_at.desc()).limit(limit).all()
+            history_hashes = db.session.query(PasswordHistory.password_hash).filter(
+                PasswordHistory.user_id == self.id
+            ).order_by(PasswordHistory.created_at.desc()).limit(limit).all()
         except Exception as e:
             # Log password history query errors for security monitoring
             security_logger.warning(f"Failed to query password history for user {self.id}: {str(e)}")
             # If there's an issue with the relationship query, skip history check
             return False
         
-        # Check current password
-        if self.password_hash and check_password_hash(self.password_hash, password):
-            return True
-            
-        # Check password history
-        for entry in history_entries:
-            if check_password_hash(entry.password_hash, password):
-                return True
-        return False
+        # Current password first, then history newest first; verified in parallel,
+        # stopping at the first match
+        candidates = [self.password_hash] + [entry.password_hash for entry in history_hashes]
+        return get_password_service().verify_any(candidates, password)
     
     def is_password_expired(self):
         """Check if user's password has expired"""
@@ -236,9 +206,49 @@ class User(db.Model):
             return "Deleted User"
         return self.profile.name if self.profile else self.email.split('@')[0]
     
-    def check_password(self, password):
-        """Enhanced password checking with security features"""
-        return check_password_hash(self.password_hash, password)
+    def check_password(self, password, upgrade=False):
+        """
+        Enhanced password checking with security features.
+        With upgrade=True (the login path), a correct password stored under an outdated
+        or legacy hash starts a rehash on the hashing pool; apply_pending_rehash()
+        stores it with the login commit. Other checks leave the hash alone.
+        """
+        if not check_password_hash(self.password_hash, password):
+            return False
+        service = get_password_service()
+        if upgrade and service.needs_rehash(self.password_hash):
+            future = service.hash_async(password)
+            if future is not None:
+                service.count('rehash_started')
+                self._pending_rehash = (self.password_hash, future)
+        return True
+
+    def apply_pending_rehash(self, timeout=None):
+        """
+        Swap in the upgraded hash started by check_password. Returns True if the hash changed.
+        Waits at most the service's rehash_wait_seconds; a rehash not ready by then is skipped
+        and tried again on the next login.
+        """
+        pending = getattr(self, '_pending_rehash', None)
+        self._pending_rehash = None
+        if pending is None:
+            return False
+        old_hash, future = pending
+        service = get_password_service()
+        try:
+            new_hash = future.result(timeout=service.rehash_wait_seconds if timeout is None else timeout)
+        except FutureTimeoutError:
+            service.count('rehash_skipped_slow')
+            return False
+        except Exception as e:
+            security_logger.warning(f"Password rehash failed for user {self.id}: {e}")
+            return False
+        if self.password_hash != old_hash:
+            return False  # Password changed meanwhile
+        self.password_hash = new_hash
+        service.count('rehash_applied')
+        security_logger.info(f"Upgraded password hash for user {self.id}")
+        return True
 
     def __repr__(self):
         return f'<User {self.email}>'
@@ -298,9 +308,63 @@ class Payment(db.Model):
     transaction_id = db.Column(db.String(100), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    # Client-supplied key: a re-submitted payment form returns the original payment instead of charging again
+    idempotency_key = db.Column(db.String(64), nullable=True)
 
     booking = db.relationship('Booking', backref='payments')
 
+    __table_args__ = (
+        # At most one completed payment per booking
+        db.Index('uq_payment_booking_completed', 'booking_id', unique=True,
+                 postgresql_where=db.text("status = 'Completed'"),
+                 sqlite_where=db.text("status = 'Completed'")),
+        # Paginated transaction history per user
+        db.Index('ix_payment_user_created', 'user_id', 'created_at'),
+        # Keys are generated per client, so they only need to be unique per user
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_payment_user_idempotency_key'),
+    )
+
+class PaymentToken(db.Model):
+    """Single-use payment token shared by all workers (see utils/payment_token_store.py)"""
+    __tablename__ = 'payment_token'
+
+    token = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id', ondelete='CASCADE'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Used by purge of expired tokens
+    used = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<PaymentToken booking:{self.booking_id} user:{self.user_id} used:{self.used}>'
+
+class EmailOutbox(db.Model):
+    """Outgoing email, delivered by the `flask email-worker` process (see utils/email_outbox.py)"""
+    __tablename__ = 'email_outbox'
+
+    STATUSES = ('pending', 'sent', 'dead')
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(254), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body_text = db.Column(db.Text, nullable=False)
+    body_html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(10), default='pending', nullable=False)  # 'dead' = gave up, kept for review
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # The worker's claim query: due pending mail, oldest first
+        db.Index('ix_email_outbox_pending_due', 'next_attempt_at', 'id',
+                 postgresql_where=db.text("status = 'pending'")),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to:{self.to_email} {self.status}>'
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     reporter_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -414,6 +478,38 @@ class Rating(db.Model):
     
     def __repr__(self):
         return f'<Rating {self.rating}/5 for booking {self.booking_id}>'
+
+class RatingAggregate(db.Model):
+    """
+    Running totals of the ratings a user has received.
+    Maintained incrementally by RatingController.record_rating so statistics
+    and Profile.rating never need to scan the rating table.
+    """
+    __tablename__ = 'rating_aggregate'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    # Per-star histogram
+    stars_1 = db.Column(db.Integer, default=0, nullable=False)
+    stars_2 = db.Column(db.Integer, default=0, nullable=False)
+    stars_3 = db.Column(db.Integer, default=0, nullable=False)
+    stars_4 = db.Column(db.Integer, default=0, nullable=False)
+    stars_5 = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    @property
+    def average(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def distribution(self):
+        return {star: getattr(self, f'stars_{star}') or 0 for star in range(1, 6)}
+
+    def __repr__(self):
+        return f'<RatingAggregate user:{self.user_id} {self.rating_count} ratings avg:{self.average}>'
     
 # // To test
 # class Favourite(db.Model):
@@ -430,20 +526,61 @@ class Rating(db.Model):
 #     def __repr__(self):
 #         return f"<Favourite by {self.user_id} → {self.favourite_user_id}>"
     
+# Audit categories, derived from the action text when an event is written.
+# The first matching substring wins, so 'admin unban user' is admin_unban, not admin_ban.
+AUDIT_CATEGORY_RULES = (
+    ('lock', 'lockout'),
+    ('unban', 'admin_unban'),
+    ('ban', 'admin_ban'),
+    ('delete', 'admin_delete'),
+    ('fail', 'auth_fail'),
+    ('login', 'auth_success'),
+    ('password', 'password_change'),
+    ('role', 'role_change'),
+    ('deactivate', 'account'),
+    ('security', 'session_security'),
+)
+AUDIT_CATEGORIES = tuple(dict.fromkeys(category for _, category in AUDIT_CATEGORY_RULES)) + ('other',)
+
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_log'  # explicit table name for clarity
-    id = db.Column(db.Integer, primary_key=True)
+    # Monthly range partitions on created_at (see utils/audit_partitions.py),
+    # so created_at is part of the primary key and must always be set
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    created_at = db.Column(db.DateTime, primary_key=True, default=datetime.datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     action = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.Enum(*AUDIT_CATEGORIES, name='audit_category'), nullable=False, default='other')
     details = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     # Relationship back to User
     user = db.relationship('User', backref='audit_logs')
 
+    # Admin log filters
+    FAILURE_CATEGORIES = ('auth_fail', 'lockout')
+    SUSPICIOUS_CATEGORIES = ('admin_ban', 'admin_unban', 'admin_delete')
+
+    __table_args__ = (
+        db.Index('ix_audit_log_category_created', 'category', 'created_at'),
+        db.Index('ix_audit_log_created_at', 'created_at'),
+        db.Index('ix_audit_log_user_created', 'user_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    @staticmethod
+    def categorize(action):
+        action = (action or '').lower()
+        for needle, category in AUDIT_CATEGORY_RULES:
+            if needle in action:
+                return category
+        return 'other'
+
     def __repr__(self):
         return f"<AuditLog {self.id} {self.action} by {self.user_id}>"
 
+event.listen(AuditLog.__table__, 'after_create', create_initial_partitions)
+
 class Favourite(db.Model):
     __tablename__ = 'favourites'
 
@@ -1,47 +1,35 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort
 from extensions import db
+from sqlalchemy.exc import IntegrityError
 from blueprint.models import Booking, Payment, User
 from blueprint.decorators import login_required
 from flask_wtf.csrf import generate_csrf
 from datetime import datetime, timedelta
 from uuid import uuid4
-import secrets
 import logging
 
 from controllers.security_controller import SecurityController
+from utils.payment_token_store import get_payment_token_store
+from blueprint.controller.dashboard_controller import DashboardController
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/payment')
 logger = logging.getLogger(__name__)
 
-payment_tokens = {}
-TOKEN_EXPIRY_SECONDS = 300
+HISTORY_PAGE_SIZE = 10
 
 
 def generate_payment_token(user_id, booking_id):
-    token = secrets.token_urlsafe(32)
-    expires_at = datetime.utcnow() + timedelta(seconds=TOKEN_EXPIRY_SECONDS)
-    payment_tokens[token] = {
-        'user_id': user_id,
-        'booking_id': booking_id,
-        'expires_at': expires_at,
-        'used': False
-    }
+    token = get_payment_token_store().issue(user_id, booking_id)
     logger.info(f"Payment token issued for booking {booking_id} by user {user_id}.")
     return token
 
 
 def validate_payment_token(token, user_id):
-    entry = payment_tokens.get(token)
-    if not entry:
-        return False
-    if entry['user_id'] != user_id or entry['used'] or datetime.utcnow() > entry['expires_at']:
-        return False
-    return True
+    return get_payment_token_store().get(token, user_id) is not None
 
 
 def mark_token_used(token):
-    if token in payment_tokens:
-        payment_tokens[token]['used'] = True
+    get_payment_token_store().revoke(token)
 
 @payment_bp.route('/initiate/<int:booking_id>', methods=['GET'])
 @login_required
@@ -81,17 +69,96 @@ def initiate_payment(booking_id):
     return redirect(url_for('payment.payment_page', token=token))
 
 
+def find_replayed_payment(user_id, idempotency_key):
+    """
+    Return the payment this user already captured with this idempotency key, if any.
+    Callers must check its booking_id: the key only replays a payment for the same booking.
+    """
+    if not idempotency_key:
+        return None
+    return Payment.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+
+
+def capture_payment(token, user_id, idempotency_key, rate_per_minute):
+    """
+    Capture a payment in a single transaction.
+    The booking row is locked (SELECT ... FOR UPDATE) while the token is consumed,
+    the payment is inserted and the booking status is updated, so concurrent
+    submits for the same booking serialise and only one can pay.
+    Returns: (payment, created) - created is False when an earlier payment was returned instead
+    """
+    token_store = get_payment_token_store()
+    try:
+        booking_id = token_store.get(token, user_id)
+        if booking_id is None:
+            return None, False
+
+        booking = Booking.query.filter_by(id=booking_id).with_for_update().populate_existing().first()
+        if booking is None or booking.seeker_id != user_id:
+            db.session.rollback()
+            return None, False
+
+        existing = Payment.query.filter_by(booking_id=booking_id, status='Completed').first()
+        if existing:
+            db.session.rollback()
+            return existing, False
+
+        # Validate and consume in one step so a double-submit cannot pay twice
+        if token_store.consume(token, user_id, commit=False) is None:
+            db.session.rollback()
+            return None, False
+
+        duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
+        payment = Payment(
+            user_id=user_id,
+            amount=duration_minutes * rate_per_minute,
+            status='Completed',
+            transaction_id=str(uuid4()),
+            booking_id=booking_id,
+            idempotency_key=idempotency_key
+        )
+        db.session.add(payment)
+        booking.status = 'Confirmed'
+        db.session.commit()
+        DashboardController.invalidate(booking.seeker_id, booking.escort_id)
+        return payment, True
+    except IntegrityError:
+        # Lost a race on the idempotency key or the one-completed-payment-per-booking index
+        db.session.rollback()
+        existing = find_replayed_payment(user_id, idempotency_key)
+        if existing is None or existing.booking_id != booking_id:
+            existing = Payment.query.filter_by(booking_id=booking_id, status='Completed').first()
+        return existing, False
+
+
 @payment_bp.route('/pay', methods=['GET', 'POST'])
 @login_required
 def payment_page():
     user_id = session['user_id']
     token = request.form.get('token') if request.method == 'POST' else request.args.get('token')
 
-    if not validate_payment_token(token, user_id):
+    if request.method == 'POST':
+        SecurityController.check_csrf_token(request.form.get('csrf_token'))
+
+        # A re-submitted form (double click, retry after a timeout) returns the original result
+        idempotency_key = str(SecurityController.sanitize_input(request.form.get('idempotency_key')))[:64] or None
+        replayed = find_replayed_payment(user_id, idempotency_key)
+        if replayed:
+            # The token is used by now, but still names the booking it was issued for
+            if replayed.booking_id == get_payment_token_store().booking_of(token, user_id):
+                logger.info(f"Idempotent replay of payment for booking {replayed.booking_id} by user {user_id}. TXN: {replayed.transaction_id}")
+                flash("Payment successful. Booking confirmed.", "success")
+                return redirect(url_for('booking.booking'))
+            # A key from another booking's form: this payment proceeds without it
+            logger.warning(f"User {user_id} reused the idempotency key of booking {replayed.booking_id} for another payment")
+            idempotency_key = None
+
+    token_store = get_payment_token_store()
+    booking_id = token_store.get(token, user_id)
+    if booking_id is None:
         logger.warning(f"User {user_id} attempted to use invalid/expired token: {token}")
         abort(403, description="Invalid or expired payment token")
 
-    booking_id = payment_tokens[token]['booking_id']
     booking = Booking.query.get_or_404(booking_id)
     escort = User.query.get_or_404(booking.escort_id)
 
@@ -100,8 +167,6 @@ def payment_page():
     amount_due = duration_minutes * rate_per_minute
 
     if request.method == 'POST':
-        SecurityController.check_csrf_token(request.form.get('csrf_token'))
-
         # SIMULATION MODE: Accept test card numbers only
         # This is a payment simulation - no real payment processing
         card_number = SecurityController.sanitize_input(request.form.get('card_number'))
@@ -133,25 +198,24 @@ def payment_page():
         # IMPORTANT: Never store real payment data - this is simulation only
         # In production, use payment processors like Stripe, PayPal, etc.
         
-        transaction_id = str(uuid4())
-        new_payment = Payment(
-            user_id=user_id,
-            amount=amount_due,
-            status='Completed',
-            transaction_id=transaction_id,
-            booking_id=booking_id 
-        )
-        db.session.add(new_payment)
-
-        booking.status = 'Confirmed'
-        mark_token_used(token)
-        db.session.commit()
-
-        logger.info(f"Payment successful for booking {booking_id} by user {user_id}. TXN: {transaction_id}")
+        payment, created = capture_payment(token, user_id, idempotency_key, rate_per_minute)
+        if payment is None:
+            logger.warning(f"User {user_id} attempted to reuse payment token for booking {booking_id}")
+            abort(403, description="Invalid or expired payment token")
+
+        if created:
+            logger.info(f"Payment successful for booking {booking_id} by user {user_id}. TXN: {payment.transaction_id}")
+        else:
+            logger.warning(f"Duplicate payment attempt for booking {booking_id} by user {user_id}. Existing TXN: {payment.transaction_id}")
         flash("Payment successful. Booking confirmed.", "success")
         return redirect(url_for('booking.booking'))
 
-    history = Payment.query.filter_by(user_id=user_id).order_by(Payment.created_at.desc()).all()
+    # Paginated history - served by the (user_id, created_at) index
+    page = max(request.args.get('page', 1, type=int), 1)
+    rows = Payment.query.filter_by(user_id=user_id)\
+                        .order_by(Payment.created_at.desc(), Payment.id.desc())\
+                        .offset((page - 1) * HISTORY_PAGE_SIZE)\
+                        .limit(HISTORY_PAGE_SIZE + 1).all()
     return render_template(
         'payment.html',
         booking=booking,
@@ -159,12 +223,14 @@ def payment_page():
         amount_due=amount_due,
         token=token,
         csrf_token=generate_csrf(),
-        history=history
+        idempotency_key=str(uuid4()),
+        history=rows[:HISTORY_PAGE_SIZE],
+        history_page=page,
+        history_has_next=len(rows) > HISTORY_PAGE_SIZE
     )
 
 
 
-
 '''
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort
 from extensions import db
@@ -68,24 +68,25 @@ def my_ratings():
 def rateable_bookings():
     """View bookings that can be rated"""
     user_id = session['user_id']
-    bookings = RatingController.get_rateable_bookings(user_id)
+    page = max(request.args.get('page', 1, type=int), 1)
+    bookings, has_next = RatingController.get_rateable_bookings(user_id, page=page)
     
-    # Get additional info for each booking
+    # Counterpart user and profile are already eager-loaded with the booking
     booking_data = []
     for booking in bookings:
-        other_user_id = booking.escort_id if booking.seeker_id == user_id else booking.seeker_id
-        other_user = User.query.get(other_user_id)
-        other_profile = Profile.query.filter_by(user_id=other_user_id).first()
+        other_user = booking.escort if booking.seeker_id == user_id else booking.seeker
         
         booking_data.append({
             'booking': booking,
             'other_user': other_user,
-            'other_profile': other_profile,
-            'is_escort': booking.escort_id == other_user_id
+            'other_profile': other_user.profile,
+            'is_escort': booking.escort_id == other_user.id
         })
     
     return render_template('ratings/rateable_bookings.html', 
-                         booking_data=booking_data)
+                         booking_data=booking_data,
+                         page=page,
+                         has_next=has_next)
 
 @rating_bp.route('/user/<int:user_id>')
 @login_required
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify, session, redirec
 from blueprint.decorators import login_required, admin_required
 from controllers.report_controller import ReportController
 from blueprint.models import db, User, Profile, Report
+from utils.read_replicas import read_only
 import json
 
 report_bp = Blueprint('report', __name__, url_prefix='/report')
@@ -100,6 +101,7 @@ def my_reports():
 
 @report_bp.route('/admin')
 @admin_required
+@read_only
 def admin_dashboard():
     """Admin dashboard for managing reports"""
     status_filter = request.args.get('status')
@@ -174,6 +176,7 @@ def update_report_status():
 
 @report_bp.route('/admin/report/<int:report_id>')
 @admin_required
+@read_only
 def view_report_details(report_id):
     """View detailed report information"""
     report = Report.query.get_or_404(report_id)
@@ -192,6 +195,7 @@ def view_report_details(report_id):
 
 @report_bp.route('/admin/statistics')
 @admin_required
+@read_only
 def report_statistics():
     """View report statistics and analytics"""
     statistics = ReportController.get_report_statistics()
@@ -220,6 +224,7 @@ def report_statistics():
 
 @report_bp.route('/user/<int:user_id>/reports')
 @admin_required
+@read_only
 def user_report_history(user_id):
     """View all reports related to a specific user"""
     user = User.query.get_or_404(user_id)
@@ -9,31 +9,70 @@ class DBConfig:
     database: str
     user: str
     password: str
-    minconn: int = 1
-    maxconn: int = 10
-    # SSL configuration
-    ssl_mode: str = 'require'
+    # Connection pool (one SQLAlchemy pool per process, shared by the ORM and PostgresConnector)
+    pool_size: int = None  # Connections kept open
+    max_overflow: int = None  # Extra connections allowed under load, closed when returned
+    pool_timeout: float = None  # Seconds to wait for a free connection
+    pool_recycle: int = None  # Reconnect connections older than this many seconds
+    pool_pre_ping: bool = None  # Test connections on checkout
+    pool_pre_ping_interval: float = None  # Only test connections idle longer than this (0 = every checkout)
+    # SSL configuration (ssl_mode None leaves libpq's default, or the sslmode in DATABASE_URL)
+    ssl_mode: str = None
     ssl_cert: str = None
     ssl_key: str = None
     ssl_ca: str = None
     
     def __post_init__(self):
         """Set SSL configuration based on environment"""
-        # Check if running in development mode
-        is_development = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
-        is_ci_mode = os.getenv('CI') == 'true' or os.getenv('GITHUB_ACTIONS') == 'true'
-        
-        # Get custom SSL mode from environment
-        custom_ssl_mode = os.getenv('DATABASE_SSL_MODE')
-        
-        # In development or CI, allow less strict SSL
-        if is_development or is_ci_mode:
-            self.ssl_mode = custom_ssl_mode if custom_ssl_mode else 'prefer'
-        else:
-            # Production: require SSL
-            self.ssl_mode = custom_ssl_mode if custom_ssl_mode else 'require'
+        # Only an explicit DATABASE_SSL_MODE changes how connections are made. The ORM never passed an
+        # sslmode, and the compose database has no SSL, so a default of 'require' would refuse to connect
+        if self.ssl_mode is None:
+            self.ssl_mode = os.getenv('DATABASE_SSL_MODE') or None
         
         # SSL certificate configuration (optional)
         self.ssl_cert = os.getenv('DATABASE_SSL_CERT')
         self.ssl_key = os.getenv('DATABASE_SSL_KEY') 
         self.ssl_ca = os.getenv('DATABASE_SSL_CA')
+        
+        # Pool settings from the environment unless given explicitly
+        if self.pool_size is None:
+            self.pool_size = int(os.getenv('DATABASE_POOL_SIZE', '5'))
+        if self.max_overflow is None:
+            self.max_overflow = int(os.getenv('DATABASE_MAX_OVERFLOW', '5'))
+        if self.pool_timeout is None:
+            self.pool_timeout = float(os.getenv('DATABASE_POOL_TIMEOUT', '30'))
+        if self.pool_recycle is None:
+            self.pool_recycle = int(os.getenv('DATABASE_POOL_RECYCLE', '1800'))
+        if self.pool_pre_ping is None:
+            self.pool_pre_ping = os.getenv('DATABASE_POOL_PRE_PING', 'true').lower() == 'true'
+        if self.pool_pre_ping_interval is None:
+            self.pool_pre_ping_interval = float(os.getenv('DATABASE_POOL_PRE_PING_INTERVAL', '30'))
+    
+    def ssl_enforced(self):
+        """Whether the configured mode refuses unencrypted connections"""
+        return self.ssl_mode in ('require', 'verify-ca', 'verify-full')
+    
+    def connect_args(self):
+        """psycopg2 connection arguments for SSL"""
+        args = {}
+        if self.ssl_mode:
+            args['sslmode'] = self.ssl_mode
+        if self.ssl_cert:
+            args['sslcert'] = self.ssl_cert
+        if self.ssl_key:
+            args['sslkey'] = self.ssl_key
+        if self.ssl_ca:
+            args['sslrootcert'] = self.ssl_ca
+        return args
+    
+    def engine_options(self):
+        """SQLALCHEMY_ENGINE_OPTIONS for the app's single connection pool"""
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            # With an interval, PostgresConnector pings idle connections itself
+            'pool_pre_ping': self.pool_pre_ping and self.pool_pre_ping_interval <= 0,
+            'connect_args': self.connect_args(),
+        }
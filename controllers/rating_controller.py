@@ -1,5 +1,8 @@
 from flask import session, jsonify, request
-from blueprint.models import db, User, Booking, Rating, Profile
+from blueprint.models import db, User, Booking, Rating, Profile, RatingAggregate
+from sqlalchemy import func, case, exists, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime
 
 
@@ -72,8 +75,8 @@ class RatingController:
             
             db.session.add(rating)
             
-            # Update user's average rating
-            RatingController.update_user_average_rating(reviewed_id)
+            # Update the reviewed user's running totals and average rating
+            RatingController.record_rating(reviewed_id, rating_value)
             
             db.session.commit()
             return True, rating
@@ -85,23 +88,97 @@ class RatingController:
                 pass  # Ignore rollback errors
             return False, str(e)
     
+    @staticmethod
+    def record_rating(user_id, rating_value):
+        """
+        Add one rating to a user's aggregate counters and refresh Profile.rating.
+        A single upsert, so concurrent submissions for the same user cannot lose updates.
+        """
+        star_column = f'stars_{rating_value}'
+        stmt = insert(RatingAggregate).values(
+            user_id=user_id,
+            rating_count=1,
+            rating_sum=rating_value,
+            updated_at=datetime.utcnow(),
+            **{star_column: 1}
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RatingAggregate.user_id],
+            set_={
+                'rating_count': RatingAggregate.rating_count + 1,
+                'rating_sum': RatingAggregate.rating_sum + rating_value,
+                star_column: getattr(RatingAggregate, star_column) + 1,
+                'updated_at': datetime.utcnow(),
+            }
+        ).returning(RatingAggregate.rating_count, RatingAggregate.rating_sum)
+        count, total = db.session.execute(stmt).one()
+
+        Profile.query.filter_by(user_id=user_id).update(
+            {'rating': round(total / count, 1)}, synchronize_session=False
+        )
+
     @staticmethod
     def update_user_average_rating(user_id):
-        """Update a user's average rating in their profile"""
+        """Update a user's average rating in their profile from the aggregate counters"""
         try:
-            # Calculate average rating
-            ratings = Rating.query.filter_by(reviewed_id=user_id).all()
-            if ratings:
-                avg_rating = sum(r.rating for r in ratings) / len(ratings)
-                avg_rating = round(avg_rating, 1)
-                
-                # Update profile
+            aggregate = db.session.get(RatingAggregate, user_id)
+            if aggregate and aggregate.rating_count:
                 profile = Profile.query.filter_by(user_id=user_id).first()
                 if profile:
-                    profile.rating = avg_rating
+                    profile.rating = aggregate.average
             
         except Exception as e:
             print(f"Error updating average rating: {e}")
+
+    @staticmethod
+    def recompute_rating_aggregates(dry_run=False):
+        """
+        Rebuild every user's aggregate counters (and Profile.rating) from the rating table.
+        Used to backfill existing data and to check the counters for drift.
+        Returns: list of user_ids whose stored counters did not match
+        """
+        star_counts = [
+            func.count(case((Rating.rating == star, 1))).label(f'stars_{star}')
+            for star in range(1, 6)
+        ]
+        rows = db.session.query(
+            Rating.reviewed_id,
+            func.count(Rating.id),
+            func.coalesce(func.sum(Rating.rating), 0),
+            *star_counts
+        ).group_by(Rating.reviewed_id).all()
+
+        existing = {aggregate.user_id: aggregate for aggregate in RatingAggregate.query.all()}
+        mismatched = []
+
+        for user_id, count, total, *stars in rows:
+            expected = {'rating_count': count, 'rating_sum': int(total)}
+            expected.update({f'stars_{star}': stars[star - 1] for star in range(1, 6)})
+
+            aggregate = existing.pop(user_id, None)
+            if aggregate is None or any(getattr(aggregate, key) != value for key, value in expected.items()):
+                mismatched.append(user_id)
+                if not dry_run:
+                    if aggregate is None:
+                        aggregate = RatingAggregate(user_id=user_id)
+                        db.session.add(aggregate)
+                    for key, value in expected.items():
+                        setattr(aggregate, key, value)
+
+            if not dry_run:
+                Profile.query.filter_by(user_id=user_id).update(
+                    {'rating': round(total / count, 1)}, synchronize_session=False
+                )
+
+        # Aggregates left over belong to users with no ratings any more
+        for user_id, aggregate in existing.items():
+            mismatched.append(user_id)
+            if not dry_run:
+                db.session.delete(aggregate)
+
+        if not dry_run:
+            db.session.commit()
+        return mismatched
     
     @staticmethod
     def get_user_ratings(user_id, limit=10):
@@ -123,48 +200,44 @@ class RatingController:
         return Rating.query.filter_by(booking_id=booking_id).all()
     
     @staticmethod
-    def get_rateable_bookings(user_id):
-        """Get bookings that user can rate"""
-        # Get confirmed bookings where user participated but hasn't rated yet
-        confirmed_bookings = Booking.query.filter(
-            ((Booking.seeker_id == user_id) | (Booking.escort_id == user_id)),
-            Booking.status == 'Confirmed'
-        ).all()
-        
-        rateable = []
-        for booking in confirmed_bookings:
-            # Check if user has already rated this booking
-            existing_rating = Rating.query.filter_by(
-                booking_id=booking.id,
-                reviewer_id=user_id
-            ).first()
-            
-            if not existing_rating:
-                rateable.append(booking)
+    def get_rateable_bookings(user_id, page=1, per_page=20):
+        """
+        Get a page of bookings that user can rate.
+        One query: confirmed bookings the user took part in, anti-joined against
+        the user's own ratings, with both participants' profiles eager-loaded.
+        Returns: (bookings, has_next)
+        """
+        already_rated = exists().where(
+            Rating.booking_id == Booking.id,
+            Rating.reviewer_id == user_id
+        )
+        bookings = Booking.query.filter(
+            or_(Booking.seeker_id == user_id, Booking.escort_id == user_id),
+            Booking.status == 'Confirmed',
+            ~already_rated
+        ).options(
+            joinedload(Booking.seeker).joinedload(User.profile),
+            joinedload(Booking.escort).joinedload(User.profile)
+        ).order_by(
+            Booking.start_time.desc(), Booking.id.desc()
+        ).offset((page - 1) * per_page).limit(per_page + 1).all()
         
-        return rateable
+        return bookings[:per_page], len(bookings) > per_page
     
     @staticmethod
     def get_rating_statistics(user_id):
         """Get rating statistics for a user"""
-        ratings = Rating.query.filter_by(reviewed_id=user_id).all()
+        aggregate = db.session.get(RatingAggregate, user_id)
         
-        if not ratings:
+        if not aggregate or not aggregate.rating_count:
             return {
                 'total_ratings': 0,
                 'average_rating': 0,
                 'rating_distribution': {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
             }
         
-        total = len(ratings)
-        average = sum(r.rating for r in ratings) / total
-        
-        distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in ratings:
-            distribution[rating.rating] += 1
-        
         return {
-            'total_ratings': total,
-            'average_rating': round(average, 1),
-            'rating_distribution': distribution
+            'total_ratings': aggregate.rating_count,
+            'average_rating': aggregate.average,
+            'rating_distribution': aggregate.distribution
         }
@@ -1,121 +1,208 @@
-import psycopg2
-from psycopg2 import pool
 import logging
-import os
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
 
 from config.db_config import DBConfig
+from utils.query_stats import record_pool_wait
 
 # Configure logging for database operations
 logger = logging.getLogger(__name__)
 
 
-class PostgresConnector:
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_seconds_total = 0.0
+        self._wait_lock = threading.Lock()
 
-    def __init__(self, config: DBConfig):
+    def _do_get(self):
+        started = time.perf_counter()
         try:
-            # print("\n")
-            # print("config.port is:")
-            # print(config.port)
-            # print("\n")
-            
-            # Build connection parameters with SSL support
-            connection_params = {
-                'host': config.host,
-                'port': config.port,
-                'database': config.database,
-                'user': config.user,
-                'password': config.password,
-                'sslmode': config.ssl_mode,
-                'minconn': config.minconn,
-                'maxconn': config.maxconn
-            }
-            
-            # Add SSL certificate parameters if provided
-            if config.ssl_cert:
-                connection_params['sslcert'] = config.ssl_cert
-            if config.ssl_key:
-                connection_params['sslkey'] = config.ssl_key  
-            if config.ssl_ca:
-                connection_params['sslrootcert'] = config.ssl_ca
-            
-            # Log SSL configuration (without sensitive data)
-            ssl_status = "enabled" if config.ssl_mode in ['require', 'verify-ca', 'verify-full'] else "preferred"
-            logger.info(f"Database SSL mode: {config.ssl_mode} ({ssl_status})")
-            
-            self.pool = psycopg2.pool.ThreadedConnectionPool(**connection_params)
-            print("PostgreSQL connection pool established with SSL security.")
-            
-        except Exception as error:
-            # Log detailed error for administrators, but don't expose system details to users
-            logger.error(f"Database connection pool initialization failed. Check database configuration.")
-            logger.debug(f"Database error details: {str(error)}")  # Debug level for detailed error
-            print("Database connection unavailable. Please try again later.")
-            self.pool = None
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            with self._wait_lock:
+                self.wait_seconds_total += waited
+            record_pool_wait(waited)
+
+
+class PoolMetrics:
+    """Counters for one SQLAlchemy pool, kept up to date by pool events"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._counts = {
+            'connections_created': 0,
+            'checkouts': 0,
+            'checkins': 0,
+            'invalidations': 0,
+            'held_seconds_total': 0.0,
+            'held_seconds_max': 0.0,
+        }
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def _bump(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._bump('connections_created')
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.monotonic()
+        self._bump('checkouts')
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        with self._lock:
+            self._counts['checkins'] += 1
+            if checked_out_at is not None:
+                held = time.monotonic() - checked_out_at
+                self._counts['held_seconds_total'] += held
+                self._counts['held_seconds_max'] = max(self._counts['held_seconds_max'], held)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._bump('invalidations')
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        # The engine replaces its pool on dispose(), so look it up each time
+        counts['wait_seconds_total'] = getattr(self.engine.pool, 'wait_seconds_total', 0.0)
+        return counts
+
+
+class InsecureConnectionError(Exception):
+    """A new database connection came up without SSL although DATABASE_SSL_MODE requires it"""
+
+
+class ConnectionChecks:
+    """
+    Per-connection checks, run by pool events rather than on every checkout.
+    SSL is checked once when a physical connection is opened (a reconnect
+    opens a new one and is checked again); the result is kept in the
+    connection record's info. Connections idle for longer than
+    pre_ping_interval are pinged on checkout and replaced if dead.
+    """
+
+    def __init__(self, engine, config: DBConfig):
+        self.engine = engine
+        # Unencrypted connections are refused only when DATABASE_SSL_MODE asks for SSL, otherwise logged
+        self.require_ssl = config.ssl_enforced()
+        # The pool pings every checkout itself when pre-ping has no interval
+        self.pre_ping_interval = config.pool_pre_ping_interval if config.pool_pre_ping else None
+        self._lock = threading.Lock()
+        self._counts = {'ssl_validations': 0, 'pings': 0, 'stale_connections': 0}
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkin', self._on_checkin)
+        if self.pre_ping_interval and self.pre_ping_interval > 0:
+            event.listen(engine, 'checkout', self._on_checkout)
+
+    def _bump(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        # Read from libpq, so no query is needed
+        ssl_in_use = bool(dbapi_connection.info.ssl_in_use)
+        connection_record.info['ssl_in_use'] = ssl_in_use
+        connection_record.info['last_used'] = time.monotonic()
+        self._bump('ssl_validations')
+        if ssl_in_use:
+            logger.debug("Database connection is using SSL encryption")
+        elif self.require_ssl:
+            logger.error("SSL connection required by DATABASE_SSL_MODE but not established")
+            # The pool does not close a connection whose connect handler raises, so close it here
+            dbapi_connection.close()
+            raise InsecureConnectionError("Secure connection required")
+        else:
+            logger.warning("Database connection is not using SSL encryption")
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info['last_used'] = time.monotonic()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        idle = time.monotonic() - connection_record.info.get('last_used', 0)
+        if idle < self.pre_ping_interval:
+            return
+        self._bump('pings')
+        try:
+            self.engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            self._bump('stale_connections')
+            logger.info(f"Replacing stale database connection after {idle:.0f}s idle: {e}")
+            # The pool discards this connection and retries the checkout with a new one
+            raise exc.DisconnectionError() from e
+        connection_record.info['last_used'] = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class PostgresConnector:
+    """
+    Raw DBAPI connections for code that does not use the ORM.
+    Connections come from the Flask-SQLAlchemy engine's pool (configured from
+    DBConfig), so each process keeps a single pool to Postgres.
+    """
+
+    def __init__(self, config: DBConfig, engine):
+        self.config = config
+        self.engine = engine
+        self.pool = engine.pool
+        self.metrics = PoolMetrics(engine)
+        self.checks = ConnectionChecks(engine, config)
+        
+        # Log SSL configuration (without sensitive data)
+        ssl_status = "enabled" if config.ssl_enforced() else "preferred"
+        logger.info(f"Database SSL mode: {config.ssl_mode or 'libpq default'} ({ssl_status})")
+        logger.info(
+            f"Database pool: size {config.pool_size}, overflow {config.max_overflow}, "
+            f"recycle {config.pool_recycle}s, pre-ping {config.pool_pre_ping} "
+            f"(idle over {config.pool_pre_ping_interval}s)"
+        )
 
     def get_connection(self):
-        if not self.pool:
-            logger.warning("Attempted to get connection from uninitialized pool")
-            raise Exception("Database service temporarily unavailable")
         try:
-            conn = self.pool.getconn()
-            # Validate SSL connection in production
-            self._validate_ssl_connection(conn)
-            return conn
+            # A pooled DBAPI connection; close() (see return_connection) hands it back to the pool.
+            # SSL was validated when the pool opened it (ConnectionChecks).
+            return self.engine.raw_connection()
         except Exception as error:
             logger.error("Failed to acquire database connection")
             logger.debug(f"Connection acquisition error: {str(error)}")
             raise Exception("Database connection unavailable")
 
-    def _validate_ssl_connection(self, conn):
-        """Validate that the connection is using SSL encryption"""
-        try:
-            with conn.cursor() as cursor:
-                # Check if SSL is enabled on the connection
-                cursor.execute("SELECT ssl_is_used()")
-                ssl_used = cursor.fetchone()[0]
-                
-                if not ssl_used:
-                    # Get environment to determine if SSL is required
-                    is_production = not (
-                        os.getenv('FLASK_ENV') == 'development' or 
-                        os.getenv('FLASK_DEBUG') == '1' or
-                        os.getenv('CI') == 'true' or 
-                        os.getenv('GITHUB_ACTIONS') == 'true'
-                    )
-                    
-                    if is_production:
-                        logger.error("SSL connection required in production but not established")
-                        raise Exception("Secure connection required")
-                    else:
-                        logger.warning("Database connection is not using SSL encryption")
-                else:
-                    logger.debug("Database connection is using SSL encryption")
-                    
-        except Exception as e:
-            # If SSL validation fails, log but don't break the connection in development
-            logger.debug(f"SSL validation check failed: {str(e)}")
-            pass
-
     def return_connection(self, conn):
-        if self.pool and conn:
-            self.pool.putconn(conn)
+        if conn:
+            conn.close()
             
     def close_all(self):
         """Close all connections in the pool"""
-        if self.pool:
-            self.pool.closeall()
-            logger.info("Database connection pool closed")
+        self.engine.dispose()
+        logger.info("Database connection pool closed")
             
     def get_connection_info(self):
         """Get connection pool information for monitoring"""
-        if not self.pool:
-            return {"status": "unavailable", "active_connections": 0, "total_connections": 0}
-            
         try:
             return {
                 "status": "available",
-                "active_connections": len(self.pool._used),
-                "total_connections": len(self.pool._pool) + len(self.pool._used)
+                "pool_size": self.pool.size(),
+                "active_connections": self.pool.checkedout(),
+                "idle_connections": self.pool.checkedin(),
+                "overflow": self.pool.overflow(),
+                "total_connections": self.pool.checkedin() + self.pool.checkedout(),
+                **self.metrics.snapshot(),
+                **self.checks.snapshot(),
             }
         except Exception as e:
             logger.debug(f"Failed to get connection info: {str(e)}")
@@ -78,6 +78,23 @@ while ! nc -z db 5432; do
   sleep 2
 done
 
+# A command given to the container (e.g. the email-worker service's `flask email-worker`) runs instead of
+# the web server; schema setup and migrations are left to the web container, so wait for them first
+if [ $# -gt 0 ]; then
+  echo "⏳ Waiting for the database to be migrated to the latest revision..."
+  attempt=0
+  until flask db current 2>/dev/null | grep -q "(head)"; do
+    attempt=$((attempt + 1))
+    if [ $attempt -ge 60 ]; then
+      echo "⚠️ Database not at the latest migration after $attempt checks, starting anyway"
+      break
+    fi
+    sleep 5
+  done
+  echo "🚀 Running: $*"
+  exec "$@"
+fi
+
 if nc -z db 5432; then
   echo "✅ PostgreSQL is up and running!"
   
@@ -126,13 +143,21 @@ with app.app_context():
         print('📋 Database tables already exist')
     except Exception as e:
         print(f'🔧 Creating database tables... ({str(e)})')
+        db.session.rollback()
         db.create_all()
+        # create_all() builds the current schema, so the migrations below have nothing to apply
+        from flask_migrate import stamp
+        stamp(revision='head')
         print('✅ Database tables created successfully')
 " || echo "⚠️ Database schema check failed"
   
-  # Run Alembic migrations
+  # Run Alembic migrations (existing databases without alembic_version start from the first revision)
   echo "🔄 Running database migrations..."
   FLASK_SECRET_KEY="${FLASK_SECRET_KEY}" CSRF_SECRET_KEY="${CSRF_SECRET_KEY}" flask db upgrade || echo "⚠️ Database migrations failed or no migrations found"
+
+  # Create upcoming audit_log partitions and drop months past retention
+  echo "🔄 Maintaining audit log partitions..."
+  FLASK_SECRET_KEY="${FLASK_SECRET_KEY}" CSRF_SECRET_KEY="${CSRF_SECRET_KEY}" flask audit-partitions || echo "⚠️ Audit partition maintenance failed"
   
   # Initialize database with sample data if needed
   echo "🔄 Database initialization complete"
@@ -148,6 +173,9 @@ fi
 # Make sure all environment variables are passed to the Flask application
 if [ "$FLASK_ENV" = "production" ]; then
   echo "🚀 Starting Gunicorn for production with all environment variables set"
+  # Workers share request metrics through this directory; start each deployment from zero
+  METRICS_DIR="${METRICS_DIR:-/tmp/app-metrics}"
+  rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
   # Export all environment variables to ensure they're available to Gunicorn
   exec env \
     FLASK_SECRET_KEY="${FLASK_SECRET_KEY}" \
@@ -156,6 +184,8 @@ if [ "$FLASK_ENV" = "production" ]; then
     DATABASE_USERNAME="${DATABASE_USERNAME}" \
     DATABASE_PASSWORD="${DATABASE_PASSWORD}" \
     DATABASE_NAME="${DATABASE_NAME}" \
+    DATABASE_SSL_MODE="${DATABASE_SSL_MODE}" \
+    DATABASE_SSL_CA="${DATABASE_SSL_CA}" \
     AWS_REGION="${AWS_REGION}" \
     AWS_ACCESS_KEY_ID="${AWS_ACCESS_KEY_ID}" \
     AWS_SECRET_ACCESS_KEY="${AWS_SECRET_ACCESS_KEY}" \
@@ -163,6 +193,7 @@ if [ "$FLASK_ENV" = "production" ]; then
     SES_SENDER_EMAIL="${SES_SENDER_EMAIL}" \
     SITEKEY="${SITEKEY}" \
     RECAPTCHA_SECRET_KEY="${RECAPTCHA_SECRET_KEY}" \
+    METRICS_DIR="${METRICS_DIR}" \
     gunicorn -w 4 -b 0.0.0.0:5000 --timeout 120 --keep-alive 2 app:app
 else
   echo "🧪 Starting Flask development server with all environment variables set"
@@ -174,6 +205,8 @@ else
     DATABASE_USERNAME="${DATABASE_USERNAME}" \
     DATABASE_PASSWORD="${DATABASE_PASSWORD}" \
     DATABASE_NAME="${DATABASE_NAME}" \
+    DATABASE_SSL_MODE="${DATABASE_SSL_MODE}" \
+    DATABASE_SSL_CA="${DATABASE_SSL_CA}" \
     AWS_REGION="${AWS_REGION}" \
     AWS_ACCESS_KEY_ID="${AWS_ACCESS_KEY_ID}" \
     AWS_SECRET_ACCESS_KEY="${AWS_SECRET_ACCESS_KEY}" \
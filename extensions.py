@@ -5,14 +5,17 @@ from flask_limiter.util import get_remote_address
 import boto3
 import os
 
-db = SQLAlchemy()
+from utils.read_replicas import RoutingSession
+
+# Reads inside read_only() scopes may go to a replica (utils/read_replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 csrf = CSRFProtect()
 
 # Initialize rate limiter
+# Storage comes from RATELIMIT_STORAGE_URI (see app.py): shared Postgres counters by default
 limiter = Limiter(
     key_func=get_remote_address,  # Rate limit by IP address
     default_limits=[],  # No default limits - only apply to specific endpoints
-    storage_uri="memory://"  # Use memory storage for development (Redis for production)
 )
 
 # AWS S3 configuration (optional for development)
@@ -0,0 +1,42 @@
+"""add payment idempotency key and indexes
+
+Revision ID: 8d21f5a6c3e7
+Revises: 4b7e2c91d0a3
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d21f5a6c3e7'
+down_revision = '4b7e2c91d0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Payments used to be captured without a per-booking check, so a booking can have several
+    # completed payments. Keep the first and mark the rest, or the unique index below cannot be built
+    op.execute("""
+        UPDATE payment SET status = 'Duplicate'
+        WHERE status = 'Completed' AND id NOT IN (
+            SELECT min(id) FROM payment WHERE status = 'Completed' GROUP BY booking_id
+        )
+    """)
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_payment_user_created', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('uq_payment_booking_completed', ['booking_id'], unique=True,
+                              postgresql_where=sa.text("status = 'Completed'"))
+        batch_op.create_unique_constraint('uq_payment_user_idempotency_key', ['user_id', 'idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_payment_user_idempotency_key', type_='unique')
+        batch_op.drop_index('uq_payment_booking_completed')
+        batch_op.drop_index('ix_payment_user_created')
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,48 @@
+"""add rating_aggregate table
+
+Revision ID: c5a9e0b47f12
+Revises: 8d21f5a6c3e7
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e0b47f12'
+down_revision = '8d21f5a6c3e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rating_aggregate',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from existing ratings; `flask recompute-ratings --check` verifies the result
+    op.execute("""
+        INSERT INTO rating_aggregate (user_id, rating_count, rating_sum,
+                                      stars_1, stars_2, stars_3, stars_4, stars_5, updated_at)
+        SELECT reviewed_id, count(*), coalesce(sum(rating), 0),
+               count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2),
+               count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4),
+               count(*) FILTER (WHERE rating = 5), timezone('utc', now())
+        FROM rating
+        GROUP BY reviewed_id
+    """)
+
+
+def downgrade():
+    op.drop_table('rating_aggregate')
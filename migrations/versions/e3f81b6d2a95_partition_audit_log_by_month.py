@@ -0,0 +1,111 @@
+"""partition audit_log by month and add category
+
+Revision ID: e3f81b6d2a95
+Revises: c5a9e0b47f12
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from utils.audit_partitions import add_months, ensure_partitions, partition_name
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3f81b6d2a95'
+down_revision = 'c5a9e0b47f12'
+branch_labels = None
+depends_on = None
+
+# AUDIT_CATEGORY_RULES as of this revision: the first matching substring of the action wins
+CATEGORY_RULES = (
+    ('lock', 'lockout'),
+    ('unban', 'admin_unban'),
+    ('ban', 'admin_ban'),
+    ('delete', 'admin_delete'),
+    ('fail', 'auth_fail'),
+    ('login', 'auth_success'),
+    ('password', 'password_change'),
+    ('role', 'role_change'),
+    ('deactivate', 'account'),
+    ('security', 'session_security'),
+)
+CATEGORIES = tuple(dict.fromkeys(category for _, category in CATEGORY_RULES)) + ('other',)
+MONTHS_AHEAD = 3
+
+
+def _category_case():
+    whens = ' '.join(f"WHEN lower(action) LIKE '%{needle}%' THEN '{category}'" for needle, category in CATEGORY_RULES)
+    return f"CASE {whens} ELSE 'other' END::audit_category"
+
+
+def _create_partitions(bind):
+    """A monthly partition for every month in the old rows, then the default and upcoming ones"""
+    months = bind.execute(sa.text(
+        "SELECT DISTINCT date_trunc('month', created_at)::date FROM audit_log_old WHERE created_at IS NOT NULL"
+    )).scalars().all()
+    for month in months:
+        op.execute(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF audit_log "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+    ensure_partitions(bind, months_ahead=MONTHS_AHEAD)
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_old")
+    op.execute("ALTER TABLE audit_log_old RENAME CONSTRAINT audit_log_pkey TO audit_log_old_pkey")
+
+    audit_category = postgresql.ENUM(*CATEGORIES, name='audit_category')
+    audit_category.create(bind, checkfirst=True)
+
+    # Ids keep coming from the old table's sequence, so existing ids stay unique
+    op.create_table('audit_log',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('audit_log_id_seq'::regclass)"), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=100), nullable=False),
+    sa.Column('category', postgresql.ENUM(*CATEGORIES, name='audit_category', create_type=False), nullable=False),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    _create_partitions(bind)
+
+    op.execute(f"""
+        INSERT INTO audit_log (id, created_at, user_id, action, category, details)
+        SELECT id, coalesce(created_at, timezone('utc', now())), user_id, action, {_category_case()}, details
+        FROM audit_log_old
+    """)
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+    op.drop_table('audit_log_old')
+
+    # Built after the copy, which is faster than maintaining them row by row
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_log_category_created', ['category', 'created_at'], unique=False)
+        batch_op.create_index('ix_audit_log_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_partitioned")
+    op.execute("ALTER TABLE audit_log_partitioned RENAME CONSTRAINT audit_log_pkey TO audit_log_partitioned_pkey")
+    op.create_table('audit_log',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('audit_log_id_seq'::regclass)"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('action', sa.String(length=100), nullable=False),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO audit_log (id, user_id, action, details, created_at)
+        SELECT id, user_id, action, details, created_at FROM audit_log_partitioned
+    """)
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+    # Drops the monthly and default partitions with it
+    op.drop_table('audit_log_partitioned')
+    postgresql.ENUM(name='audit_category').drop(op.get_bind(), checkfirst=True)
@@ -77,12 +77,9 @@ def create_test_ratings():
         # Commit all changes
         db.session.commit()
         
-        # Update profile ratings
+        # Rebuild rating aggregates and profile ratings for the bulk-inserted ratings
         from controllers.rating_controller import RatingController
-        for escort in escorts:
-            RatingController.update_user_average_rating(escort.id)
-        
-        db.session.commit()
+        RatingController.recompute_rating_aggregates()
         
         print(f"\n🎉 Successfully created {len(test_bookings)} bookings and ratings!")
         
@@ -22,7 +22,7 @@ from werkzeug.security import generate_password_hash
 sys.path.append('/app')
 
 from blueprint.models import (
-    db, User, Profile, Booking, Payment, Report, Rating, 
+    db, User, Profile, Booking, Payment, Report, Rating, RatingAggregate,
     PasswordHistory, Message, Favourite, AuditLog, TimeSlot
 )
 from app import app
@@ -649,15 +649,9 @@ def update_profile_ratings(users):
     """Update profile ratings based on rating data"""
     print("10. Updating profile ratings...")
     
-    escorts = [user for user in users.values() if user.role == 'escort']
-    
-    for escort in escorts:
-        ratings = Rating.query.filter_by(reviewed_id=escort.id).all()
-        if ratings:
-            avg_rating = sum(r.rating for r in ratings) / len(ratings)
-            escort.profile.rating = round(avg_rating, 1)
-    
-    db.session.commit()
+    # Rebuilds the per-user rating aggregates, which also sets Profile.rating
+    from controllers.rating_controller import RatingController
+    RatingController.recompute_rating_aggregates()
     print("   ✅ Updated profile ratings")
 
 def clear_all_users():
@@ -667,6 +661,7 @@ def clear_all_users():
     try:
         # Delete in proper order to handle foreign key constraints
         print("   - Deleting ratings...")
+        RatingAggregate.query.delete()
         Rating.query.delete()
         
         print("   - Deleting messages...")
@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.
 
 from app import app as flask_app
 from blueprint.payment import generate_payment_token, mark_token_used
-from blueprint.models import Booking, User
+from blueprint.models import Booking, Payment, User
 from extensions import db
 
 # === Fixtures ===
@@ -130,3 +130,73 @@ def test_reuse_token_should_fail(seeker_session):
      response2 = client.get(f"/payment/pay?token={token}", follow_redirects=False)
      assert response2.status_code == 403
      assert b"Invalid or expired payment token" in response2.data
+
+
+def _pay(client, token, idempotency_key):
+    return client.post("/payment/pay", data={
+        "csrf_token": "valid-token",
+        "token": token,
+        "idempotency_key": idempotency_key,
+        "card_number": "4111111111111111",
+        "expiry": "12/30",
+        "cvv": "123"
+    }, follow_redirects=False)
+
+
+def test_double_submit_with_same_idempotency_key_charges_once(seeker_session, monkeypatch):
+    monkeypatch.setattr('controllers.security_controller.validate_csrf', lambda *args, **kwargs: None)
+    client, seeker = seeker_session
+    with client.application.app_context():
+        escort_id = ensure_test_escort()
+        booking_id = create_test_booking(seeker_id=seeker.id, escort_id=escort_id, status="Confirmed")
+        token = generate_payment_token(user_id=seeker.id, booking_id=booking_id)
+
+    response1 = _pay(client, token, "key-double-submit")
+    response2 = _pay(client, token, "key-double-submit")
+    assert response1.status_code == 302
+    assert response2.status_code == 302
+
+    with client.application.app_context():
+        payments = Payment.query.filter_by(booking_id=booking_id).all()
+        assert len(payments) == 1
+        assert payments[0].idempotency_key == "key-double-submit"
+        Payment.query.filter_by(booking_id=booking_id).delete()
+        db.session.commit()
+
+
+def test_second_token_cannot_pay_booking_twice(seeker_session, monkeypatch):
+    monkeypatch.setattr('controllers.security_controller.validate_csrf', lambda *args, **kwargs: None)
+    client, seeker = seeker_session
+    with client.application.app_context():
+        escort_id = ensure_test_escort()
+        booking_id = create_test_booking(seeker_id=seeker.id, escort_id=escort_id, status="Confirmed")
+        first = generate_payment_token(user_id=seeker.id, booking_id=booking_id)
+        second = generate_payment_token(user_id=seeker.id, booking_id=booking_id)
+
+    assert _pay(client, first, "key-first").status_code == 302
+    assert _pay(client, second, "key-second").status_code == 302
+
+    with client.application.app_context():
+        assert Payment.query.filter_by(booking_id=booking_id, status='Completed').count() == 1
+        Payment.query.filter_by(booking_id=booking_id).delete()
+        db.session.commit()
+
+
+def test_idempotency_key_does_not_replay_another_bookings_payment(seeker_session, monkeypatch):
+    monkeypatch.setattr('controllers.security_controller.validate_csrf', lambda *args, **kwargs: None)
+    client, seeker = seeker_session
+    with client.application.app_context():
+        escort_id = ensure_test_escort()
+        paid = create_test_booking(seeker_id=seeker.id, escort_id=escort_id, status="Confirmed")
+        unpaid = create_test_booking(seeker_id=seeker.id, escort_id=escort_id, status="Confirmed")
+        first = generate_payment_token(user_id=seeker.id, booking_id=paid)
+        second = generate_payment_token(user_id=seeker.id, booking_id=unpaid)
+
+    assert _pay(client, first, "key-reused").status_code == 302
+    # Same key on the other booking's form: a real payment, not a replay of the first
+    assert _pay(client, second, "key-reused").status_code == 302
+
+    with client.application.app_context():
+        assert Payment.query.filter_by(booking_id=unpaid, status='Completed').count() == 1
+        Payment.query.filter(Payment.booking_id.in_([paid, unpaid])).delete(synchronize_session=False)
+        db.session.commit()
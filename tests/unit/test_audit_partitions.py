@@ -0,0 +1,66 @@
+import sys
+import os
+import datetime
+import pytest
+from sqlalchemy import text
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import AuditLog
+from utils.audit_partitions import ensure_partitions, drop_expired_partitions, list_partitions, is_partitioned
+
+
+@pytest.fixture
+def conn():
+    """A connection whose DDL is rolled back after the test"""
+    with flask_app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            yield connection
+            transaction.rollback()
+
+
+@pytest.mark.parametrize("action, category", [
+    ('login success', 'auth_success'),
+    ('login_failed_owasp', 'auth_fail'),
+    ('password_change_failed', 'auth_fail'),
+    ('account_locked_brute_force', 'lockout'),
+    ('admin ban user', 'admin_ban'),
+    ('admin unban user', 'admin_unban'),
+    ('admin delete user', 'admin_delete'),
+    ('password_reset', 'password_change'),
+    ('something new', 'other'),
+])
+def test_categorize(action, category):
+    assert AuditLog.categorize(action) == category
+
+
+def test_partitions_created_ahead_and_dropped_after_retention(conn):
+    assert is_partitioned(conn)
+
+    created = ensure_partitions(conn, months_ahead=2, today=datetime.date(2031, 11, 15))
+    assert created == ['audit_log_2031_11', 'audit_log_2031_12', 'audit_log_2032_01']
+    assert ensure_partitions(conn, months_ahead=2, today=datetime.date(2031, 11, 15)) == []
+
+    # Rows are routed to their month
+    conn.execute(text("INSERT INTO audit_log (created_at, action, category) "
+                      "VALUES ('2031-12-03', 'partition test', 'other')"))
+    routed = conn.execute(text("SELECT tableoid::regclass::text FROM audit_log WHERE action = 'partition test'")).scalar()
+    assert routed == 'audit_log_2031_12'
+
+    dropped = drop_expired_partitions(conn, retention_months=1, today=datetime.date(2032, 1, 10))
+    assert 'audit_log_2031_11' in dropped and 'audit_log_2031_12' not in dropped
+    assert datetime.date(2031, 11, 1) not in list_partitions(conn)
+
+
+def test_category_filter_uses_index(conn):
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join(conn.execute(text(
+        "EXPLAIN SELECT * FROM audit_log WHERE category IN ('auth_fail', 'lockout') "
+        "ORDER BY created_at DESC LIMIT 200"
+    )).scalars())
+    assert "category_created" in plan
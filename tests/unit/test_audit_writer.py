@@ -0,0 +1,84 @@
+import sys
+import os
+import pytest
+from datetime import datetime
+from sqlalchemy import event
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import AuditLog, User
+from blueprint.audit_log import log_event
+from utils.audit_writer import AuditLogWriter, get_audit_writer
+
+ACTION = 'audit writer test'
+
+
+@pytest.fixture
+def app_ctx():
+    with flask_app.app_context():
+        db.create_all()
+        yield
+        db.session.rollback()
+        AuditLog.query.filter(AuditLog.action.like(f"{ACTION}%")).delete(synchronize_session=False)
+        User.query.filter_by(email="auditwriter@example.com").delete()
+        db.session.commit()
+
+
+def _count_inserts():
+    inserts = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO audit_log"):
+            inserts.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    return inserts, lambda: event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_async_writer_batches_inserts(app_ctx):
+    writer = AuditLogWriter(db.engine, batch_size=10, flush_interval=60)
+    inserts, stop_counting = _count_inserts()
+    try:
+        for i in range(25):
+            writer.submit(None, ACTION, f"event {i}")
+        assert writer.flush()
+    finally:
+        stop_counting()
+        writer.close()
+
+    # Two full batches plus the remainder written on flush
+    assert len(inserts) == 3
+    assert writer.stats['written'] == 25
+    assert AuditLog.query.filter_by(action=ACTION).count() == 25
+
+
+def test_close_writes_pending_events(app_ctx):
+    writer = AuditLogWriter(db.engine, batch_size=100, flush_interval=60)
+    for i in range(5):
+        writer.submit(None, ACTION, f"event {i}")
+    writer.close()
+    assert AuditLog.query.filter_by(action=ACTION).count() == 5
+
+
+def test_bad_row_does_not_lose_batch(app_ctx):
+    writer = AuditLogWriter(db.engine, synchronous=True)
+    now = datetime.utcnow()
+    writer._write([
+        {'user_id': None, 'action': ACTION, 'category': 'other', 'details': 'ok', 'created_at': now},
+        {'user_id': -1, 'action': ACTION, 'category': 'other', 'details': 'missing user', 'created_at': now},
+    ])
+    assert writer.stats == {'written': 1, 'batches': 1, 'inline_writes': 0, 'failed': 1}
+    assert AuditLog.query.filter_by(action=ACTION).count() == 1
+
+
+def test_log_event_does_not_commit_caller_session(app_ctx):
+    db.session.add(User(email="auditwriter@example.com", role="seeker", gender="Other"))
+    log_event(None, ACTION, "written on its own connection")
+    assert get_audit_writer().flush()
+    db.session.rollback()
+
+    assert User.query.filter_by(email="auditwriter@example.com").first() is None
+    assert AuditLog.query.filter_by(action=ACTION).count() == 1
@@ -0,0 +1,82 @@
+import sys
+import os
+from collections import Counter
+
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import Booking, Message, Payment, Profile, Rating, RatingAggregate, User
+from utils.bench_seed import (BenchVolumes, DEFAULT_PASSWORD, bench_email, count_bench_users, remove_bench_data,
+                              seed_bench_data)
+
+VOLUMES = BenchVolumes(users=300, escorts=30, messages=6000, bookings=3000, reports=50)
+
+
+@pytest.fixture
+def bench_data():
+    with flask_app.app_context():
+        db.create_all()
+        other = User(email="not-bench@example.com", role="seeker", gender="Other", active=True)
+        db.session.add(other)
+        db.session.commit()
+        connection = db.engine.raw_connection()
+        try:
+            remove_bench_data(connection)
+            # Other tests may have left rows behind
+            before = {model: model.query.count() for model in (Booking, Message, Payment, Rating)}
+            db.session.remove()
+            counts = seed_bench_data(connection, VOLUMES, random_seed=7, log=lambda message: None)
+            yield counts, connection, before
+            db.session.remove()
+            remove_bench_data(connection)
+        finally:
+            connection.close()
+            db.session.remove()
+            User.query.filter_by(email="not-bench@example.com").delete()
+            db.session.commit()
+
+
+def test_loads_requested_volumes(bench_data):
+    counts, connection, before = bench_data
+    assert counts['user'] == VOLUMES.users + 1  # Plus the admin
+    assert counts['profile'] == counts['user']
+    assert counts['booking'] == Booking.query.count() - before[Booking] == VOLUMES.bookings
+    assert counts['message'] == Message.query.count() - before[Message] == VOLUMES.messages
+    assert counts['time_slot'] == VOLUMES.escorts * VOLUMES.slots_per_escort
+    assert count_bench_users(connection) == counts['user']
+
+    # Payments and ratings follow the bookings
+    bench_bookings = Booking.query.join(User, User.id == Booking.escort_id).filter(User.email.like('bench-%'))
+    assert counts['payment'] == Payment.query.count() - before[Payment] == \
+        bench_bookings.filter(Booking.status.in_(('Completed', 'Confirmed'))).count()
+    assert 0 < counts['rating'] == Rating.query.count() - before[Rating] < bench_bookings.filter(Booking.status == 'Completed').count()
+    rated = RatingAggregate.query.join(User, User.id == RatingAggregate.user_id).filter(User.email.like('bench-%')).first()
+    assert db.session.get(User, rated.user_id).profile.rating == round(rated.rating_sum / rated.rating_count, 1)
+
+
+def test_activity_is_skewed_towards_popular_users(bench_data):
+    per_escort = Counter(escort_id for (escort_id,) in db.session.query(Booking.escort_id))
+    busiest = per_escort.most_common()
+    assert busiest[0][1] > 5 * busiest[len(busiest) // 2][1]
+
+
+def test_accounts_share_a_working_password(bench_data):
+    user = User.query.filter_by(email=bench_email('seeker', 5)).one()
+    assert user.role == 'seeker' and user.email_verified
+    assert user.check_password(DEFAULT_PASSWORD)
+    assert User.query.filter_by(email=bench_email('escort', 30)).one().role == 'escort'
+
+
+def test_removal_keeps_other_data(bench_data):
+    _, connection, before = bench_data
+    assert remove_bench_data(connection) == VOLUMES.users + 1
+    db.session.remove()
+    assert count_bench_users(connection) == 0
+    assert Message.query.count() == before[Message]
+    assert Booking.query.count() == before[Booking]
+    assert User.query.filter_by(email="not-bench@example.com").count() == 1
+    assert Profile.query.join(User).filter(User.email.like('bench-%')).count() == 0
@@ -0,0 +1,143 @@
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User, Profile, Booking, Payment, Favourite
+from blueprint.controller import dashboard_controller
+from blueprint.controller.dashboard_controller import DashboardController, SeekerDashboard, EscortDashboard
+from utils.query_stats import QueryBudget, count_queries
+from utils.ttl_cache import TTLCache
+
+
+def dashboard_queries(stats):
+    """Statements other than the version lookups in the rate limit storage"""
+    return sum(runs for shape, runs in stats.fingerprints.items() if 'rate_limit_counter' not in shape)
+
+
+@pytest.fixture
+def booked_pair():
+    """A seeker who favourited an escort, with one paid, one confirmed and one pending booking"""
+    with flask_app.app_context():
+        db.create_all()
+        dashboard_controller._dashboard_cache().clear()
+        seeker = User(email="dashseeker@example.com", role="seeker", gender="Other", active=True)
+        escort = User(email="dashescort@example.com", role="escort", gender="Other", active=True)
+        seeker.profile = Profile(name="Dashboard Seeker")
+        escort.profile = Profile(name="Dashboard Escort", bio="Hello", age=30)
+        db.session.add_all([seeker, escort])
+        db.session.commit()
+
+        now = datetime.utcnow()
+        statuses = ['Confirmed', 'Confirmed', 'Pending']
+        bookings = [Booking(seeker_id=seeker.id, escort_id=escort.id, status=status,
+                            start_time=now + timedelta(days=i + 1),
+                            end_time=now + timedelta(days=i + 1, hours=1))
+                    for i, status in enumerate(statuses)]
+        db.session.add_all(bookings)
+        db.session.flush()
+        db.session.add(Payment(user_id=seeker.id, booking_id=bookings[0].id, amount=60.5,
+                               status='Completed', transaction_id="dash-txn-1"))
+        db.session.add(Favourite(user_id=seeker.id, favourite_user_id=escort.id))
+        db.session.commit()
+
+        yield seeker.id, escort.id
+
+        db.session.rollback()
+        dashboard_controller._dashboard_cache().clear()
+        Favourite.query.filter_by(user_id=seeker.id).delete()
+        Payment.query.filter_by(user_id=seeker.id).delete()
+        Booking.query.filter_by(seeker_id=seeker.id).delete()
+        db.session.delete(db.session.get(User, escort.id))
+        db.session.delete(db.session.get(User, seeker.id))
+        db.session.commit()
+
+
+def test_seeker_and_escort_summaries(booked_pair):
+    seeker_id, escort_id = booked_pair
+
+    seeker = DashboardController.get_dashboard_summary(seeker_id, 'seeker')
+    assert isinstance(seeker, SeekerDashboard)
+    assert (seeker.upcoming_bookings_count, seeker.pending_bookings_count) == (2, 1)
+    assert (seeker.total_spent, seeker.completed_bookings) == (60.5, 1)
+    assert seeker.monthly_breakdown[0].total == 60.5
+    assert [p.user_id for p in seeker.favourite_profiles] == [escort_id]
+    assert seeker.favourite_profiles[0].bio == "Hello"
+
+    escort = DashboardController.get_dashboard_summary(escort_id, 'escort')
+    assert isinstance(escort, EscortDashboard)
+    assert (escort.booking_requests_count, escort.upcoming_bookings_count) == (1, 2)
+    assert (escort.total_earned, escort.paid_bookings) == (60.5, 1)
+
+
+def test_summary_query_budget_and_cache(booked_pair):
+    seeker_id, _ = booked_pair
+
+    with count_queries() as stats:
+        DashboardController.get_dashboard_summary(seeker_id, 'seeker')
+    # Bookings, payments by month and favourites - one query each
+    assert dashboard_queries(stats) == 3
+    stats.check(QueryBudget(max_queries=None, max_repeats=1))
+
+    with count_queries() as stats:
+        DashboardController.get_dashboard_summary(seeker_id, 'seeker')
+    # A hit only checks the version
+    assert dashboard_queries(stats) == 0
+    stats.check(QueryBudget(max_queries=1))
+
+    with count_queries() as stats:
+        DashboardController.get_dashboard_summary(seeker_id, 'admin')
+    assert dashboard_queries(stats) == 1
+
+
+def test_invalidate_drops_stale_summary(booked_pair):
+    seeker_id, escort_id = booked_pair
+    assert DashboardController.get_dashboard_summary(escort_id, 'escort').booking_requests_count == 1
+
+    Booking.query.filter_by(escort_id=escort_id, status='Pending').update({'status': 'Confirmed'})
+    db.session.commit()
+    assert DashboardController.get_dashboard_summary(escort_id, 'escort').booking_requests_count == 1
+
+    DashboardController.invalidate(seeker_id, escort_id)
+    assert DashboardController.get_dashboard_summary(escort_id, 'escort').booking_requests_count == 0
+
+
+def test_invalidate_from_another_worker(booked_pair):
+    seeker_id, escort_id = booked_pair
+    assert DashboardController.get_dashboard_summary(escort_id, 'escort').booking_requests_count == 1
+
+    Booking.query.filter_by(escort_id=escort_id, status='Pending').update({'status': 'Confirmed'})
+    db.session.commit()
+    # Another worker bumps the shared version; this worker's cache still holds the old entry
+    dashboard_controller._version_store().incr(dashboard_controller._version_key(escort_id), 60)
+    assert len(dashboard_controller._dashboard_cache()) > 0
+    assert DashboardController.get_dashboard_summary(escort_id, 'escort').booking_requests_count == 0
+
+
+def test_ttl_cache_expiry_and_bound():
+    now = [0.0]
+    cache = TTLCache(ttl_seconds=10, max_entries=2, clock=lambda: now[0])
+    cache.set('a', 1)
+    now[0] = 5
+    cache.set('b', 2)
+    cache.set('c', 3)  # Full: 'a' is closest to expiry and is evicted
+    assert cache.get('a') is None and cache.get('b') == 2 and len(cache) == 2
+
+    now[0] = 20
+    assert cache.get('b') is None
+
+
+def test_process_local_version_store_warns(monkeypatch, caplog):
+    with flask_app.app_context():
+        monkeypatch.setitem(flask_app.config, 'DASHBOARD_VERSION_STORAGE_URI', 'memory://')
+        monkeypatch.setitem(flask_app.config, 'DASHBOARD_VERSION_STORAGE_OPTIONS', {})
+        monkeypatch.delitem(flask_app.extensions, 'dashboard_versions', raising=False)
+        with caplog.at_level("WARNING", logger=dashboard_controller.__name__):
+            dashboard_controller._version_store()
+        flask_app.extensions.pop('dashboard_versions')
+    assert "per process" in caplog.text
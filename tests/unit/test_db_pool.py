@@ -0,0 +1,166 @@
+import sys
+import os
+import pytest
+from sqlalchemy import create_engine, event, text
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import app as app_module
+from app import app as flask_app
+from extensions import db
+from config.db_config import DBConfig
+from db import ConnectionChecks, InsecureConnectionError
+
+
+def test_pool_settings_come_from_environment(monkeypatch):
+    monkeypatch.setenv('DATABASE_POOL_SIZE', '7')
+    monkeypatch.setenv('DATABASE_MAX_OVERFLOW', '3')
+    monkeypatch.setenv('DATABASE_POOL_PRE_PING', 'false')
+    config = DBConfig(host='db', port=5432, database='d', user='u', password='p', pool_recycle=60)
+
+    options = config.engine_options()
+    assert options['pool_size'] == 7
+    assert options['max_overflow'] == 3
+    assert options['pool_recycle'] == 60  # Explicit values win over the environment
+    assert options['pool_pre_ping'] is False
+    assert options['connect_args'].get('sslmode') == config.ssl_mode
+
+    # With an idle interval the pool's own every-checkout ping is off
+    assert DBConfig(host='db', port=5432, database='d', user='u', password='p', pool_pre_ping=True,
+                    pool_pre_ping_interval=30).engine_options()['pool_pre_ping'] is False
+
+
+def test_sslmode_is_only_set_when_configured(monkeypatch):
+    monkeypatch.delenv('DATABASE_SSL_MODE', raising=False)
+    config = DBConfig(host='db', port=5432, database='d', user='u', password='p')
+    assert 'sslmode' not in config.connect_args()
+    assert config.ssl_enforced() is False
+
+    monkeypatch.setenv('DATABASE_SSL_MODE', 'disable')
+    assert DBConfig(host='db', port=5432, database='d', user='u', password='p').ssl_enforced() is False
+
+    monkeypatch.setenv('DATABASE_SSL_MODE', 'verify-full')
+    config = DBConfig(host='db', port=5432, database='d', user='u', password='p')
+    assert config.connect_args()['sslmode'] == 'verify-full'
+    assert config.ssl_enforced() is True
+
+
+def test_raw_connections_share_the_orm_pool():
+    connector = app_module.pg_connector
+    with flask_app.app_context():
+        assert connector.engine is db.engine
+        assert connector.pool is db.engine.pool
+        assert db.engine.pool.size() == app_module.config.pool_size
+
+    before = connector.get_connection_info()
+    with flask_app.test_request_context():
+        conn = app_module.get_db_conn()
+        assert app_module.get_db_conn() is conn  # One checkout per request
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        assert cursor.fetchone() == (1,)
+        cursor.close()
+        assert connector.get_connection_info()['active_connections'] == before['active_connections'] + 1
+        # The ORM draws from the same pool
+        db.session.execute(db.text("SELECT 1"))
+        db.session.remove()
+
+    after = connector.get_connection_info()
+    assert after['active_connections'] == before['active_connections']
+    assert after['checkouts'] - before['checkouts'] == 2
+    assert after['checkins'] - before['checkins'] == 2
+    assert after['held_seconds_max'] >= 0
+
+
+@pytest.fixture
+def checked_engine():
+    config = DBConfig(host='db', port=5432, database='d', user='u', password='p',
+                      pool_size=1, max_overflow=0, pool_pre_ping=True, pool_pre_ping_interval=60)
+    engine = create_engine(os.environ['DATABASE_URL'], **config.engine_options())
+    checks = ConnectionChecks(engine, config)
+    yield engine, checks
+    engine.dispose()
+
+
+def _count_queries(engine, statements):
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+
+
+def test_ssl_is_checked_once_per_physical_connection(checked_engine):
+    engine, checks = checked_engine
+    statements = []
+    _count_queries(engine, statements)
+    for _ in range(5):
+        conn = engine.raw_connection()
+        conn.close()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert checks.snapshot() == {'ssl_validations': 1, 'pings': 0, 'stale_connections': 0}
+    assert statements == ["SELECT 1"]
+
+    # A reconnect is a new physical connection and is checked again
+    conn = engine.raw_connection()
+    conn.invalidate()
+    conn = engine.raw_connection()
+    assert conn._connection_record.info['ssl_in_use'] is False
+    conn.close()
+    assert checks.snapshot()['ssl_validations'] == 2
+
+
+def test_idle_connections_are_pinged_and_replaced_when_dead(checked_engine):
+    engine, checks = checked_engine
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_backend_pid()")
+    old_pid = cursor.fetchone()[0]
+    conn.rollback()
+    conn.close()
+
+    # Recently used: no ping
+    engine.raw_connection().close()
+    assert checks.snapshot()['pings'] == 0
+
+    # Server drops the connection while it sits idle in the pool
+    with flask_app.app_context():
+        db.session.execute(text("SELECT pg_terminate_backend(:pid)"), {'pid': old_pid})
+        db.session.remove()
+    engine.pool._pool.queue[0].info['last_used'] -= 120
+
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_backend_pid()")
+    assert cursor.fetchone()[0] != old_pid
+    conn.close()
+    assert checks.snapshot() == {'ssl_validations': 2, 'pings': 1, 'stale_connections': 1}
+
+
+class _FakeConnectionRecord:
+    def __init__(self):
+        self.info = {}
+
+
+class _FakeDBAPIConnection:
+    class info:
+        ssl_in_use = False
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_without_required_ssl_is_closed(monkeypatch):
+    monkeypatch.setenv('DATABASE_SSL_MODE', 'require')
+    config = DBConfig(host='db', port=5432, database='d', user='u', password='p')
+    engine = create_engine('sqlite://')
+    checks = ConnectionChecks(engine, config)
+
+    dbapi_connection = _FakeDBAPIConnection()
+    with pytest.raises(InsecureConnectionError):
+        checks._on_connect(dbapi_connection, _FakeConnectionRecord())
+    assert dbapi_connection.closed is True
+    engine.dispose()
@@ -0,0 +1,210 @@
+import sys
+import os
+import datetime
+import socketserver
+import threading
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import EmailOutbox, User
+from utils.email_outbox import (ConsoleTransport, EmailTransport, EmailWorker, SMTPTransport, LEASE_MARGIN_SECONDS,
+                                enqueue_email, requeue_dead)
+from utils.utils import send_reset_email
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; replies queued in server.rcpt_replies override RCPT"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        recipients = []
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply("250 sink")
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip(' <>')
+                queued = self.server.rcpt_replies.get(address)
+                if queued:
+                    self.reply(queued.pop(0))
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipients, data.decode()))
+                self.reply("250 OK queued")
+            elif verb in ('RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp_sink():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPSinkHandler)
+    server.daemon_threads = True
+    server.connections, server.messages, server.rcpt_replies = 0, [], {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def outbox():
+    with flask_app.app_context():
+        db.create_all()
+        EmailOutbox.query.delete()
+        db.session.commit()
+        yield
+        db.session.rollback()
+        EmailOutbox.query.delete()
+        db.session.commit()
+
+
+def _worker(sink, **kwargs):
+    transport = SMTPTransport('127.0.0.1', sink.server_address[1], sender="noreply@example.com", starttls=False)
+    return EmailWorker(transport, **kwargs)
+
+
+def _make_due():
+    EmailOutbox.query.update({EmailOutbox.next_attempt_at: datetime.datetime.utcnow()})
+    db.session.commit()
+
+
+def test_batch_is_sent_over_one_connection(outbox, smtp_sink):
+    for i in range(3):
+        enqueue_email(f"user{i}@outbox.test", f"Subject {i}", "Plain body", "<p>HTML body</p>")
+    db.session.commit()
+
+    worker = _worker(smtp_sink)
+    assert worker.run_once() == {'sent': 3, 'retried': 0, 'dead': 0}
+    worker.transport.close()
+
+    assert smtp_sink.connections == 1
+    assert [recipients for recipients, _ in smtp_sink.messages] == [[f"user{i}@outbox.test"] for i in range(3)]
+    assert "<p>HTML body</p>" in smtp_sink.messages[0][1]
+    assert {m.status for m in EmailOutbox.query.all()} == {'sent'}
+    # Nothing left to send
+    assert worker.run_once() == {'sent': 0, 'retried': 0, 'dead': 0}
+
+
+def test_transient_failure_is_retried_with_backoff(outbox, smtp_sink):
+    smtp_sink.rcpt_replies["busy@outbox.test"] = ["451 Try again later"]
+    message = enqueue_email("busy@outbox.test", "Retry me", "Body")
+    db.session.commit()
+
+    worker = _worker(smtp_sink, retry_base_seconds=60)
+    assert worker.run_once()['retried'] == 1
+    db.session.refresh(message)
+    assert message.status == 'pending' and message.attempts == 1
+    assert message.next_attempt_at > datetime.datetime.utcnow() + datetime.timedelta(seconds=40)
+    assert "451" in message.last_error
+
+    # Not due yet
+    assert worker.run_once()['sent'] == 0
+    _make_due()
+    assert worker.run_once()['sent'] == 1
+    worker.transport.close()
+    db.session.refresh(message)
+    assert message.status == 'sent' and message.attempts == 2
+
+
+def test_permanent_rejections_and_exhausted_retries_are_dead_lettered(outbox, smtp_sink):
+    smtp_sink.rcpt_replies["nobody@outbox.test"] = ["550 No such user"]
+    smtp_sink.rcpt_replies["flaky@outbox.test"] = ["421 Busy", "421 Busy"]
+    rejected = enqueue_email("nobody@outbox.test", "Bounce", "Body")
+    flaky = enqueue_email("flaky@outbox.test", "Flaky", "Body")
+    db.session.commit()
+
+    worker = _worker(smtp_sink, max_attempts=2)
+    assert worker.run_once() == {'sent': 0, 'retried': 1, 'dead': 1}
+    _make_due()
+    assert worker.run_once() == {'sent': 0, 'retried': 0, 'dead': 1}
+    db.session.refresh(rejected)
+    db.session.refresh(flaky)
+    assert (rejected.status, rejected.attempts) == ('dead', 1)
+    assert (flaky.status, flaky.attempts) == ('dead', 2)
+
+    # Dead letters can be sent again once the problem is fixed
+    assert requeue_dead([flaky.id]) == 1
+    db.session.commit()
+    assert worker.run_once()['sent'] == 1
+    worker.transport.close()
+
+
+def test_claimed_batch_is_leased_and_unsent_rest_released(outbox, smtp_sink):
+    message = enqueue_email("lease@outbox.test", "Leased", "Body")
+    db.session.commit()
+
+    # Claimed and committed before sending: another worker skips the leased row
+    lease_until, batch = _worker(smtp_sink)._claim()
+    assert [m.id for m in batch] == [message.id]
+    assert _worker(smtp_sink).run_once() == {'sent': 0, 'retried': 0, 'dead': 0}
+    db.session.refresh(message)
+    assert (message.attempts, message.next_attempt_at) == (1, lease_until)
+
+    # A lease too short to start a send hands the message back untouched
+    _make_due()
+    EmailOutbox.query.update({EmailOutbox.attempts: 0})
+    db.session.commit()
+    worker = _worker(smtp_sink, lease_seconds=LEASE_MARGIN_SECONDS)
+    assert worker.run_once() == {'sent': 0, 'retried': 0, 'dead': 0}
+    db.session.refresh(message)
+    assert (message.status, message.attempts) == ('pending', 0)
+    assert message.next_attempt_at <= datetime.datetime.utcnow()
+    assert smtp_sink.messages == []
+
+
+def test_password_reset_is_queued_not_sent(outbox):
+    user = User(email="reset@outbox.test", role="seeker", gender="Other", active=True)
+    db.session.add(user)
+    db.session.commit()
+    try:
+        with flask_app.test_request_context():
+            assert send_reset_email(user)
+        queued = EmailOutbox.query.filter_by(to_email="reset@outbox.test").one()
+        assert queued.status == 'pending'
+        assert user.password_reset_token in queued.body_text
+    finally:
+        db.session.delete(user)
+        db.session.commit()
+
+
+def test_transport_without_send_fails_on_creation():
+    class NoSendTransport(EmailTransport):
+        pass
+
+    with pytest.raises(TypeError):
+        NoSendTransport()
+
+
+def test_run_touches_heartbeat(tmp_path):
+    heartbeat = tmp_path / "email-worker.heartbeat"
+    stop = threading.Event()
+
+    class StoppingWorker(EmailWorker):
+        def run_once(self):
+            stop.set()
+            return {'sent': 0, 'retried': 0, 'dead': 0}
+
+    StoppingWorker(ConsoleTransport(), heartbeat_file=str(heartbeat)).run(stop_event=stop)
+    assert heartbeat.exists()
@@ -0,0 +1,85 @@
+import sys
+import os
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import app as app_module
+from app import app as flask_app
+from config.db_config import DBConfig
+from utils.health import ReadinessCheck
+
+
+def _checkouts():
+    return app_module.pg_connector.get_connection_info()['checkouts']
+
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    app_module.readiness.cache.clear()
+    with flask_app.test_client() as client:
+        yield client
+
+
+def test_liveness_and_index_do_no_database_work(client):
+    before = _checkouts()
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ok'}
+    assert 'Set-Cookie' not in response.headers
+
+    assert client.get('/').status_code == 302
+    assert client.get('/home').status_code == 302
+    assert _checkouts() == before
+
+
+def test_readiness_is_cached(client):
+    before = _checkouts()
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['status'] == 'ready'
+    assert report['checks']['database']['ok'] and report['checks']['pool']['ok']
+    assert _checkouts() == before + 1
+
+    # Within the TTL the cached report is served
+    assert client.get('/readyz').get_json() == report
+    assert _checkouts() == before + 1
+
+
+class FakeConnector:
+    """Pool info and connections under the test's control"""
+
+    def __init__(self, active_connections=0, fail=False):
+        self.config = DBConfig(host='db', port=5432, database='d', user='u', password='p',
+                               pool_size=2, max_overflow=1)
+        self.active_connections = active_connections
+        self.fail = fail
+        self.checkouts = 0
+
+    def get_connection_info(self):
+        return {'status': 'available', 'active_connections': self.active_connections}
+
+    def get_connection(self):
+        self.checkouts += 1
+        if self.fail:
+            raise Exception("Database connection unavailable")
+
+    def return_connection(self, conn):
+        pass
+
+
+def test_unreachable_database_is_not_ready():
+    report = ReadinessCheck(FakeConnector(fail=True)).status()
+    assert report['status'] == 'unavailable'
+    assert report['checks']['database'] == {'ok': False, 'error': 'Exception'}
+
+
+def test_exhausted_pool_is_reported_without_waiting_for_a_connection():
+    connector = FakeConnector(active_connections=3)
+    report = ReadinessCheck(connector).status()
+    assert report['status'] == 'unavailable'
+    assert report['checks']['pool'] == {'ok': False, 'active_connections': 3, 'capacity': 3}
+    assert connector.checkouts == 0
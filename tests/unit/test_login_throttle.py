@@ -0,0 +1,142 @@
+import sys
+import os
+from datetime import datetime, timedelta
+import time
+import pytest
+from limits.storage import MemoryStorage
+from sqlalchemy import event
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db, limiter
+from blueprint.models import AuditLog, User, generate_password_hash
+from utils.login_throttle import LoginThrottle, FailureCounts, get_login_throttle
+from utils.owasp_auth_security import OWASPAuthSecurity, detect_suspicious_patterns
+
+EMAIL = "throttled@example.com"
+PASSWORD = "Throttle-Pass-1"
+
+
+def test_counts_per_ip_email_and_pair():
+    throttle = LoginThrottle(MemoryStorage(), window_seconds=60)
+    for _ in range(3):
+        throttle.record_failure("10.0.0.1", "a@example.com")
+    throttle.record_failure("10.0.0.2", "a@example.com")
+    counts = throttle.record_failure("10.0.0.1", "B@example.com")
+
+    assert counts == FailureCounts(ip=4, email=1, pair=1)
+    assert throttle.counts("10.0.0.1", "a@example.com") == FailureCounts(ip=4, email=4, pair=3)
+
+    # A successful login forgets the account's failures, not the IP's
+    throttle.clear("10.0.0.1", "a@example.com")
+    assert throttle.counts("10.0.0.1", "a@example.com") == FailureCounts(ip=4, email=0, pair=0)
+
+
+def test_failures_slide_out_of_the_window_and_delays_expire():
+    throttle = LoginThrottle(MemoryStorage(), window_seconds=1)
+    throttle.record_failure("10.0.0.3", "c@example.com")
+    throttle.set_delay(1, email="c@example.com")
+    assert throttle.delay_remaining(email="C@example.com") == 1
+    assert throttle.delay_remaining(ip="10.0.0.3") == 0
+
+    time.sleep(2.1)
+    assert throttle.counts("10.0.0.3", "c@example.com") == FailureCounts()
+    assert throttle.delay_remaining(email="c@example.com") == 0
+
+
+@pytest.mark.parametrize("counts, user_agent, expected", [
+    (FailureCounts(ip=2, email=2, pair=2), "Mozilla/5.0", False),
+    (FailureCounts(ip=12, email=1, pair=1), "Mozilla/5.0", True),   # One IP, many accounts
+    (FailureCounts(ip=1, email=6, pair=1), "Mozilla/5.0", True),    # One account, many IPs
+    (FailureCounts(ip=3, email=3, pair=3), "python-requests/2.32", True),
+    (FailureCounts(ip=1, email=1, pair=1), "curl/8.0", False),      # A single attempt is not a pattern
+])
+def test_detect_suspicious_patterns(counts, user_agent, expected):
+    assert detect_suspicious_patterns(EMAIL, "10.0.0.4", user_agent, counts) is expected
+
+
+def test_previous_lockouts_decay_with_time_not_logins():
+    now = datetime(2025, 6, 1)
+    decay = OWASPAuthSecurity.LOCKOUT_HISTORY_DECAY_DAYS
+    user = User(suspicious_activity_flags=3, last_failed_attempt=now)
+    assert OWASPAuthSecurity.previous_lockouts(user, now) == 3
+
+    user.last_failed_attempt = now - timedelta(days=2 * decay)
+    assert OWASPAuthSecurity.previous_lockouts(user, now) == 1
+    user.last_failed_attempt = now - timedelta(days=10 * decay)
+    assert OWASPAuthSecurity.previous_lockouts(user, now) == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    flask_app.config["TESTING"] = True
+    monkeypatch.setitem(flask_app.config, "WTF_CSRF_ENABLED", False)
+    monkeypatch.setattr(limiter, "enabled", False)
+    # No progressive delay between attempts, so the lockout threshold is reachable
+    monkeypatch.setattr(OWASPAuthSecurity, "PROGRESSIVE_DELAY_BASE", 0)
+    flask_app.extensions.pop('login_throttle', None)
+    with flask_app.test_client() as client, flask_app.app_context():
+        db.create_all()
+        user = User(email=EMAIL, role="seeker", gender="Other", active=True, email_verified=True,
+                    password_hash=generate_password_hash(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+
+        yield client, user_id
+
+        db.session.rollback()
+        AuditLog.query.filter(AuditLog.user_id == user_id).delete(synchronize_session=False)
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+        flask_app.extensions.pop('login_throttle', None)
+
+
+def _post_login(client, email, password):
+    updates = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE "user"'):
+            updates.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        client.post('/auth/', data={'form_type': 'login', 'email': email, 'password': password})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return updates
+
+
+def test_only_the_lockout_is_written_to_the_user_row(client):
+    client, user_id = client
+    for attempt in range(1, OWASPAuthSecurity.MAX_FAILED_ATTEMPTS):
+        assert _post_login(client, EMAIL, "Wrong-Pass-1") == []
+    assert get_login_throttle().counts("127.0.0.1", EMAIL).pair == OWASPAuthSecurity.MAX_FAILED_ATTEMPTS - 1
+
+    assert len(_post_login(client, EMAIL, "Wrong-Pass-1")) == 1
+    user = db.session.get(User, user_id)
+    assert user.is_account_locked()
+    assert user.failed_login_attempts == OWASPAuthSecurity.MAX_FAILED_ATTEMPTS
+    assert AuditLog.query.filter_by(user_id=user_id, action='account_locked_brute_force').count() == 1
+
+    # Locked: even the right password is refused
+    _post_login(client, EMAIL, PASSWORD)
+    with client.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+
+def test_unknown_emails_are_throttled(client, monkeypatch):
+    client, _ = client
+    monkeypatch.setattr(OWASPAuthSecurity, "PROGRESSIVE_DELAY_BASE", 1)
+    _post_login(client, "nobody@example.com", "Wrong-Pass-1")
+
+    throttle = get_login_throttle()
+    assert throttle.counts("127.0.0.1", "nobody@example.com").email == 1
+    assert throttle.delay_remaining(email="nobody@example.com") > 0
+
+    # The next attempt is turned away by the progressive delay before any lookup
+    assert _post_login(client, "nobody@example.com", "Wrong-Pass-1") == []
+    assert throttle.counts("127.0.0.1", "nobody@example.com").email == 1
@@ -0,0 +1,80 @@
+import sys
+import os
+import pytest
+from sqlalchemy import event
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db, limiter
+from blueprint.models import AuditLog, User, generate_password_hash
+from utils.login_throttle import get_login_throttle
+
+EMAIL = "logintx@example.com"
+PASSWORD = "Login-Tx-Pass-1"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    flask_app.config["TESTING"] = True
+    monkeypatch.setitem(flask_app.config, "WTF_CSRF_ENABLED", False)
+    monkeypatch.setattr(limiter, "enabled", False)
+    flask_app.extensions.pop('login_throttle', None)  # Fresh failure counters and delays
+    with flask_app.test_client() as client, flask_app.app_context():
+        db.create_all()
+        user = User(email=EMAIL, role="seeker", gender="Other", active=True, email_verified=True,
+                    password_hash=generate_password_hash(PASSWORD))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+
+        yield client, user_id
+
+        db.session.rollback()
+        AuditLog.query.filter(AuditLog.user_id == user_id).delete(synchronize_session=False)
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+
+def _login(client, password):
+    """POST the login form and return the SQL statements it issued"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.post('/auth/', data={'form_type': 'login', 'email': EMAIL, 'password': password})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == 302
+    return response, statements
+
+
+def test_successful_login_is_one_lookup_and_one_transaction(client):
+    client, user_id = client
+    response, statements = _login(client, PASSWORD)
+
+    assert response.headers['Location'].rstrip('/').endswith('/dashboard')
+    # One user lookup, then the counter reset and audit record committed together
+    assert statements.count('SELECT') == 1
+    assert statements.count('UPDATE') == 1
+    assert statements.count('INSERT') == 1
+    assert statements[-1] == 'INSERT'
+    assert AuditLog.query.filter_by(user_id=user_id, action='login success').count() == 1
+
+
+def test_failed_login_is_one_lookup_and_one_insert(client):
+    client, user_id = client
+    _, statements = _login(client, "Wrong-Password-9")
+
+    # Failures are counted in the login throttle; the user row is untouched until a lockout
+    assert statements.count('SELECT') == 1
+    assert statements.count('UPDATE') == 0
+    assert statements.count('INSERT') == 1
+
+    assert get_login_throttle().counts("127.0.0.1", EMAIL).email == 1
+    assert AuditLog.query.filter_by(user_id=user_id, action='login_failed_owasp').count() == 1
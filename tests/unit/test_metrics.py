@@ -0,0 +1,92 @@
+import sys
+import os
+import multiprocessing
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from db import TimedQueuePool
+from utils.metrics import RequestMetrics
+from utils.query_stats import count_queries
+
+PROCESSES = 3
+REQUESTS_PER_PROCESS = 20
+
+
+def _serve_from_worker(directory):
+    """Runs in a separate process, like a gunicorn worker, and exits"""
+    metrics = RequestMetrics(directory, gauges=lambda: {'db_pool_connections_in_use': 1})
+    for i in range(REQUESTS_PER_PROCESS):
+        metrics.observe('browse', 'browse.browseEscort', 'GET', 200 if i % 4 else 500, 0.02,
+                        db_seconds=0.005, db_queries=3)
+    metrics.flush()
+    return os.getpid()
+
+
+def _sample(text, line_start):
+    return next(line.rsplit(' ', 1)[1] for line in text.splitlines() if line.startswith(line_start))
+
+
+def test_counters_are_summed_across_workers(tmp_path):
+    with multiprocessing.get_context('spawn').Pool(PROCESSES) as pool:
+        pids = pool.map(_serve_from_worker, [str(tmp_path)] * PROCESSES)
+    assert len(os.listdir(tmp_path)) == len(set(pids))
+
+    metrics = RequestMetrics(str(tmp_path), gauges=lambda: {'db_pool_connections_in_use': 2})
+    metrics.observe('app', 'healthz', 'GET', 200, 0.001)
+    text = metrics.render()
+
+    labels = 'blueprint="browse",endpoint="browse.browseEscort",method="GET"'
+    total = len(set(pids)) * REQUESTS_PER_PROCESS
+    assert _sample(text, f'http_request_duration_seconds_count{{{labels}}}') == str(total)
+    assert _sample(text, f'http_request_duration_seconds_bucket{{{labels},le="0.01"}}') == "0"
+    assert _sample(text, f'http_request_duration_seconds_bucket{{{labels},le="0.025"}}') == str(total)
+    assert _sample(text, f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == str(total)
+    assert _sample(text, f'http_requests_total{{{labels},status="500"}}') == str(total // 4)
+    assert _sample(text, f'http_request_db_queries_total{{{labels}}}') == str(3 * total)
+    assert _sample(text, 'http_request_duration_seconds_count{blueprint="app",endpoint="healthz"') == "1"
+    # Workers that have exited keep their counts but not their gauges
+    assert _sample(text, 'db_pool_connections_in_use') == "2"
+
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as client:
+        client.environ_base["HTTP_USER_AGENT"] = "test-agent"
+        client.environ_base["REMOTE_ADDR"] = "127.0.0.1"
+        yield client
+
+
+def test_metrics_endpoint_is_admin_only(client):
+    client.get('/healthz')
+    client.get('/no-such-page')
+    assert client.get('/metrics').status_code == 302
+
+    with client.session_transaction() as sess:
+        sess.update(user_id=1, role="seeker", bound_ua="test-agent", bound_ip="127.0.0.1")
+    assert client.get('/metrics').status_code == 302
+
+    with client.session_transaction() as sess:
+        sess["role"] = "admin"
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_requests_total{blueprint="app",endpoint="healthz",method="GET",status="200"}' in text
+    assert 'endpoint="<unmatched>",method="GET",status="404"' in text
+    assert 'db_pool_checkouts_total' in text
+
+
+def test_pool_wait_is_measured():
+    with flask_app.app_context():
+        assert isinstance(db.engine.pool, TimedQueuePool)
+        with count_queries() as stats:
+            db.session.execute(db.text("SELECT 1"))
+            db.session.remove()
+    assert stats.count == 1
+    assert stats.pool_wait_seconds > 0
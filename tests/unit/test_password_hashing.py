@@ -0,0 +1,90 @@
+import sys
+import os
+import threading
+import time
+import pytest
+from argon2 import PasswordHasher
+from werkzeug.security import generate_password_hash as werkzeug_generate_password_hash
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from utils.password_hashing import PasswordHashingService, PasswordHashingBusy
+
+# Cheap parameters keep the tests fast; the pool behaviour is the same
+FAST_HASHER = PasswordHasher(memory_cost=1024, time_cost=1, parallelism=1)
+
+
+@pytest.fixture
+def service():
+    service = PasswordHashingService(hasher=FAST_HASHER, max_workers=2, max_pending=4, queue_timeout=5)
+    yield service
+    service.shutdown()
+
+
+def test_hash_and_verify(service):
+    password_hash = service.hash("CorrectHorse1!")
+    assert password_hash.startswith("$argon2")
+    assert service.verify(password_hash, "CorrectHorse1!")
+    assert not service.verify(password_hash, "wrong")
+    assert not service.verify(None, "CorrectHorse1!")
+    assert not service.verify("not-a-hash", "CorrectHorse1!")
+
+
+def test_verifies_legacy_pbkdf2(service):
+    legacy = werkzeug_generate_password_hash("Legacy123!", method="pbkdf2:sha256:1000")
+    assert service.verify(legacy, "Legacy123!")
+    assert not service.verify(legacy, "nope")
+
+
+def test_verify_any_stops_at_first_match(service):
+    hashes = [FAST_HASHER.hash(f"Old-{i}") for i in range(6)]
+    service.check_window = 1
+    before = service.stats()['completed']
+
+    assert service.verify_any(hashes, "Old-0")
+    assert service.stats()['completed'] - before == 1
+
+    assert not service.verify_any(hashes, "New-Password")
+    assert service.stats()['completed'] - before == 7
+    assert not service.verify_any([None, ""], "anything")
+
+
+def test_concurrency_capped_at_worker_count(service):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    threads = [threading.Thread(target=service._run, args=(slow, None)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = service.stats()
+    assert peak[0] == 2
+    assert stats['completed'] == 8 and stats['in_flight'] == 0
+    assert stats['queue_seconds_max'] > 0.05  # Later callers waited for a worker
+
+
+def test_rejects_when_queue_full():
+    service = PasswordHashingService(hasher=FAST_HASHER, max_workers=1, max_pending=1, queue_timeout=0.05)
+    release = threading.Event()
+    blocker = threading.Thread(target=service._run, args=(lambda _: release.wait(5), None))
+    blocker.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(PasswordHashingBusy):
+            service.hash("Password123!")
+        assert service.stats()['rejected'] == 1
+    finally:
+        release.set()
+        blocker.join()
+        service.shutdown()
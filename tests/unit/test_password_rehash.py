@@ -0,0 +1,103 @@
+import sys
+import os
+import pytest
+from concurrent.futures import Future
+from argon2 import PasswordHasher
+from werkzeug.security import generate_password_hash as werkzeug_generate_password_hash
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User, generate_password_hash
+from utils.owasp_auth_security import OWASPAuthSecurity
+from utils.password_hashing import get_password_service
+
+PASSWORD = "Rehash-Me-123"
+
+
+@pytest.fixture
+def make_user():
+    created = []
+
+    def make(password_hash):
+        user = User(email=f"rehash{len(created)}@example.com", role="seeker", gender="Other",
+                    active=True, password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        created.append(user.id)
+        return user
+
+    with flask_app.app_context():
+        db.create_all()
+        yield make
+        db.session.rollback()
+        User.query.filter(User.id.in_(created)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _login(user, password):
+    if not user.check_password(password, upgrade=True):
+        return False
+    OWASPAuthSecurity.handle_successful_login(user, "127.0.0.1")
+    db.session.commit()
+    db.session.expire_all()
+    return True
+
+
+@pytest.mark.parametrize("legacy_hash", [
+    werkzeug_generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000"),
+    PasswordHasher(memory_cost=1024, time_cost=1, parallelism=1).hash(PASSWORD),
+])
+def test_outdated_hash_upgraded_in_login_commit(make_user, legacy_hash, monkeypatch):
+    service = get_password_service()
+    monkeypatch.setattr(service, "rehash_wait_seconds", 10)  # Never skipped as slow here
+    user = make_user(legacy_hash)
+    applied = service.stats()['rehash_applied']
+
+    assert _login(user, PASSWORD)
+
+    stored = db.session.get(User, user.id).password_hash
+    assert stored.startswith(service.current_hash_prefix())
+    assert not service.needs_rehash(stored)
+    assert service.stats()['rehash_applied'] == applied + 1
+    assert _login(user, PASSWORD)  # The upgraded hash still verifies
+
+
+def test_current_hash_and_wrong_password_not_rehashed(make_user):
+    current = generate_password_hash(PASSWORD)
+    user = make_user(current)
+    assert _login(user, PASSWORD)
+    assert db.session.get(User, user.id).password_hash == current
+
+    legacy = werkzeug_generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+    user = make_user(legacy)
+    assert not user.check_password("wrong")
+    assert not user.apply_pending_rehash()
+    assert user.password_hash == legacy
+
+
+def test_only_login_checks_start_a_rehash(make_user):
+    service = get_password_service()
+    legacy = werkzeug_generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+    user = make_user(legacy)
+    started = service.stats()['rehash_started']
+
+    # e.g. the current-password check in change_password
+    assert user.check_password(PASSWORD)
+    assert service.stats()['rehash_started'] == started
+    assert not user.apply_pending_rehash()
+
+
+def test_slow_rehash_is_skipped(make_user, monkeypatch):
+    service = get_password_service()
+    monkeypatch.setattr(service, "rehash_wait_seconds", 0.01)
+    monkeypatch.setattr(service, "hash_async", lambda password: Future())  # Never finishes
+    legacy = werkzeug_generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+    user = make_user(legacy)
+    skipped = service.stats()['rehash_skipped_slow']
+
+    assert _login(user, PASSWORD)
+    assert db.session.get(User, user.id).password_hash == legacy
+    assert service.stats()['rehash_skipped_slow'] == skipped + 1
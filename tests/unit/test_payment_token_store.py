@@ -0,0 +1,127 @@
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User, Booking, PaymentToken
+from utils.payment_token_store import PaymentTokenStore, InMemoryPaymentTokenStore, DatabasePaymentTokenStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_incomplete_store_fails_on_creation():
+    class NoRevokeStore(PaymentTokenStore):
+        issue = get = consume = booking_of = purge_expired = lambda self, *args, **kwargs: None
+
+    with pytest.raises(TypeError):
+        NoRevokeStore()
+
+
+# === In-memory store ===
+
+def test_memory_token_consumed_only_once():
+    store = InMemoryPaymentTokenStore(ttl_seconds=60)
+    token = store.issue(user_id=1, booking_id=42)
+
+    assert store.get(token, 1) == 42
+    assert store.consume(token, 1) == 42
+    assert store.consume(token, 1) is None
+    assert store.get(token, 1) is None
+
+
+def test_memory_used_token_still_names_its_booking():
+    store = InMemoryPaymentTokenStore(ttl_seconds=60)
+    token = store.issue(user_id=1, booking_id=42)
+    store.consume(token, 1)
+
+    assert store.booking_of(token, 1) == 42
+    assert store.booking_of(token, 2) is None
+
+
+def test_memory_token_rejects_other_user():
+    store = InMemoryPaymentTokenStore(ttl_seconds=60)
+    token = store.issue(user_id=1, booking_id=42)
+
+    assert store.get(token, 2) is None
+    assert store.consume(token, 2) is None
+    # The owner can still use it
+    assert store.consume(token, 1) == 42
+
+
+def test_memory_tokens_expire_and_are_evicted():
+    clock = FakeClock()
+    store = InMemoryPaymentTokenStore(ttl_seconds=60, clock=clock)
+    expired = store.issue(user_id=1, booking_id=1)
+
+    clock.now += 61
+    assert store.get(expired, 1) is None
+
+    stale = store.issue(user_id=1, booking_id=2)
+    clock.now += 61
+    fresh = store.issue(user_id=1, booking_id=3)  # Issuing evicts the stale token
+
+    assert len(store) == 1
+    assert store.consume(stale, 1) is None
+    assert store.consume(fresh, 1) == 3
+
+
+# === Database store ===
+
+@pytest.fixture
+def db_booking():
+    with flask_app.app_context():
+        db.create_all()
+        seeker = User(email="tokenseeker@example.com", role="seeker", gender="Other", active=True)
+        escort = User(email="tokenescort@example.com", role="escort", gender="Other", active=True)
+        db.session.add_all([seeker, escort])
+        db.session.commit()
+        booking = Booking(seeker_id=seeker.id, escort_id=escort.id, status="Confirmed",
+                          start_time=datetime.utcnow() + timedelta(days=1),
+                          end_time=datetime.utcnow() + timedelta(days=1, hours=1))
+        db.session.add(booking)
+        db.session.commit()
+
+        yield seeker.id, booking.id
+
+        db.session.rollback()
+        PaymentToken.query.filter_by(user_id=seeker.id).delete()
+        Booking.query.filter_by(id=booking.id).delete()
+        User.query.filter(User.id.in_([seeker.id, escort.id])).delete()
+        db.session.commit()
+
+
+def test_database_token_consumed_only_once(db_booking):
+    user_id, booking_id = db_booking
+    store = DatabasePaymentTokenStore(ttl_seconds=60)
+    token = store.issue(user_id, booking_id)
+
+    assert store.get(token, user_id) == booking_id
+    assert store.get(token, user_id + 1) is None
+    assert store.consume(token, user_id) == booking_id
+    assert store.consume(token, user_id) is None
+    assert store.get(token, user_id) is None
+    assert store.booking_of(token, user_id) == booking_id
+
+
+def test_database_expired_tokens_are_rejected_and_purged(db_booking):
+    user_id, booking_id = db_booking
+    store = DatabasePaymentTokenStore(ttl_seconds=60)
+    token = store.issue(user_id, booking_id)
+    PaymentToken.query.filter_by(token=token).update(
+        {'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert store.consume(token, user_id) is None
+    assert store.purge_expired() >= 1
+    assert db.session.get(PaymentToken, token) is None
@@ -0,0 +1,86 @@
+import sys
+import os
+import time
+import pytest
+from flask import Flask
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from utils.profiling import RequestProfiler, init_request_profiler, read_collapsed
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_samples_the_profiled_thread(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), interval_ms=1)
+    profiler.start()
+    _spin(0.1)
+    stacks = profiler.stop()
+
+    assert sum(stacks.values()) > 10
+    assert any(stack.endswith(';_spin (tests/unit/test_profiling.py:14)') for stack in stacks)
+    # Stopped threads are no longer sampled
+    assert profiler.stop() == {}
+
+
+def test_profiles_are_kept_in_a_bounded_ring(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), max_files=3)
+    for i in range(5):
+        profiler.save('browse.browseEscort', {f'main;step_{i}': 1})
+        time.sleep(0.001)
+    assert profiler.save('browse.browseEscort', {}) is None
+
+    paths = profiler.profiles('browse.browseEscort')
+    assert [list(read_collapsed(path)) for path in paths] == [['main;step_2'], ['main;step_3'], ['main;step_4']]
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(PROFILING_DIR=str(tmp_path), PROFILING_HEADER_TOKEN='let-me-profile', PROFILING_INTERVAL_MS=1)
+
+    @app.route('/slow')
+    def slow():
+        _spin(0.05)
+        return 'done'
+
+    assert init_request_profiler(app) is not None
+    return app
+
+
+def test_requests_with_the_admin_header_are_profiled(profiled_app, tmp_path):
+    client = profiled_app.test_client()
+    client.get('/slow')
+    client.get('/slow', headers={'X-Profile': 'wrong'})
+    assert os.listdir(tmp_path) == []
+
+    assert client.get('/slow', headers={'X-Profile': 'let-me-profile'}).data == b'done'
+    [path] = profiled_app.extensions['request_profiler'].profiles('slow')
+    assert any('slow (tests/unit/test_profiling.py' in stack for stack in read_collapsed(path))
+
+
+def test_profiling_is_off_by_default(tmp_path):
+    app = Flask(__name__)
+    app.config['PROFILING_DIR'] = str(tmp_path)
+    assert init_request_profiler(app) is None
+
+
+def test_merge_command_sums_profiles(monkeypatch, tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    monkeypatch.setitem(flask_app.extensions, 'request_profiler', profiler)
+    profiler.save('browse.browseEscort', {'main;view;query': 3, 'main;view': 1})
+    profiler.save('browse.browseEscort', {'main;view;query': 2})
+    profiler.save('dashboard.dashboard', {'main;dashboard': 5})
+
+    runner = flask_app.test_cli_runner()
+    result = runner.invoke(args=['profile-merge', '--endpoint', 'browse.browseEscort'])
+    assert result.exit_code == 0
+    assert result.stdout.splitlines() == ['main;view 1', 'main;view;query 5']
+
+    assert runner.invoke(args=['profile-merge', '--endpoint', 'nothing.here']).exit_code == 1
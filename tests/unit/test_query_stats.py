@@ -0,0 +1,91 @@
+import sys
+import os
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db, limiter
+from blueprint.models import Message, User
+from controllers.message_controller import MessageController
+from utils.query_stats import QueryBudget, QueryBudgetExceeded, count_queries, fingerprint
+
+
+def test_fingerprint_ignores_values():
+    first = fingerprint("SELECT * FROM message WHERE sender_id = %(id_1)s AND content = 'hi' LIMIT 1")
+    second = fingerprint("SELECT *  FROM message\nWHERE sender_id = %(id_1)s AND content = 'it''s' LIMIT 20")
+    assert first == second == "SELECT * FROM message WHERE sender_id = ? AND content = ? LIMIT ?"
+    assert fingerprint("SELECT id FROM t WHERE id IN (%(p_1)s, %(p_2)s, %(p_3)s)") == \
+        fingerprint("SELECT id FROM t WHERE id IN (%(p_1)s, %(p_2)s)")
+
+
+@pytest.fixture
+def conversations():
+    """A user with four conversations"""
+    with flask_app.app_context():
+        db.create_all()
+        users = [User(email=f"nplus1-{i}@example.com", role="seeker", gender="Other", active=True) for i in range(5)]
+        db.session.add_all(users)
+        db.session.flush()
+        for other in users[1:]:
+            db.session.add(Message(sender_id=other.id, recipient_id=users[0].id, content="Hello"))
+        db.session.commit()
+        yield users[0].id
+        ids = [user.id for user in users]
+        Message.query.filter(Message.sender_id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(conversations):
+    with count_queries() as stats:
+        assert len(MessageController.get_user_conversations(conversations)) == 4
+
+    shape, runs = stats.most_repeated()
+    assert runs == 4  # One per conversation
+    assert stats.count == 1 + 3 * 4
+    stats.check(QueryBudget(max_queries=20, max_repeats=4))
+    with pytest.raises(QueryBudgetExceeded, match="repeated 4 times"):
+        stats.check(QueryBudget(max_queries=20, max_repeats=3))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    flask_app.config["TESTING"] = True
+    monkeypatch.setitem(flask_app.config, "WTF_CSRF_ENABLED", False)
+    monkeypatch.setattr(limiter, "enabled", False)
+    flask_app.extensions.pop('login_throttle', None)
+    with flask_app.test_client() as client:
+        yield client
+    flask_app.extensions.pop('login_throttle', None)
+
+
+def _login(client):
+    return client.post('/auth/', data={'form_type': 'login', 'email': 'nobody-qs@example.com', 'password': 'x'})
+
+
+def test_counts_are_sent_in_response_headers(client):
+    assert client.get('/healthz').headers['X-DB-Queries'] == "count=0; time_ms=0.0; max_repeats=0"
+
+    with count_queries() as stats:
+        response = _login(client)
+    assert response.headers['X-DB-Queries'].startswith(f"count={stats.count};")
+    assert stats.count > 0
+    assert response.headers['Server-Timing'].startswith("db;dur=")
+
+
+def test_budget_overrun_fails_in_raise_mode(client, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "QUERY_BUDGET_MODE", "raise")
+    monkeypatch.setitem(flask_app.config, "QUERY_BUDGET_MAX_QUERIES", 0)
+    with pytest.raises(QueryBudgetExceeded, match="auth.auth"):
+        _login(client)
+
+    # A view's own budget replaces the default
+    monkeypatch.setattr(flask_app.view_functions['auth.auth'], 'query_budget',
+                        QueryBudget(max_queries=None, max_repeats=None), raising=False)
+    assert _login(client).status_code in (200, 302)
+
+    monkeypatch.setitem(flask_app.config, "QUERY_BUDGET_MODE", "off")
+    monkeypatch.delattr(flask_app.view_functions['auth.auth'], 'query_budget')
+    assert _login(client).status_code in (200, 302)
@@ -0,0 +1,81 @@
+import sys
+import os
+import time
+import uuid
+import multiprocessing
+import pytest
+from limits import RateLimitItemPerMinute, RateLimitItemPerSecond
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from utils.rate_limit_storage import PostgresRateLimitStorage
+
+STRATEGIES = {
+    'fixed-window': FixedWindowRateLimiter,
+    'sliding-window-counter': SlidingWindowCounterRateLimiter,
+}
+LIMIT = 15
+PROCESSES = 4
+HITS_PER_PROCESS = 10
+
+
+def _hit_from_worker(args):
+    """Runs in a separate process, with its own storage and connections, like a gunicorn worker"""
+    uri, strategy, key = args
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    return sum(limiter.hit(RateLimitItemPerMinute(LIMIT), key) for _ in range(HITS_PER_PROCESS))
+
+
+@pytest.fixture
+def storage_uri():
+    uri = flask_app.config['RATELIMIT_STORAGE_URI']
+    assert isinstance(storage_from_string(uri), PostgresRateLimitStorage)
+    return uri
+
+
+@pytest.mark.parametrize("strategy", sorted(STRATEGIES))
+def test_limit_holds_across_processes(storage_uri, strategy):
+    key = f"test-{uuid.uuid4()}"
+    with multiprocessing.get_context('spawn').Pool(PROCESSES) as pool:
+        allowed = pool.map(_hit_from_worker, [(storage_uri, strategy, key)] * PROCESSES)
+
+    # With per-process memory counters every worker would allow LIMIT on its own
+    assert sum(allowed) == LIMIT
+
+    limiter = STRATEGIES[strategy](storage_from_string(storage_uri))
+    item = RateLimitItemPerMinute(LIMIT)
+    assert not limiter.test(item, key)
+    limiter.clear(item, key)
+    assert limiter.hit(item, key)
+    limiter.clear(item, key)
+
+
+def test_fixed_window_restarts_after_expiry(storage_uri):
+    storage = storage_from_string(storage_uri)
+    limiter = FixedWindowRateLimiter(storage)
+    item = RateLimitItemPerSecond(2)
+    key = f"test-{uuid.uuid4()}"
+
+    assert limiter.hit(item, key) and limiter.hit(item, key)
+    assert not limiter.hit(item, key)
+    assert limiter.get_window_stats(item, key).remaining == 0
+
+    time.sleep(1.1)
+    assert limiter.hit(item, key)
+    assert storage.get(item.key_for(key)) == 1
+    storage.clear(item.key_for(key))
+
+
+def test_app_counters_use_the_app_pool(storage_uri):
+    options = flask_app.config['RATELIMIT_STORAGE_OPTIONS']
+    storage = storage_from_string(storage_uri, **options)
+    key = f"test-{uuid.uuid4()}"
+    with flask_app.app_context():
+        assert storage.incr(key, 60) == 1
+        assert storage.engine is db.engine  # No second pool per worker
+        storage.clear(key)
@@ -0,0 +1,91 @@
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User, Profile, Booking, Rating
+from controllers.rating_controller import RatingController
+from utils.query_stats import QueryBudget, count_queries
+
+
+@pytest.fixture
+def seeker_with_history():
+    """Returns a factory creating a seeker with N confirmed bookings, half of them already rated"""
+    created = []
+
+    def make(n_bookings):
+        seeker = User(email=f"rateable{n_bookings}@example.com", role="seeker", gender="Other", active=True)
+        seeker.profile = Profile(name=f"Seeker {n_bookings}")
+        escorts = []
+        for i in range(3):
+            escort = User(email=f"rateable{n_bookings}-escort{i}@example.com", role="escort", gender="Other", active=True)
+            escort.profile = Profile(name=f"Escort {i}")
+            escorts.append(escort)
+        db.session.add_all([seeker] + escorts)
+        db.session.commit()
+        created.extend([seeker] + escorts)
+
+        for i in range(n_bookings):
+            escort = escorts[i % len(escorts)]
+            booking = Booking(seeker_id=seeker.id, escort_id=escort.id, status="Confirmed",
+                              start_time=datetime.utcnow() - timedelta(days=i + 1),
+                              end_time=datetime.utcnow() - timedelta(days=i + 1, minutes=-60))
+            db.session.add(booking)
+            db.session.flush()
+            if i % 2:
+                db.session.add(Rating(booking_id=booking.id, reviewer_id=seeker.id,
+                                      reviewed_id=escort.id, rating=5))
+        db.session.commit()
+        return seeker.id
+
+    with flask_app.app_context():
+        db.create_all()
+        yield make
+
+        db.session.rollback()
+        user_ids = [user.id for user in created]
+        Rating.query.filter(Rating.reviewer_id.in_(user_ids)).delete()
+        Booking.query.filter(Booking.seeker_id.in_(user_ids)).delete()
+        for user_id in user_ids:
+            db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+
+def _load_page(user_id, per_page):
+    """Fetch a page and touch everything the rateable-bookings page renders"""
+    bookings, has_next = RatingController.get_rateable_bookings(user_id, per_page=per_page)
+    for booking in bookings:
+        other = booking.escort if booking.seeker_id == user_id else booking.seeker
+        assert other.email and other.profile.name
+    return bookings, has_next
+
+
+def test_rateable_bookings_excludes_rated(seeker_with_history):
+    user_id = seeker_with_history(6)
+    bookings, has_next = RatingController.get_rateable_bookings(user_id, per_page=10)
+
+    assert len(bookings) == 3
+    assert not has_next
+    assert all(not booking.rating for booking in bookings)
+
+
+def test_rateable_bookings_query_count_is_constant(seeker_with_history):
+    small_user = seeker_with_history(2)
+    large_user = seeker_with_history(60)
+    db.session.expire_all()
+
+    with count_queries() as small_stats:
+        small, _ = _load_page(small_user, per_page=50)
+    db.session.expire_all()
+    with count_queries() as large_stats:
+        large, has_next = _load_page(large_user, per_page=20)
+
+    assert len(small) == 1
+    assert len(large) == 20 and has_next
+    for stats in (small_stats, large_stats):
+        stats.check(QueryBudget(max_queries=1, max_repeats=1))
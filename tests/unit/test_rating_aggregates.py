@@ -0,0 +1,88 @@
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User, Profile, Booking, Rating, RatingAggregate
+from controllers.rating_controller import RatingController
+
+
+@pytest.fixture
+def rated_pair():
+    """A seeker and an escort with three confirmed bookings between them"""
+    with flask_app.app_context():
+        db.create_all()
+        seeker = User(email="aggseeker@example.com", role="seeker", gender="Other", active=True)
+        escort = User(email="aggescort@example.com", role="escort", gender="Other", active=True)
+        escort.profile = Profile(name="Aggregate Escort")
+        db.session.add_all([seeker, escort])
+        db.session.commit()
+
+        booking_ids = []
+        for day in range(3):
+            booking = Booking(seeker_id=seeker.id, escort_id=escort.id, status="Confirmed",
+                              start_time=datetime.utcnow() - timedelta(days=day + 1),
+                              end_time=datetime.utcnow() - timedelta(days=day + 1, hours=-1))
+            db.session.add(booking)
+            db.session.flush()
+            booking_ids.append(booking.id)
+        db.session.commit()
+
+        yield seeker.id, escort.id, booking_ids
+
+        db.session.rollback()
+        Rating.query.filter(Rating.booking_id.in_(booking_ids)).delete()
+        Booking.query.filter(Booking.id.in_(booking_ids)).delete()
+        db.session.delete(db.session.get(User, escort.id))
+        db.session.delete(db.session.get(User, seeker.id))
+        db.session.commit()
+
+
+def test_submitted_ratings_update_counters_incrementally(rated_pair):
+    seeker_id, escort_id, booking_ids = rated_pair
+    for booking_id, value in zip(booking_ids, [5, 4, 4]):
+        success, result = RatingController.submit_rating(booking_id, seeker_id, value)
+        assert success, result
+
+    stats = RatingController.get_rating_statistics(escort_id)
+    assert stats['total_ratings'] == 3
+    assert stats['average_rating'] == 4.3
+    assert stats['rating_distribution'] == {1: 0, 2: 0, 3: 0, 4: 2, 5: 1}
+    assert Profile.query.filter_by(user_id=escort_id).first().rating == 4.3
+
+
+def test_statistics_for_unrated_user(rated_pair):
+    _, escort_id, _ = rated_pair
+    stats = RatingController.get_rating_statistics(escort_id)
+    assert stats == {
+        'total_ratings': 0,
+        'average_rating': 0,
+        'rating_distribution': {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+    }
+
+
+def test_recompute_detects_and_repairs_drift(rated_pair):
+    seeker_id, escort_id, booking_ids = rated_pair
+    RatingController.submit_rating(booking_ids[0], seeker_id, 2)
+    RatingController.submit_rating(booking_ids[1], seeker_id, 5)
+    assert escort_id not in RatingController.recompute_rating_aggregates(dry_run=True)
+
+    # Simulate drift, e.g. a rating inserted by a script that bypassed the controller
+    aggregate = db.session.get(RatingAggregate, escort_id)
+    aggregate.rating_count = 7
+    db.session.commit()
+
+    assert escort_id in RatingController.recompute_rating_aggregates(dry_run=True)
+    assert db.session.get(RatingAggregate, escort_id).rating_count == 7
+
+    RatingController.recompute_rating_aggregates()
+    db.session.expire_all()
+    aggregate = db.session.get(RatingAggregate, escort_id)
+    assert aggregate.rating_count == 2
+    assert aggregate.distribution == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+    assert Profile.query.filter_by(user_id=escort_id).first().rating == 3.5
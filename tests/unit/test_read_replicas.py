@@ -0,0 +1,148 @@
+import sys
+import os
+import time
+import pytest
+from sqlalchemy import event, select, text
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from blueprint.models import User
+from utils.read_replicas import ReplicaRouter, STICKY_SESSION_KEY, primary, read_only
+
+# A real streaming replica of the test database, e.g. one made with pg_basebackup -R on port 5433.
+# Without it a second engine on the primary stands in for the replica.
+REPLICA_URL = os.getenv('TEST_DATABASE_REPLICA_URL')
+
+
+class Recorder:
+    """Which engine each statement ran on"""
+
+    def __init__(self, **engines):
+        self.ran_on = []
+        for name, engine in engines.items():
+            event.listen(engine, "before_cursor_execute", self._recorder(name))
+
+    def _recorder(self, name):
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if 'pg_is_in_recovery' not in statement:  # Lag checks
+                self.ran_on.append(name)
+        return record
+
+
+@pytest.fixture
+def router(monkeypatch):
+    with flask_app.app_context():
+        db.create_all()
+        router = ReplicaRouter([REPLICA_URL or flask_app.config['SQLALCHEMY_DATABASE_URI']], lag_check_seconds=60)
+        monkeypatch.setitem(flask_app.extensions, 'read_replicas', router)
+        router.recorder = Recorder(primary=db.engine, replica=router.engines[0])
+        yield router
+        db.session.remove()
+        router.dispose()
+
+
+def test_only_reads_in_a_read_only_scope_use_the_replica(router):
+    User.query.first()
+    with read_only():
+        User.query.first()
+        db.session.execute(select(User.id).limit(1)).all()
+        db.session.execute(select(User.id).limit(1).with_for_update()).all()
+        db.session.execute(text("SELECT 1"))
+    assert router.recorder.ran_on == ['primary', 'replica', 'replica', 'primary', 'primary']
+
+
+def test_primary_scope_inside_read_only(router):
+    with read_only():
+        with primary():
+            User.query.first()
+        User.query.first()
+    assert router.recorder.ran_on == ['primary', 'replica']
+
+
+def test_cached_dashboard_summaries_are_built_on_the_primary(router):
+    from blueprint.controller import dashboard_controller
+    dashboard_controller._dashboard_cache().clear()
+    with read_only():
+        dashboard_controller.DashboardController.get_dashboard_summary(-1, 'seeker')
+    assert router.recorder.ran_on and 'replica' not in router.recorder.ran_on
+
+
+def test_reads_after_a_write_stay_on_the_primary(router):
+    @read_only
+    def count_users():
+        return User.query.count()
+
+    user = User(email="replica-write@example.com", role="seeker", gender="Other", active=True)
+    try:
+        with read_only():
+            db.session.add(user)
+            db.session.flush()  # Uncommitted: only the primary can see it
+            assert User.query.filter_by(email="replica-write@example.com").one().id == user.id
+        db.session.commit()
+        assert router.recorder.ran_on == ['primary', 'primary']
+
+        # A new transaction reads from the replica again
+        count_users()
+        assert router.recorder.ran_on[-1] == 'replica'
+    finally:
+        db.session.delete(user)
+        db.session.commit()
+
+
+def test_lagging_or_unreachable_replicas_fall_back_to_the_primary(router, monkeypatch):
+    monkeypatch.setattr(router, '_measure_lag', lambda engine: router.max_lag_seconds + 10)
+    router._lag.clear()
+    with read_only():
+        User.query.first()
+    assert router.recorder.ran_on == ['primary']
+
+    unreachable = ReplicaRouter(['postgresql+psycopg2://nobody@127.0.0.1:1/none'])
+    assert unreachable.lag(0) is None
+    assert unreachable.choose() is None
+    assert unreachable.snapshot()['primary_fallbacks'] == 1
+
+
+def test_writer_reads_from_the_primary_until_replicas_catch_up(router):
+    user = User(email="replica-sticky@example.com", role="seeker", gender="Other", active=True)
+    with flask_app.test_request_context():
+        from flask import session
+        db.session.add(user)
+        db.session.commit()
+        assert session[STICKY_SESSION_KEY] == pytest.approx(time.time() + router.max_lag_seconds, abs=1)
+
+        with read_only():
+            User.query.first()
+        assert router.recorder.ran_on[-1] == 'primary'
+
+        session[STICKY_SESSION_KEY] = time.time() - 1
+        with read_only():
+            User.query.first()
+        assert router.recorder.ran_on[-1] == 'replica'
+
+        db.session.delete(user)
+        db.session.commit()
+
+
+@pytest.mark.skipif(not REPLICA_URL, reason="TEST_DATABASE_REPLICA_URL not set")
+def test_streaming_replica_serves_committed_rows(router):
+    with router.engines[0].connect() as conn:
+        assert conn.execute(text("SELECT pg_is_in_recovery()")).scalar() is True
+    assert 0 <= router.lag(0) <= router.max_lag_seconds
+
+    user = User(email="replica-stream@example.com", role="seeker", gender="Other", active=True)
+    db.session.add(user)
+    db.session.commit()
+    try:
+        deadline = time.time() + router.max_lag_seconds
+        with read_only():
+            while User.query.filter_by(email="replica-stream@example.com").first() is None:
+                assert time.time() < deadline, "Replica did not replay the commit within the lag limit"
+                db.session.rollback()
+                time.sleep(0.05)
+        assert router.recorder.ran_on[-1] == 'replica'
+    finally:
+        db.session.delete(user)
+        db.session.commit()
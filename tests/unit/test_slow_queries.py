@@ -0,0 +1,122 @@
+import sys
+import os
+import time
+import pytest
+
+# Ensure app module is found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app import app as flask_app
+from extensions import db
+from utils.query_stats import _statement_observers
+from utils.slow_queries import SlowQueryLog, explainable, redact_parameters
+
+
+@pytest.fixture
+def slow_log(tmp_path):
+    """A log of every statement, registered for the length of the test"""
+    logs = []
+
+    def make(**options):
+        log = SlowQueryLog(str(tmp_path), **{'threshold_ms': 0, **options})
+        _statement_observers.append(log.observe)
+        logs.append(log)
+        return log
+
+    yield make
+    for log in logs:
+        _statement_observers.remove(log.observe)
+
+
+def _wait_for_plan(log, entry_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entry = next(entry for entry in log.recent() if entry['id'] == entry_id)
+        if isinstance(entry.get('explain'), dict):
+            return entry['explain']
+        time.sleep(0.05)
+    raise AssertionError("No EXPLAIN plan was written")
+
+
+def test_parameters_are_redacted():
+    assert redact_parameters({'email': 'someone@example.com', 'id': 7, 'active': True, 'note': None}) == \
+        {'email': '<str:19>', 'id': 7, 'active': True, 'note': None}
+    assert redact_parameters([{'a': 'x'}, {'a': 'y'}], executemany=True) == "<2 rows>"
+
+
+def test_only_plain_selects_are_explained():
+    assert explainable("SELECT * FROM users WHERE id = %(id)s")
+    assert explainable("  WITH recent AS (SELECT 1) SELECT * FROM recent")
+    assert not explainable("SELECT * FROM users WHERE id = %(id)s FOR UPDATE")
+    assert not explainable("WITH gone AS (DELETE FROM users RETURNING id) SELECT * FROM gone")
+    assert not explainable("UPDATE users SET active = false")
+
+
+def test_slow_statements_are_logged_with_endpoint(slow_log):
+    log = slow_log(threshold_ms=50)
+    with flask_app.test_request_context('/admin/slow-queries?token=secret'):
+        with db.engine.connect() as conn:
+            conn.execute(db.text("SELECT 1 WHERE :email <> ''"), {'email': 'someone@example.com'})
+            conn.execute(db.text("SELECT pg_sleep(0.06), :email"), {'email': 'someone@example.com'})
+
+    [entry] = log.recent()
+    assert entry['fingerprint'] == "SELECT pg_sleep(?), ?"
+    assert entry['duration_ms'] >= 50
+    assert entry['params'] == {'email': '<str:19>'}
+    assert entry['method'] == 'GET'
+    assert 'secret' not in open(os.path.join(log.directory, f"slow-queries-{os.getpid()}.log")).read()
+    assert log.summarize(log.recent())[0]['count'] == 1
+
+
+def test_sampled_selects_get_an_explain_plan(slow_log):
+    log = slow_log(explain_sample_rate=1.0)
+    with flask_app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(db.text("SELECT count(*) FROM pg_class WHERE relname <> :name"), {'name': 'x'})
+            conn.execute(db.text("CREATE TEMP TABLE slow_query_probe (id int)"))
+            conn.execute(db.text("INSERT INTO slow_query_probe VALUES (:id)"), {'id': 1})
+            conn.rollback()
+
+    entries = {entry['fingerprint']: entry for entry in log.recent()}
+    select = entries["SELECT count(*) FROM pg_class WHERE relname <> ?"]
+    assert select['explain'] == 'pending'
+    plan = _wait_for_plan(log, select['id'])
+    assert 'actual time' in plan['plan']
+    assert 'Buffers: shared' in plan['plan']
+    # Writes are never re-run
+    assert 'explain' not in entries["INSERT INTO slow_query_probe VALUES (?)"]
+
+
+def test_log_files_rotate(slow_log):
+    log = slow_log(max_bytes=2000, backup_count=2)
+    with flask_app.app_context():
+        with db.engine.connect() as conn:
+            for _ in range(40):
+                conn.execute(db.text("SELECT 1"))
+    files = sorted(os.listdir(log.directory))
+    assert files == [f"slow-queries-{os.getpid()}.log", f"slow-queries-{os.getpid()}.log.1",
+                     f"slow-queries-{os.getpid()}.log.2"]
+    assert 0 < len(log.recent()) < 40
+
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as client:
+        client.environ_base["HTTP_USER_AGENT"] = "test-agent"
+        client.environ_base["REMOTE_ADDR"] = "127.0.0.1"
+        yield client
+
+
+def test_slow_query_page_is_admin_only(client):
+    assert client.get('/admin/slow-queries').status_code == 302
+
+    with client.session_transaction() as sess:
+        sess.update(user_id=1, role="seeker", bound_ua="test-agent", bound_ip="127.0.0.1")
+    assert client.get('/admin/slow-queries').status_code == 302
+
+    with client.session_transaction() as sess:
+        sess["role"] = "admin"
+    response = client.get('/admin/slow-queries')
+    assert response.status_code == 200
+    assert b'Slow Queries' in response.data
@@ -0,0 +1,106 @@
+"""
+Audit Log Partitions
+audit_log is range-partitioned by month on created_at (PostgreSQL only).
+
+Each month lives in its own table named audit_log_YYYY_MM, plus an
+audit_log_default partition that catches rows outside every monthly range.
+ensure_partitions() creates the coming months ahead of time so the default
+partition stays empty. drop_expired_partitions() enforces retention by
+dropping whole months, which is instant compared to DELETE on a large table.
+
+`flask audit-partitions` runs both. It is called at container start, and
+the audit writer also creates upcoming months once a day.
+"""
+
+import datetime
+import logging
+import re
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'audit_log'
+DEFAULT_PARTITION = 'audit_log_default'
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_RETENTION_MONTHS = 12
+
+_PARTITION_NAME = re.compile(r'^audit_log_(\d{4})_(\d{2})$')
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def is_partitioned(conn):
+    """True if audit_log exists and is a partitioned table"""
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {'table': PARENT_TABLE}
+    ).scalar()
+    return relkind == 'p'
+
+
+def list_partitions(conn):
+    """Return {month: table_name} for the existing monthly partitions"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {'table': PARENT_TABLE}).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partitions(conn, months_ahead=DEFAULT_MONTHS_AHEAD, today=None):
+    """Create the default partition and monthly partitions from this month to months_ahead. Returns names created."""
+    current = month_start(today or datetime.datetime.utcnow().date())
+    existing = list_partitions(conn)
+    created = []
+
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        name = partition_name(month)
+        try:
+            with conn.begin_nested():
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+            created.append(name)
+        except Exception as e:
+            # Usually rows for this month already landed in the default partition
+            logger.error(f"Could not create audit partition {name}: {e}")
+    return created
+
+
+def drop_expired_partitions(conn, retention_months=DEFAULT_RETENTION_MONTHS, today=None):
+    """Drop monthly partitions that end before the retention window. Returns names dropped."""
+    cutoff = add_months(month_start(today or datetime.datetime.utcnow().date()), -retention_months)
+    dropped = []
+    for month, name in sorted(list_partitions(conn).items()):
+        if add_months(month, 1) <= cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def create_initial_partitions(target, connection, **kw):
+    """after_create hook for the audit_log table so db.create_all() yields a usable table"""
+    if connection.dialect.name == 'postgresql':
+        ensure_partitions(connection)
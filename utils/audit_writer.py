@@ -0,0 +1,203 @@
+"""
+Audit Log Writer
+Moves audit_log inserts off the request path.
+
+log_event() hands each event to an AuditLogWriter. In 'async' mode events go
+into a bounded in-process queue and a background thread writes them in
+multi-row INSERT batches, flushing when a batch fills up or FLUSH_INTERVAL
+passes. Writes use their own pooled connection, never the request's
+db.session, so logging an event no longer commits unrelated pending changes.
+
+If the queue is full (the database is slow or down) the caller waits briefly
+and then writes its event inline - audit events are never dropped. Pending
+events are flushed when the process exits.
+
+'sync' mode writes each event immediately on the caller's thread and is
+used automatically when the app is TESTING.
+
+Each event's category is derived from its action here, at write time, so the
+admin filters can use the (category, created_at) index. Once a day the
+writer also creates upcoming monthly audit_log partitions.
+"""
+
+import atexit
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import insert
+
+from blueprint.models import db, AuditLog
+from utils.audit_partitions import DEFAULT_MONTHS_AHEAD, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0  # Seconds an event may wait in the queue before being written
+DEFAULT_QUEUE_SIZE = 10000
+ENQUEUE_TIMEOUT = 0.05  # Seconds a caller waits for queue space before writing inline
+PARTITION_CHECK_INTERVAL = 24 * 60 * 60
+
+_STOP = object()
+
+
+class AuditLogWriter:
+
+    def __init__(self, engine, synchronous=False, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_queue_size=DEFAULT_QUEUE_SIZE,
+                 partitions_ahead=DEFAULT_MONTHS_AHEAD):
+        self.engine = engine
+        self.synchronous = synchronous
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.partitions_ahead = partitions_ahead
+        self._partitions_checked_at = None
+        self.stats = {'written': 0, 'batches': 0, 'inline_writes': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def submit(self, user_id, action, details=None):
+        """Record one audit event. Timestamps are taken now, not when the row is written."""
+        row = {
+            'user_id': user_id,
+            'action': action,
+            'category': AuditLog.categorize(action),
+            'details': details,
+            'created_at': datetime.datetime.utcnow(),
+        }
+        if self.synchronous:
+            self._write([row])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            # Backpressure: the writer is behind, so pay for this event on the caller's thread
+            self._bump('inline_writes')
+            self._write([row])
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued before this call has been written"""
+        if self.synchronous or not self._running():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write any queued events and stop the background thread"""
+        if not self._running():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _bump(self, name):
+        # Inline writes run on request threads, batches on the writer thread
+        with self._lock:
+            self.stats[name] += 1
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            # Started lazily so each gunicorn worker gets its own thread after fork
+            first_start = self._pid is None
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+            if first_start:
+                atexit.register(self.close)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, flush interval passed, flush requested or shutting down
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, rows):
+        self._maybe_ensure_partitions()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(AuditLog.__table__).values(rows))
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['written'] += len(rows)
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                self._bump('failed')
+                logger.error(f"Failed to write audit event {rows[0]}: {e}")
+                return
+            logger.warning(f"Audit batch of {len(rows)} failed, retrying row by row: {e}")
+
+        # One bad row (e.g. a user_id deleted meanwhile) must not lose the rest of the batch
+        for row in rows:
+            self._write([row])
+
+    def _maybe_ensure_partitions(self):
+        now = time.monotonic()
+        if self._partitions_checked_at is not None and now - self._partitions_checked_at < PARTITION_CHECK_INTERVAL:
+            return
+        self._partitions_checked_at = now
+        if self.engine.dialect.name != 'postgresql':
+            return
+        try:
+            with self.engine.begin() as conn:
+                ensure_partitions(conn, months_ahead=self.partitions_ahead)
+        except Exception as e:
+            logger.error(f"Audit partition check failed: {e}")
+
+
+def get_audit_writer():
+    """Return the app's audit writer, created on first use from AUDIT_LOG_* config"""
+    writer = current_app.extensions.get('audit_writer')
+    if writer is None:
+        mode = current_app.config.get('AUDIT_LOG_MODE', 'async')
+        if mode not in ('async', 'sync'):
+            raise ValueError(f"Unknown AUDIT_LOG_MODE: {mode}")
+        writer = AuditLogWriter(
+            db.engine,
+            synchronous=mode == 'sync' or current_app.testing,
+            batch_size=current_app.config.get('AUDIT_LOG_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            flush_interval=current_app.config.get('AUDIT_LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+            max_queue_size=current_app.config.get('AUDIT_LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+            partitions_ahead=current_app.config.get('AUDIT_LOG_PARTITIONS_AHEAD', DEFAULT_MONTHS_AHEAD)
+        )
+        current_app.extensions['audit_writer'] = writer
+    return writer
@@ -0,0 +1,369 @@
+"""
+Benchmark Data
+Production-scale synthetic data for benchmarks and load tests (`flask bench-seed`).
+
+Volumes are configurable. The defaults are 100k users, 10k of them
+escorts, 5M messages and 1M bookings. Activity is skewed the way real
+traffic is: seekers and escorts are picked with Zipf weights, so a few
+popular escorts take most of the bookings and a few seekers have very
+large inboxes. Everyone else has a handful of rows.
+
+Users, profiles, time slots, favourites, bookings, messages and reports
+are streamed into Postgres with COPY. Payments, ratings and rating
+aggregates are then derived from the bookings with INSERT ... SELECT.
+Every account shares one password hash, computed once before loading,
+so no row pays for Argon2. The tables are ANALYZEd at the end so query
+plans match production.
+
+Accounts:
+  - bench-seeker-<n>@bench.example.com
+  - bench-escort-<n>@bench.example.com
+  - bench-admin@bench.example.com
+All use the same password, so load tests can log in as any of them.
+remove_bench_data() deletes these accounts and every row that refers to
+them, and leaves other data alone. When the bench accounts are the only
+users, it truncates the tables instead, which is much faster.
+"""
+
+import csv
+import datetime
+import io
+import itertools
+import random
+import time
+from dataclasses import dataclass
+
+EMAIL_DOMAIN = 'bench.example.com'
+ADMIN_EMAIL = f'bench-admin@{EMAIL_DOMAIN}'
+BENCH_EMAIL_PATTERN = f'bench-%@{EMAIL_DOMAIN}'
+DEFAULT_PASSWORD = 'Password123'
+
+COPY_BATCH_ROWS = 10000
+COPY_READ_BYTES = 1 << 20
+CHOICE_BATCH = 100000
+GENDERS = ('Male', 'Female', 'Non-binary')
+REPORT_TYPES = ('inappropriate_behavior', 'harassment', 'fraud', 'fake_profile', 'other')
+REPORT_STATUSES = ('Pending Review', 'Under Investigation', 'Resolved', 'Dismissed')
+SEVERITIES = ('Low', 'Medium', 'High', 'Critical')
+
+
+@dataclass(frozen=True)
+class BenchVolumes:
+    users: int = 100_000  # Including escorts
+    escorts: int = 10_000
+    messages: int = 5_000_000
+    bookings: int = 1_000_000
+    slots_per_escort: int = 6
+    favourites_per_seeker: int = 2  # Average
+    reports: int = 2_000
+    messages_per_conversation: int = 20  # Average
+    rated_share: float = 0.4  # Of completed bookings
+    skew: float = 0.8  # Zipf exponent for how activity concentrates on popular users
+
+    @property
+    def seekers(self):
+        return self.users - self.escorts
+
+
+def bench_email(role, number):
+    return f'bench-{role}-{number}@{EMAIL_DOMAIN}'
+
+
+class _CsvStream:
+    """File-like object for copy_expert that encodes rows in batches as COPY reads it"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            batch = list(itertools.islice(self._rows, COPY_BATCH_ROWS))
+            if not batch:
+                break
+            out = io.StringIO()
+            csv.writer(out, lineterminator='\n').writerows(batch)
+            self._buffer += out.getvalue()
+            self.count += len(batch)
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows (tuples, None for NULL) into table; returns the row count"""
+    stream = _CsvStream(rows)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", stream, size=COPY_READ_BYTES)
+    return stream.count
+
+
+class _Skewed:
+    """Draws ids with Zipf weights; the popular ones are shuffled, not the lowest ids"""
+
+    def __init__(self, rng, ids, exponent):
+        self.rng = rng
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cum_weights = list(itertools.accumulate((rank ** -exponent for rank in range(1, len(self.ids) + 1))))
+        self._pending = []
+
+    def draw(self):
+        if not self._pending:
+            self._pending = self.rng.choices(self.ids, cum_weights=self.cum_weights, k=CHOICE_BATCH)
+        return self._pending.pop()
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _text_pool(rng, size):
+    from faker import Faker
+
+    faker = Faker()
+    faker.seed_instance(rng.random())
+    return (
+        [faker.name() for _ in range(size)],
+        [faker.paragraph(nb_sentences=3) for _ in range(size)],
+        [faker.sentence(nb_words=rng.randint(3, 14)) for _ in range(size)],
+    )
+
+
+def seed_bench_data(connection, volumes=BenchVolumes(), password_hash=None, random_seed=1, log=print):
+    """Load volumes of synthetic data through a DBAPI connection; returns row counts per table"""
+    from blueprint.models import Profile, generate_password_hash
+
+    rng = random.Random(random_seed)
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    password_hash = password_hash or generate_password_hash(DEFAULT_PASSWORD)
+    names, bios, sentences = _text_pool(rng, 500)
+    default_photo = Profile.photo.default.arg
+    counts = {}
+    cursor = connection.cursor()
+
+    def step(name, load):
+        started = time.perf_counter()
+        counts[name] = load()
+        log(f"   - {name}: {counts[name]:,} rows in {time.perf_counter() - started:.1f}s")
+
+    log("-> Creating users...")
+
+    def users():
+        roles = [('admin', None)] + [('escort', n) for n in range(1, volumes.escorts + 1)] + \
+                [('seeker', n) for n in range(1, volumes.seekers + 1)]
+        for role, number in roles:
+            created = now - datetime.timedelta(seconds=rng.randint(0, 730 * 86400))
+            yield (ADMIN_EMAIL if role == 'admin' else bench_email(role, number), password_hash, role, True,
+                   _timestamp(created), rng.choice(GENDERS), True, False, True, True, 0,
+                   _timestamp(now), _timestamp(now + datetime.timedelta(days=90)), False, 0, 0)
+
+    step('user', lambda: copy_rows(cursor, '"user"', (
+        'email', 'password_hash', 'role', 'active', 'created_at', 'gender', 'activate', 'deleted',
+        'email_verified', 'phone_verified', 'otp_attempts', 'password_created_at', 'password_expires_at',
+        'password_change_required', 'failed_login_attempts', 'suspicious_activity_flags'), users()))
+
+    cursor.execute('SELECT id, role FROM "user" WHERE email LIKE %s ORDER BY id', (BENCH_EMAIL_PATTERN,))
+    ids = {'admin': [], 'escort': [], 'seeker': []}
+    for user_id, role in cursor.fetchall():
+        ids[role].append(user_id)
+    seekers = _Skewed(rng, ids['seeker'], volumes.skew)
+    escorts = _Skewed(rng, ids['escort'], volumes.skew)
+
+    def profiles():
+        for role in ('admin', 'escort', 'seeker'):
+            for user_id in ids[role]:
+                yield (user_id, rng.choice(names), rng.choice(bios), default_photo, 'Available',
+                       rng.randint(19, 45) if role == 'escort' else None)
+
+    step('profile', lambda: copy_rows(cursor, 'profile', ('user_id', 'name', 'bio', 'photo', 'availability', 'age'),
+                                      profiles()))
+
+    log("-> Creating availability and favourites...")
+
+    def slots():
+        for escort_id in ids['escort']:
+            for _ in range(volumes.slots_per_escort):
+                start = (now + datetime.timedelta(days=rng.randint(1, 14))).replace(
+                    hour=rng.randint(9, 18), minute=rng.choice((0, 15, 30, 45)), second=0)
+                yield (escort_id, _timestamp(start), _timestamp(start + datetime.timedelta(minutes=rng.choice((60, 120, 180)))))
+
+    step('time_slot', lambda: copy_rows(cursor, 'time_slot', ('user_id', 'start_time', 'end_time'), slots()))
+
+    def favourites():
+        for seeker_id in ids['seeker']:
+            chosen = {escorts.draw() for _ in range(rng.randint(0, 2 * volumes.favourites_per_seeker))}
+            for escort_id in chosen:
+                yield (seeker_id, escort_id, _timestamp(now - datetime.timedelta(seconds=rng.randint(0, 365 * 86400))))
+
+    step('favourites', lambda: copy_rows(cursor, 'favourites', ('user_id', 'favourite_user_id', 'created_at'),
+                                         favourites()))
+
+    log("-> Creating bookings...")
+
+    def bookings():
+        for _ in range(volumes.bookings):
+            start = now + datetime.timedelta(minutes=15 * rng.randint(-365 * 96, 30 * 96))
+            end = start + datetime.timedelta(minutes=rng.choice((30, 60, 90, 120, 180)))
+            if end < now:
+                status = rng.choices(('Completed', 'Rejected', 'Confirmed', 'Pending'), (75, 15, 5, 5))[0]
+            else:
+                status = rng.choices(('Pending', 'Confirmed', 'Rejected'), (50, 45, 5))[0]
+            yield (seekers.draw(), escorts.draw(), _timestamp(start), _timestamp(end), status)
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM booking")
+    first_booking = cursor.fetchone()[0] + 1
+    step('booking', lambda: copy_rows(cursor, 'booking', ('seeker_id', 'escort_id', 'start_time', 'end_time', 'status'),
+                                      bookings()))
+
+    def derived(sql, params=()):
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+    # One completed payment per confirmed or completed booking, made when it was booked
+    step('payment', lambda: derived("""
+        INSERT INTO payment (user_id, booking_id, amount, status, transaction_id, created_at)
+        SELECT seeker_id, id, round((50 + random() * 450)::numeric, 2), 'Completed',
+               'bench-' || id, start_time - interval '3 days'
+        FROM booking WHERE id >= %s AND status IN ('Completed', 'Confirmed')
+    """, (first_booking,)))
+
+    # Ratings lean towards 4 and 5 stars
+    step('rating', lambda: derived("""
+        INSERT INTO rating (booking_id, reviewer_id, reviewed_id, rating, created_at)
+        SELECT id, seeker_id, escort_id, 5 - floor(power(random(), 2.5) * 5)::int, end_time + interval '1 day'
+        FROM booking WHERE id >= %s AND status = 'Completed' AND random() < %s
+    """, (first_booking, volumes.rated_share)))
+
+    step('rating_aggregate', lambda: derived("""
+        INSERT INTO rating_aggregate (user_id, rating_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5, updated_at)
+        SELECT reviewed_id, count(*), sum(rating),
+               count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2), count(*) FILTER (WHERE rating = 3),
+               count(*) FILTER (WHERE rating = 4), count(*) FILTER (WHERE rating = 5), now()
+        FROM rating WHERE booking_id >= %s GROUP BY reviewed_id
+    """, (first_booking,)))
+    cursor.execute("""
+        UPDATE profile SET rating = round(agg.rating_sum::numeric / agg.rating_count, 1)
+        FROM rating_aggregate agg
+        WHERE agg.user_id = profile.user_id AND profile.user_id IN (SELECT id FROM "user" WHERE email LIKE %s)
+    """, (BENCH_EMAIL_PATTERN,))
+
+    log("-> Creating messages...")
+    conversations = [(seekers.draw(), escorts.draw())
+                     for _ in range(max(1, volumes.messages // volumes.messages_per_conversation))]
+    busy_conversations = _Skewed(rng, range(len(conversations)), volumes.skew)
+
+    def messages():
+        for _ in range(volumes.messages):
+            seeker_id, escort_id = conversations[busy_conversations.draw()]
+            sender, recipient = (seeker_id, escort_id) if rng.random() < 0.55 else (escort_id, seeker_id)
+            sent = now - datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+            is_read = sent < now - datetime.timedelta(days=2) or rng.random() < 0.5
+            yield (sender, recipient, rng.choice(sentences), 'AES-GCM-128', False, _timestamp(sent), is_read,
+                   False, False)
+
+    step('message', lambda: copy_rows(cursor, 'message', (
+        'sender_id', 'recipient_id', 'content', 'encryption_algorithm', 'is_encrypted', 'timestamp', 'is_read',
+        'deleted_by_sender', 'deleted_by_recipient'), messages()))
+
+    log("-> Creating reports...")
+    reporters = _Skewed(rng, ids['seeker'] + ids['escort'], volumes.skew)
+
+    def reports():
+        for _ in range(volumes.reports):
+            reporter, reported = reporters.draw(), escorts.draw()
+            if reporter == reported:
+                continue
+            created = now - datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+            status = rng.choices(REPORT_STATUSES, (40, 20, 30, 10))[0]
+            yield (reporter, reported, rng.choice(REPORT_TYPES), rng.choice(sentences)[:200], rng.choice(bios),
+                   rng.choices(SEVERITIES, (30, 40, 20, 10))[0], status, _timestamp(created), _timestamp(created),
+                   _timestamp(created + datetime.timedelta(days=3)) if status in ('Resolved', 'Dismissed') else None,
+                   ids['admin'][0] if status != 'Pending Review' else None)
+
+    step('report', lambda: copy_rows(cursor, 'report', (
+        'reporter_id', 'reported_id', 'report_type', 'title', 'description', 'severity', 'status', 'created_at',
+        'updated_at', 'resolved_at', 'assigned_admin_id'), reports()))
+
+    connection.commit()
+    log("-> Analyzing tables...")
+    for table in ('"user"', 'profile', 'time_slot', 'favourites', 'booking', 'payment', 'rating',
+                  'rating_aggregate', 'message', 'report'):
+        cursor.execute(f"ANALYZE {table}")
+    connection.commit()
+    cursor.close()
+    return counts
+
+
+def count_bench_users(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*) FROM "user" WHERE email LIKE %s', (BENCH_EMAIL_PATTERN,))
+        return cursor.fetchone()[0]
+
+
+# Columns holding booking ids; every other column in remove_bench_data holds user ids
+_BENCH_IDS = {(table, 'booking_id'): 'bench_booking' for table in ('rating', 'payment', 'payment_token')}
+_BENCH_IDS[('booking', 'id')] = 'bench_booking'
+
+
+def _vacuum(connection, tables):
+    """VACUUM ANALYZE outside a transaction, so the dead rows are gone before the next delete checks keys
+
+    TRUNCATE false: giving the space back needs an exclusive lock, which a running app's sessions would hold up
+    """
+    dbapi_connection = getattr(connection, 'dbapi_connection', connection)
+    dbapi_connection.autocommit = True
+    try:
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"VACUUM (ANALYZE, TRUNCATE false) {', '.join(tables)}")
+    finally:
+        dbapi_connection.autocommit = False
+
+
+def remove_bench_data(connection):
+    """Delete the bench accounts and every row that refers to them; returns the number of accounts"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*) FILTER (WHERE email LIKE %s), count(*) FROM "user"', (BENCH_EMAIL_PATTERN,))
+        bench_users, all_users = cursor.fetchone()
+        if not bench_users:
+            connection.commit()
+            return 0
+        if bench_users == all_users:
+            # Only bench data here, so skip the deletes' per-row foreign key checks
+            cursor.execute('TRUNCATE "user", booking RESTART IDENTITY CASCADE')
+            connection.commit()
+            return bench_users
+
+        cursor.execute('CREATE TEMP TABLE bench_user AS SELECT id FROM "user" WHERE email LIKE %s',
+                       (BENCH_EMAIL_PATTERN,))
+        cursor.execute("CREATE TEMP TABLE bench_booking AS SELECT id FROM booking "
+                       "WHERE seeker_id IN (SELECT id FROM bench_user) OR escort_id IN (SELECT id FROM bench_user)")
+        # Each deleted booking or user row has its foreign keys checked by scanning the referencing
+        # tables (the columns are not indexed). So delete level by level, vacuuming in between,
+        # so that those scans do not read millions of dead rows
+        for level in (
+            (('rating', ('booking_id', 'reviewer_id', 'reviewed_id')),
+             ('payment', ('booking_id', 'user_id')),
+             ('payment_token', ('booking_id', 'user_id')),
+             ('message', ('sender_id', 'recipient_id')),
+             ('favourites', ('user_id', 'favourite_user_id')),
+             ('report', ('reporter_id', 'reported_id', 'assigned_admin_id')),
+             ('conversation_key', ('user1_id', 'user2_id')),
+             ('rating_aggregate', ('user_id',)),
+             ('time_slot', ('user_id',)),
+             ('password_history', ('user_id',)),
+             ('audit_log', ('user_id',)),
+             ('profile', ('user_id',))),
+            (('booking', ('id',)),),
+            (('"user"', ('id',)),),
+        ):
+            for table, columns in level:
+                conditions = [f"{column} IN (SELECT id FROM {_BENCH_IDS.get((table, column), 'bench_user')})"
+                              for column in columns]
+                cursor.execute(f"DELETE FROM {table} WHERE {' OR '.join(conditions)}")
+            connection.commit()
+            _vacuum(connection, [table for table, _ in level])
+        cursor.execute("DROP TABLE bench_user, bench_booking")
+    connection.commit()
+    return bench_users
@@ -0,0 +1,336 @@
+"""
+Email Outbox
+Outgoing mail is written to the email_outbox table and delivered by a worker process.
+
+Requests only insert a row (in their own transaction, so a rolled-back
+registration sends nothing). `flask email-worker` claims due rows in batches
+with FOR UPDATE SKIP LOCKED and leases them by pushing next_attempt_at past
+the time the batch may take, all in one short transaction. Other workers skip
+leased rows. Messages are then sent outside any transaction, over one
+persistent SMTP connection or SES client, and each result is committed on its own.
+
+Failures are retried with exponential backoff. Permanent rejections, and
+messages still failing after EMAIL_MAX_ATTEMPTS, are marked 'dead' and kept
+as a dead letter for review; `flask email-requeue` sends them again.
+Delivery is at-least-once: if a worker dies mid-send, that one message is
+sent again once its lease runs out.
+"""
+
+import datetime
+import logging
+import os
+import random
+import smtplib
+import threading
+from abc import ABC, abstractmethod
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from sqlalchemy import select, update
+
+from blueprint.models import db, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_SECONDS = 30
+DEFAULT_RETRY_MAX_SECONDS = 3600
+DEFAULT_POLL_SECONDS = 5.0
+DEFAULT_LEASE_SECONDS = 600
+# No new send starts this close to the end of a lease: one SMTP send can take several 30 s timeouts
+LEASE_MARGIN_SECONDS = 120
+
+
+class PermanentEmailError(Exception):
+    """The provider rejected the message outright; retrying will not help"""
+
+
+def enqueue_email(to_email, subject, body_text, body_html=None):
+    """Add a message to the outbox. It is sent once the caller's transaction commits."""
+    message = EmailOutbox(to_email=to_email, subject=subject, body_text=body_text, body_html=body_html,
+                          next_attempt_at=datetime.datetime.utcnow())
+    db.session.add(message)
+    return message
+
+
+class EmailTransport(ABC):
+    """Interface shared by all delivery backends"""
+
+    @abstractmethod
+    def send(self, message):
+        """Deliver one EmailOutbox row. Raises PermanentEmailError or any other exception for a retry."""
+
+    def close(self):
+        pass
+
+
+class SMTPTransport(EmailTransport):
+    """One SMTP connection reused across messages and batches, reopened when the server drops it"""
+
+    def __init__(self, host, port=587, username=None, password=None, sender=None, starttls=True,
+                 timeout=30, max_messages_per_connection=100):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.connections_opened = 0
+        self._connection = None
+        self._sent_on_connection = 0
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        connection.ehlo()
+        if self.starttls:
+            connection.starttls()
+            connection.ehlo()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.connections_opened += 1
+        self._sent_on_connection = 0
+        return connection
+
+    def _build(self, message):
+        mime = MIMEMultipart('alternative')
+        mime['From'] = self.sender
+        mime['To'] = message.to_email
+        mime['Subject'] = message.subject
+        mime.attach(MIMEText(message.body_text, 'plain'))
+        if message.body_html:
+            mime.attach(MIMEText(message.body_html, 'html'))
+        return mime.as_string()
+
+    def send(self, message):
+        data = self._build(message)
+        # Servers cap messages per session; start a fresh one before hitting it
+        if self._connection is not None and self._sent_on_connection >= self.max_messages_per_connection:
+            self.close()
+        for attempt in (1, 2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.sendmail(self.sender, [message.to_email], data)
+                self._sent_on_connection += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection closed by the server: reconnect once
+                self._connection = None
+                if attempt == 2:
+                    raise
+            except smtplib.SMTPRecipientsRefused as e:
+                code, reply = next(iter(e.recipients.values()))
+                if code >= 500:
+                    raise PermanentEmailError(f"{code} {reply!r}")
+                raise
+            except smtplib.SMTPResponseException as e:
+                self._reset()
+                if e.smtp_code >= 500:
+                    raise PermanentEmailError(f"{e.smtp_code} {e.smtp_error!r}")
+                raise
+            except (OSError, smtplib.SMTPException):
+                # Connection state unknown: start over on the next message
+                self.close()
+                raise
+
+    def _reset(self):
+        try:
+            self._connection.rset()
+        except smtplib.SMTPException:
+            self.close()
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+            self._connection = None
+
+
+class SESTransport(EmailTransport):
+    """AWS SES through one boto3 client (which pools its HTTPS connections)"""
+
+    PERMANENT_ERRORS = ('MessageRejected', 'MailFromDomainNotVerifiedException', 'ConfigurationSetDoesNotExist')
+
+    def __init__(self, sender, region='us-east-1'):
+        import boto3
+        self.sender = sender
+        self.client = boto3.client('ses', region_name=region)
+
+    def send(self, message):
+        from botocore.exceptions import ClientError
+        body = {'Text': {'Charset': 'UTF-8', 'Data': message.body_text}}
+        if message.body_html:
+            body['Html'] = {'Charset': 'UTF-8', 'Data': message.body_html}
+        try:
+            self.client.send_email(
+                Destination={'ToAddresses': [message.to_email]},
+                Message={'Body': body, 'Subject': {'Charset': 'UTF-8', 'Data': message.subject}},
+                Source=self.sender,
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in self.PERMANENT_ERRORS:
+                raise PermanentEmailError(e.response['Error']['Message'])
+            raise
+
+
+class ConsoleTransport(EmailTransport):
+    """Development stand-in: prints messages instead of sending them"""
+
+    def send(self, message):
+        print(f"\n{'='*60}\n📧 To: {message.to_email}\nSubject: {message.subject}\n\n{message.body_text}\n{'='*60}\n")
+
+
+def build_transport(config):
+    """Create the transport named by EMAIL_TRANSPORT (smtp, ses or console)"""
+    backend = config.get('EMAIL_TRANSPORT', 'console')
+    if backend == 'smtp':
+        return SMTPTransport(
+            config['SMTP_SERVER'], config.get('SMTP_PORT', 587),
+            username=config.get('SMTP_USERNAME'), password=config.get('SMTP_PASSWORD'),
+            sender=config.get('EMAIL_SENDER'), starttls=config.get('SMTP_STARTTLS', True)
+        )
+    if backend == 'ses':
+        return SESTransport(config.get('EMAIL_SENDER'), region=os.getenv('AWS_REGION', 'us-east-1'))
+    if backend == 'console':
+        return ConsoleTransport()
+    raise ValueError(f"Unknown EMAIL_TRANSPORT backend: {backend}")
+
+
+class EmailWorker:
+
+    def __init__(self, transport, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_base_seconds=DEFAULT_RETRY_BASE_SECONDS, retry_max_seconds=DEFAULT_RETRY_MAX_SECONDS,
+                 heartbeat_file=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.transport = transport
+        self.lease_seconds = lease_seconds
+        self.heartbeat_file = heartbeat_file
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+    def backoff(self, attempts):
+        """Seconds before retry number `attempts`: doubling from the base, capped, with +/-20% jitter"""
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def run_once(self):
+        """Send one batch of due messages. Returns counts of sent, retried and dead messages."""
+        lease_until, batch = self._claim()
+
+        counts = {'sent': 0, 'retried': 0, 'dead': 0}
+        for position, message in enumerate(batch):
+            if datetime.datetime.utcnow() + datetime.timedelta(seconds=LEASE_MARGIN_SECONDS) >= lease_until:
+                # Slow batch: hand the rest back rather than send after another worker may have claimed them
+                self._release(batch[position:], lease_until)
+                break
+            self.heartbeat()
+            try:
+                self.transport.send(message)
+            except PermanentEmailError as e:
+                self._dead_letter(message, f"Rejected: {e}")
+                counts['dead'] += 1
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if message.attempts >= self.max_attempts:
+                    self._dead_letter(message, error)
+                    counts['dead'] += 1
+                else:
+                    self._record(message, last_error=error, next_attempt_at=datetime.datetime.utcnow()
+                                 + datetime.timedelta(seconds=self.backoff(message.attempts)))
+                    counts['retried'] += 1
+                    logger.warning(f"Email {message.id} failed (attempt {message.attempts}), will retry: {e}")
+            else:
+                self._record(message, status='sent', sent_at=datetime.datetime.utcnow(), last_error=None)
+                counts['sent'] += 1
+        return counts
+
+    def _claim(self):
+        """
+        Lease up to batch_size due messages in one short transaction and count the attempt.
+        Returns the lease end and the claimed rows (plain rows, so sending needs no transaction).
+        """
+        now = datetime.datetime.utcnow()
+        lease_until = now + datetime.timedelta(seconds=self.lease_seconds)
+        due = select(EmailOutbox.id).where(
+            EmailOutbox.status == 'pending',
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True)
+        batch = db.session.execute(
+            update(EmailOutbox).where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(attempts=EmailOutbox.attempts + 1, next_attempt_at=lease_until)
+            .returning(EmailOutbox.id, EmailOutbox.to_email, EmailOutbox.subject, EmailOutbox.body_text,
+                       EmailOutbox.body_html, EmailOutbox.attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+        return lease_until, sorted(batch, key=lambda message: message.id)
+
+    def _record(self, message, **values):
+        """Store one message's result in its own short transaction"""
+        db.session.execute(
+            update(EmailOutbox).where(EmailOutbox.id == message.id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def _release(self, messages, lease_until):
+        """Make unsent messages due again, undoing the attempt counted when they were claimed"""
+        db.session.execute(
+            update(EmailOutbox).where(
+                EmailOutbox.id.in_([message.id for message in messages]),
+                EmailOutbox.next_attempt_at == lease_until
+            ).values(attempts=EmailOutbox.attempts - 1, next_attempt_at=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def heartbeat(self):
+        """Touch heartbeat_file, if set, so a container healthcheck can tell the loop is alive"""
+        if not self.heartbeat_file:
+            return
+        try:
+            with open(self.heartbeat_file, 'a'):
+                os.utime(self.heartbeat_file)
+        except OSError as e:
+            logger.warning(f"Could not touch email worker heartbeat {self.heartbeat_file}: {e}")
+
+    def _dead_letter(self, message, error):
+        self._record(message, status='dead', last_error=error)
+        logger.error(f"Email {message.id} to {message.to_email} moved to dead letters after "
+                     f"{message.attempts} attempts: {error}")
+
+    def run(self, poll_interval=DEFAULT_POLL_SECONDS, stop_event=None):
+        """Send batches until stop_event is set, sleeping poll_interval when nothing is due"""
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                self.heartbeat()
+                try:
+                    counts = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    self.transport.close()
+                    logger.exception(f"Email worker batch failed: {e}")
+                    stop_event.wait(poll_interval)
+                    continue
+                # A full batch means more may be waiting
+                if sum(counts.values()) < self.batch_size:
+                    stop_event.wait(poll_interval)
+        finally:
+            self.transport.close()
+
+
+def requeue_dead(ids=None):
+    """Send dead-lettered messages again. Returns the number requeued; the caller commits."""
+    statement = update(EmailOutbox).where(EmailOutbox.status == 'dead')
+    if ids:
+        statement = statement.where(EmailOutbox.id.in_(ids))
+    return db.session.execute(
+        statement.values(status='pending', attempts=0, next_attempt_at=datetime.datetime.utcnow())
+    ).rowcount
@@ -0,0 +1,68 @@
+"""
+Health Checks
+Liveness and readiness for load balancers, Docker and orchestrators.
+
+/healthz only shows the process is serving requests and never touches the
+database, so a database outage does not get healthy workers restarted.
+/readyz checks that a pooled connection can be checked out and answer
+SELECT 1, and that the pool is not exhausted. Its result (healthy or not)
+is cached per worker for HEALTH_READY_TTL_SECONDS, so frequent probes cost
+at most one query per worker per TTL.
+"""
+
+import logging
+import time
+
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READY_TTL_SECONDS = 5.0
+
+
+class ReadinessCheck:
+
+    def __init__(self, connector, ttl_seconds=DEFAULT_READY_TTL_SECONDS):
+        self.connector = connector
+        self.cache = TTLCache(ttl_seconds, max_entries=1)
+
+    def status(self):
+        """The cached readiness report, probing again once it has expired"""
+        return self.cache.get_or_set('ready', self._probe)
+
+    def _probe(self):
+        checks = {'pool': self._check_pool()}
+        # An exhausted pool would make the checkout wait pool_timeout; report it instead
+        checks['database'] = self._check_database() if checks['pool']['ok'] else {'ok': False, 'error': 'skipped'}
+        ready = all(check['ok'] for check in checks.values())
+        if not ready:
+            logger.warning(f"Readiness check failed: {checks}")
+        return {'status': 'ready' if ready else 'unavailable', 'checks': checks, 'checked_at': time.time()}
+
+    def _check_pool(self):
+        info = self.connector.get_connection_info()
+        if info.get('status') != 'available':
+            return {'ok': False, 'error': info.get('error', 'unknown')}
+        capacity = self.connector.config.pool_size + self.connector.config.max_overflow
+        return {
+            'ok': info['active_connections'] < capacity,
+            'active_connections': info['active_connections'],
+            'capacity': capacity,
+        }
+
+    def _check_database(self):
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self.connector.get_connection()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+        except Exception as e:
+            logger.warning(f"Readiness database check failed: {e}")
+            # Probes are unauthenticated: report the error type, not its message
+            return {'ok': False, 'error': type(e).__name__}
+        finally:
+            self.connector.return_connection(conn)
+        return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
@@ -0,0 +1,115 @@
+"""
+Login Throttle
+Failed-login counters per IP, per email and per (IP, email), kept out of the user row.
+
+Writing every failure to the user row meant a row lock and WAL traffic per
+guess during credential-stuffing bursts, and guesses against emails with
+no account were not tracked at all. Here each failure is a sliding-window
+counter in a limits storage. 'memory' counts per worker; 'shared' uses the
+rate limit storage (RATELIMIT_STORAGE_URI), so every worker and host sees
+the same counts. Only a lockout is written to the user row.
+
+Progressive delays are stored as keys that expire when the delay ends.
+Emails are hashed before use in keys, so counters hold no addresses.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+
+from flask import current_app
+from limits.storage import MemoryStorage, storage_from_string
+
+DEFAULT_WINDOW_SECONDS = 15 * 60  # Matches the initial lockout duration
+UNLIMITED = 2 ** 31 - 1
+
+
+@dataclass(frozen=True)
+class FailureCounts:
+    """Failed logins within the window"""
+    ip: int = 0      # From this IP, against any email
+    email: int = 0   # Against this email, from any IP
+    pair: int = 0    # From this IP against this email
+
+
+class LoginThrottle:
+
+    def __init__(self, storage, window_seconds=DEFAULT_WINDOW_SECONDS):
+        self.storage = storage
+        self.window_seconds = int(window_seconds)
+
+    @staticmethod
+    def _email_id(email):
+        return hashlib.sha256((email or '').strip().lower().encode()).hexdigest()[:32]
+
+    def _keys(self, ip, email):
+        email_id = self._email_id(email)
+        return {
+            'ip': f"login:ip:{ip}",
+            'email': f"login:email:{email_id}",
+            'pair': f"login:pair:{ip}:{email_id}",
+        }
+
+    def _delay_key(self, scope, value):
+        return f"login:delay:{scope}:{self._email_id(value) if scope == 'email' else value}"
+
+    def _weighted_count(self, key):
+        previous_count, previous_ttl, current_count, _ = self.storage.get_sliding_window(key, self.window_seconds)
+        return int(previous_count * previous_ttl / self.window_seconds + current_count)
+
+    def record_failure(self, ip, email):
+        """Count a failed login and return the counts including it"""
+        counts = {}
+        for scope, key in self._keys(ip, email).items():
+            # A limit that is never reached: this only counts, the caller decides what to block
+            self.storage.acquire_sliding_window_entry(key, UNLIMITED, self.window_seconds)
+            counts[scope] = self._weighted_count(key)
+        return FailureCounts(**counts)
+
+    def counts(self, ip, email):
+        return FailureCounts(**{scope: self._weighted_count(key) for scope, key in self._keys(ip, email).items()})
+
+    def set_delay(self, seconds, ip=None, email=None):
+        """Make the next attempt from ip and/or for email wait `seconds`"""
+        for scope, value in (('ip', ip), ('email', email)):
+            if value and seconds > 0:
+                key = self._delay_key(scope, value)
+                self.storage.clear(key)
+                self.storage.incr(key, int(seconds))
+
+    def delay_remaining(self, ip=None, email=None):
+        """Seconds until the longest active delay on ip or email ends, 0 if none"""
+        remaining = 0
+        for scope, value in (('ip', ip), ('email', email)):
+            if value:
+                key = self._delay_key(scope, value)
+                if self.storage.get(key):
+                    remaining = max(remaining, self.storage.get_expiry(key) - time.time())
+        return int(remaining + 0.999) if remaining > 0 else 0
+
+    def clear(self, ip, email):
+        """After a successful login: forget the account's failures and delay (the IP's stay)"""
+        keys = self._keys(ip, email)
+        for scope in ('email', 'pair'):
+            self.storage.clear_sliding_window(keys[scope], self.window_seconds)
+        self.storage.clear(self._delay_key('email', email))
+
+
+def get_login_throttle():
+    """Return the app's login throttle, created on first use from LOGIN_THROTTLE_* config"""
+    throttle = current_app.extensions.get('login_throttle')
+    if throttle is None:
+        backend = current_app.config.get('LOGIN_THROTTLE_STORE', 'memory')
+        if backend == 'memory':
+            storage = MemoryStorage()
+        elif backend == 'shared':
+            storage = storage_from_string(current_app.config.get('RATELIMIT_STORAGE_URI', 'memory://'),
+                                          **current_app.config.get('RATELIMIT_STORAGE_OPTIONS', {}))
+        else:
+            raise ValueError(f"Unknown LOGIN_THROTTLE_STORE backend: {backend}")
+        throttle = LoginThrottle(
+            storage,
+            window_seconds=current_app.config.get('LOGIN_THROTTLE_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS)
+        )
+        current_app.extensions['login_throttle'] = throttle
+    return throttle
@@ -0,0 +1,239 @@
+"""
+Request Metrics
+Per-endpoint latency histograms, status codes, DB time and pool wait, in Prometheus text format.
+
+Each worker counts requests in memory: a fixed-bucket latency histogram
+plus status code counts, DB time and pool wait per (blueprint, endpoint,
+method). Recording a request is a few additions under a lock.
+
+With METRICS_DIR set (the gunicorn entrypoint does this), each worker
+writes its counters to <METRICS_DIR>/metrics-<pid>.json at most every
+METRICS_FLUSH_SECONDS and at exit. /metrics adds up every file, so it
+shows the whole server whichever worker answers. Files from workers that
+have exited stay in the sum, so counters never go backwards; clear the
+directory when the server starts. Without METRICS_DIR, /metrics shows
+only the worker that answers.
+
+Requests that match no route are counted under endpoint "<unmatched>",
+so scanners cannot create a series per URL.
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import g, request, request_finished, request_started
+
+from utils.query_stats import request_query_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_FLUSH_SECONDS = 5.0
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+def _new_series():
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),  # Per bucket, last is +Inf; cumulated when rendered
+        'count': 0,
+        'seconds': 0.0,
+        'db_seconds': 0.0,
+        'db_queries': 0,
+        'pool_wait_seconds': 0.0,
+        'status': {},
+    }
+
+
+def _merge_series(total, series):
+    total['buckets'] = [a + b for a, b in zip(total['buckets'], series['buckets'])]
+    for name in ('count', 'seconds', 'db_seconds', 'db_queries', 'pool_wait_seconds'):
+        total[name] += series[name]
+    for status, count in series['status'].items():
+        total['status'][status] = total['status'].get(status, 0) + count
+
+
+class RequestMetrics:
+
+    def __init__(self, directory=None, flush_seconds=DEFAULT_FLUSH_SECONDS, gauges=None):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.gauges = gauges  # Callable returning {metric name: value} for this worker, summed across workers
+        self._lock = threading.Lock()
+        self._series = {}  # (blueprint, endpoint, method) -> series
+        self._last_flush = time.monotonic()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+
+    def observe(self, blueprint, endpoint, method, status, seconds, db_seconds=0.0, db_queries=0,
+                pool_wait_seconds=0.0):
+        key = (blueprint, endpoint, method)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _new_series()
+            series['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            series['count'] += 1
+            series['seconds'] += seconds
+            series['db_seconds'] += db_seconds
+            series['db_queries'] += db_queries
+            series['pool_wait_seconds'] += pool_wait_seconds
+            status = str(status)
+            series['status'][status] = series['status'].get(status, 0) + 1
+            due = self.directory and time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        """This worker's counters as JSON-compatible data"""
+        with self._lock:
+            series = [
+                {'labels': list(key), **value, 'buckets': list(value['buckets']), 'status': dict(value['status'])}
+                for key, value in self._series.items()
+            ]
+        gauges = {}
+        if self.gauges:
+            try:
+                gauges = self.gauges()
+            except Exception as e:
+                logger.debug(f"Metrics gauges unavailable: {e}")
+        return {'series': series, 'gauges': gauges}
+
+    def flush(self):
+        """Write this worker's counters for the other workers to read"""
+        if not self.directory:
+            return
+        with self._lock:
+            self._last_flush = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.path)  # Readers never see a half-written file
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def collect(self):
+        """Counters summed over every worker (or just this one without a directory)"""
+        snapshots = [(os.getpid(), self.snapshot())]
+        if self.directory:
+            self.flush()
+            snapshots = []
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                try:
+                    with open(path) as f:
+                        snapshots.append((int(os.path.basename(path)[8:-5]), json.load(f)))
+                except (OSError, ValueError):
+                    continue  # Removed or replaced while reading
+
+        series, gauges = {}, {}
+        for pid, snapshot in snapshots:
+            for item in snapshot['series']:
+                key = tuple(item['labels'])
+                _merge_series(series.setdefault(key, _new_series()), item)
+            # Counters of exited workers still count; their gauges (e.g. connections in use) do not
+            if _is_running(pid):
+                for name, value in snapshot['gauges'].items():
+                    gauges[name] = gauges.get(name, 0) + value
+        return series, gauges
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        series, gauges = self.collect()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family('http_request_duration_seconds', 'histogram', 'Request latency by endpoint')
+        for key in sorted(series):
+            labels = _labels(key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), series[key]['buckets']):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {series[key]['seconds']:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {series[key]['count']}")
+
+        family('http_requests_total', 'counter', 'Requests by endpoint and status code')
+        for key in sorted(series):
+            for status, count in sorted(series[key]['status'].items()):
+                lines.append(f'http_requests_total{{{_labels(key)},status="{status}"}} {count}')
+
+        for name, field, help_text in (
+            ('http_request_db_seconds_total', 'db_seconds', 'Time spent in SQL statements'),
+            ('http_request_db_queries_total', 'db_queries', 'SQL statements run'),
+            ('http_request_pool_wait_seconds_total', 'pool_wait_seconds', 'Time spent waiting for a pooled connection'),
+        ):
+            family(name, 'counter', help_text)
+            for key in sorted(series):
+                value = series[key][field]
+                lines.append(f"{name}{{{_labels(key)}}} {value:.6f}" if isinstance(value, float)
+                             else f"{name}{{{_labels(key)}}} {value}")
+
+        for name in sorted(gauges):
+            family(name, 'counter' if name.endswith('_total') else 'gauge', 'Summed over workers')
+            lines.append(f"{name} {gauges[name]}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key):
+    blueprint, endpoint, method = key
+    return f'blueprint="{_escape(blueprint)}",endpoint="{_escape(endpoint)}",method="{_escape(method)}"'
+
+
+def init_request_metrics(app, gauges=None):
+    """Record every request of app; returns the RequestMetrics to render at /metrics"""
+    metrics = RequestMetrics(app.config.get('METRICS_DIR') or None,
+                             flush_seconds=app.config.get('METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS),
+                             gauges=gauges)
+
+    def started(sender, **extra):
+        g.metrics_started_at = time.perf_counter()
+
+    def finished(sender, response, **extra):
+        started_at = g.pop('metrics_started_at', None)
+        if started_at is None:
+            return
+        stats = request_query_stats()
+        metrics.observe(
+            request.blueprint or 'app',
+            request.endpoint or UNMATCHED_ENDPOINT,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started_at,
+            db_seconds=stats.seconds,
+            db_queries=stats.count,
+            pool_wait_seconds=stats.pool_wait_seconds,
+        )
+
+    # Signals fire around the whole request, including before/after_request hooks and error handlers
+    request_started.connect(started, app, weak=False)
+    request_finished.connect(finished, app, weak=False)
+    app.extensions['request_metrics'] = metrics
+    return metrics
@@ -10,9 +10,11 @@ import datetime
 import logging
 from typing import Tuple, Optional
 from functools import wraps
-from flask import request, session, flash
+from flask import request, session, flash, redirect, url_for
+from sqlalchemy.orm import load_only
 from blueprint.models import db, User
 from blueprint.audit_log import log_event
+from utils.login_throttle import get_login_throttle, FailureCounts
 
 # Configure security logging
 security_logger = logging.getLogger('owasp_security')
@@ -28,6 +30,23 @@ class OWASPAuthSecurity:
     PROGRESSIVE_DELAY_BASE = 1  # Base delay in seconds
     MAX_PROGRESSIVE_DELAY = 30  # Maximum progressive delay
     SUSPICIOUS_ACTIVITY_THRESHOLD = 3  # Flags before extended monitoring
+    SPRAY_THRESHOLD = 10  # Failures from one IP against other accounts within the window
+    LOCKOUT_HISTORY_DECAY_DAYS = 30  # One previous lockout is forgiven per this many days without a new one
+    
+    # Columns the login flow reads or updates; the rest of the row is not loaded
+    LOGIN_COLUMNS = (
+        User.id, User.email, User.role, User.password_hash, User.active, User.deleted,
+        User.email_verified, User.password_expires_at, User.password_change_required,
+        User.failed_login_attempts, User.account_locked_until, User.lockout_reason,
+        User.last_successful_login, User.last_failed_attempt, User.suspicious_activity_flags,
+    )
+    
+    @staticmethod
+    def load_login_user(email: str) -> Optional[User]:
+        """Load the user for a login attempt with only LOGIN_COLUMNS"""
+        return User.query.options(
+            load_only(*OWASPAuthSecurity.LOGIN_COLUMNS)
+        ).filter_by(email=email).first()
     
     @staticmethod
     def calculate_progressive_delay(failed_attempts: int) -> int:
@@ -57,96 +76,107 @@ class OWASPAuthSecurity:
         return min(int(duration), OWASPAuthSecurity.MAX_LOCKOUT_MINUTES)
     
     @staticmethod
-    def is_progressive_delay_active(user: User) -> Tuple[bool, int]:
+    def previous_lockouts(user: User, now: datetime.datetime) -> int:
+        """
+        Lockouts counted against the user, from suspicious_activity_flags.
+        They decay with time since the last lockout (last_failed_attempt),
+        not with successful logins, so a repeat offender stays escalated.
+        """
+        flags = user.suspicious_activity_flags or 0
+        if flags and user.last_failed_attempt:
+            forgiven = (now - user.last_failed_attempt).days // OWASPAuthSecurity.LOCKOUT_HISTORY_DECAY_DAYS
+            flags = max(0, flags - forgiven)
+        return flags
+    
+    @staticmethod
+    def is_progressive_delay_active(email: str, ip_address: str = None) -> Tuple[bool, int]:
         """
-        Check if user is in progressive delay period
+        Check if the email or IP is in a progressive delay period
         Returns: (is_delayed, seconds_remaining)
         """
-        if not user.progressive_delay_until:
-            return False, 0
-        
-        now = datetime.datetime.utcnow()
-        if now >= user.progressive_delay_until:
-            # Delay expired, clear it
-            user.progressive_delay_until = None
-            db.session.commit()
-            return False, 0
-        
-        # Calculate remaining delay
-        remaining = (user.progressive_delay_until - now).total_seconds()
-        return True, int(remaining)
+        remaining = get_login_throttle().delay_remaining(ip=ip_address, email=email)
+        return remaining > 0, remaining
     
     @staticmethod
-    def apply_progressive_delay(user: User) -> None:
-        """Apply progressive delay based on failed attempts"""
-        delay_seconds = OWASPAuthSecurity.calculate_progressive_delay(user.failed_login_attempts)
+    def apply_progressive_delay(email: str, failed_attempts: int) -> int:
+        """Apply progressive delay to the email based on failed attempts. Returns the delay."""
+        delay_seconds = OWASPAuthSecurity.calculate_progressive_delay(failed_attempts)
         
         if delay_seconds > 0:
-            user.progressive_delay_until = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay_seconds)
-            user.last_failed_attempt = datetime.datetime.utcnow()
+            get_login_throttle().set_delay(delay_seconds, email=email)
             
             # Log security event
             security_logger.warning(
-                f"Progressive delay applied: {delay_seconds}s for user {user.email} "
-                f"after {user.failed_login_attempts} failed attempts"
+                f"Progressive delay applied: {delay_seconds}s for {email} "
+                f"after {failed_attempts} failed attempts"
             )
+        return delay_seconds
     
     @staticmethod
-    def handle_failed_login(user: User, ip_address: str = None, user_agent: str = None) -> Tuple[bool, str, int]:
+    def handle_failed_login(user: Optional[User], ip_address: str = None, user_agent: str = None,
+                            email: str = None) -> Tuple[bool, str, int]:
         """
-        Handle failed login attempt with OWASP-compliant security measures
+        Handle failed login attempt with OWASP-compliant security measures.
+        Attempts are counted in the login throttle per IP, email and (IP, email),
+        also for emails without an account; only a lockout is written to the
+        user row, left for the caller's commit with its audit record.
         Returns: (is_locked, message, delay_seconds)
         """
-        # Increment failed attempts
-        user.failed_login_attempts += 1
-        user.last_failed_attempt = datetime.datetime.utcnow()
+        email = email or user.email
+        counts = get_login_throttle().record_failure(ip_address, email)
+        failed_attempts = counts.email
         
-        # Check for suspicious patterns
-        user.suspicious_activity_flags += 1
+        # IP-level delay for credential stuffing across accounts
+        if detect_suspicious_patterns(email, ip_address, user_agent, counts):
+            get_login_throttle().set_delay(OWASPAuthSecurity.MAX_PROGRESSIVE_DELAY, ip=ip_address)
         
         # Apply progressive delay
-        OWASPAuthSecurity.apply_progressive_delay(user)
+        OWASPAuthSecurity.apply_progressive_delay(email, failed_attempts)
+        
+        if user is None:
+            security_logger.warning(f"Failed login attempt {failed_attempts} for unknown email {email} from IP: {ip_address}")
+            return False, "Invalid credentials.", 0
         
         # Check if account should be locked
-        if user.failed_login_attempts >= OWASPAuthSecurity.MAX_FAILED_ATTEMPTS:
-            # Calculate lockout duration
-            lockout_minutes = OWASPAuthSecurity.calculate_lockout_duration(
-                user.failed_login_attempts,
-                user.suspicious_activity_flags
-            )
+        if failed_attempts >= OWASPAuthSecurity.MAX_FAILED_ATTEMPTS:
+            # Longer for repeat offenders: suspicious_activity_flags counts previous lockouts
+            now = datetime.datetime.utcnow()
+            previous_lockouts = OWASPAuthSecurity.previous_lockouts(user, now)
+            lockout_minutes = OWASPAuthSecurity.calculate_lockout_duration(failed_attempts, previous_lockouts)
             
             # Lock the account
-            user.account_locked_until = datetime.datetime.utcnow() + datetime.timedelta(minutes=lockout_minutes)
+            user.account_locked_until = now + datetime.timedelta(minutes=lockout_minutes)
             user.lockout_reason = "Too many failed login attempts (OWASP Protection)"
+            user.failed_login_attempts = failed_attempts
+            user.last_failed_attempt = now
+            user.suspicious_activity_flags = previous_lockouts + 1
             
             # Log security event
             security_logger.critical(
                 f"Account locked: {user.email} for {lockout_minutes} minutes "
-                f"after {user.failed_login_attempts} failed attempts from IP: {ip_address}"
+                f"after {failed_attempts} failed attempts from IP: {ip_address}"
             )
             
             # Audit log for admin monitoring
             log_event(
                 user_id=user.id,
                 action="account_locked_brute_force",
-                details=f"Account locked for {lockout_minutes} minutes due to {user.failed_login_attempts} failed login attempts. IP: {ip_address}"
+                details=f"Account locked for {lockout_minutes} minutes due to {failed_attempts} failed login attempts. IP: {ip_address}",
+                in_transaction=True
             )
             
-            db.session.commit()
             return True, f"Account locked for {lockout_minutes} minutes due to too many failed attempts.", 0
         
         # Calculate progressive delay for next attempt
-        delay_seconds = OWASPAuthSecurity.calculate_progressive_delay(user.failed_login_attempts + 1)
-        attempts_remaining = OWASPAuthSecurity.MAX_FAILED_ATTEMPTS - user.failed_login_attempts
+        delay_seconds = OWASPAuthSecurity.calculate_progressive_delay(failed_attempts + 1)
+        attempts_remaining = OWASPAuthSecurity.MAX_FAILED_ATTEMPTS - failed_attempts
         
         # Log failed attempt
         security_logger.warning(
-            f"Failed login attempt {user.failed_login_attempts}/{OWASPAuthSecurity.MAX_FAILED_ATTEMPTS} "
+            f"Failed login attempt {failed_attempts}/{OWASPAuthSecurity.MAX_FAILED_ATTEMPTS} "
             f"for {user.email} from IP: {ip_address}"
         )
         
-        db.session.commit()
-        
         message = (
             f"Invalid credentials. {attempts_remaining} attempts remaining before account lockout. "
             f"Next attempt available in {delay_seconds} seconds."
@@ -156,26 +186,29 @@ class OWASPAuthSecurity:
     
     @staticmethod
     def handle_successful_login(user: User, ip_address: str = None) -> None:
-        """Handle successful login - reset security counters"""
-        user.failed_login_attempts = 0
-        user.account_locked_until = None
-        user.progressive_delay_until = None
-        user.lockout_reason = None
+        """Handle successful login - reset security counters (the caller commits)"""
+        get_login_throttle().clear(ip_address, user.email)
+        
+        # Only touch the lockout columns if a lockout was recorded
+        if user.failed_login_attempts or user.account_locked_until or user.lockout_reason:
+            user.failed_login_attempts = 0
+            user.account_locked_until = None
+            user.lockout_reason = None
         user.last_successful_login = datetime.datetime.utcnow()
         
-        # Reduce suspicious activity flags on successful login
-        if user.suspicious_activity_flags > 0:
-            user.suspicious_activity_flags = max(0, user.suspicious_activity_flags - 1)
+        # suspicious_activity_flags (previous lockouts) is kept: it decays with time, see previous_lockouts
+        
+        # Upgrade an outdated password hash in the same commit
+        user.apply_pending_rehash()
         
         # Log successful login
         security_logger.info(f"Successful login for {user.email} from IP: {ip_address}")
-        
-        db.session.commit()
     
     @staticmethod
     def check_account_status(user: User) -> Tuple[bool, str]:
         """
-        Check if account can attempt login
+        Check if account can attempt login.
+        Progressive delays are enforced before this by progressive_delay_required.
         Returns: (can_login, status_message)
         """
         # Check if account is locked
@@ -184,11 +217,6 @@ class OWASPAuthSecurity:
             remaining_minutes = int(remaining_time.total_seconds() / 60)
             return False, f"Account is locked. Try again in {remaining_minutes} minutes."
         
-        # Check progressive delay
-        is_delayed, delay_seconds = OWASPAuthSecurity.is_progressive_delay_active(user)
-        if is_delayed:
-            return False, f"Too many rapid attempts. Please wait {delay_seconds} seconds before trying again."
-        
         # Check if account is active
         if not user.active:
             return False, "Account is disabled. Please contact support."
@@ -202,46 +230,66 @@ class OWASPAuthSecurity:
 def progressive_delay_required(f):
     """
     Decorator to enforce progressive delays on authentication endpoints
-    OWASP-compliant rate limiting at the user level
+    OWASP-compliant rate limiting per email and per IP, from the login throttle
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Get email from form data
-        email = request.form.get('email', '').strip().lower()
+        email = request.form.get('email', '').strip()
         
-        if email:
-            user = User.query.filter_by(email=email).first()
-            if user:
-                # Check if user has active progressive delay
-                is_delayed, delay_seconds = OWASPAuthSecurity.is_progressive_delay_active(user)
+        if email and request.form.get('form_type') == 'login':
+            # Check for an active progressive delay on the email or the client IP
+            is_delayed, delay_seconds = OWASPAuthSecurity.is_progressive_delay_active(email, request.remote_addr)
+            
+            if is_delayed:
+                flash(
+                    f"Too many rapid login attempts. Please wait {delay_seconds} seconds before trying again.",
+                    "warning"
+                )
                 
-                if is_delayed:
-                    flash(
-                        f"Too many rapid login attempts. Please wait {delay_seconds} seconds before trying again.",
-                        "warning"
-                    )
-                    
-                    # Log the attempt during delay period
-                    security_logger.warning(
-                        f"Login attempt during progressive delay period: {email} "
-                        f"({delay_seconds}s remaining) from IP: {request.remote_addr}"
-                    )
-                    
-                    return f(*args, **kwargs)  # Return to form with error message
+                # Log the attempt during delay period
+                security_logger.warning(
+                    f"Login attempt during progressive delay period: {email} "
+                    f"({delay_seconds}s remaining) from IP: {request.remote_addr}"
+                )
+                
+                return redirect(url_for('auth.auth', mode='login'))  # Return to form with error message
         
         return f(*args, **kwargs)
     
     return decorated_function
 
 # Security monitoring functions
-def detect_suspicious_patterns(user: User, ip_address: str, user_agent: str) -> bool:
-    """Detect suspicious login patterns (for future enhancement)"""
-    # This could be expanded to detect:
-    # - Multiple IPs for same user
-    # - Unusual geographic locations
-    # - Automated tools/bots
-    # - Time-based patterns
-    return False
+AUTOMATED_USER_AGENTS = ('curl', 'wget', 'python-requests', 'python-urllib', 'go-http-client',
+                         'okhttp', 'libwww', 'httpclient', 'scrapy', 'hydra', 'sqlmap')
+
+def detect_suspicious_patterns(email: str, ip_address: str, user_agent: str,
+                               counts: Optional[FailureCounts] = None) -> bool:
+    """
+    Detect suspicious login patterns from the login throttle counters:
+    - Credential stuffing: one IP failing against many other accounts
+    - Distributed guessing: one account failing from many other IPs
+    - Automated tools: missing or scripted user agents, once attempts repeat
+    """
+    if counts is None:
+        counts = get_login_throttle().counts(ip_address, email)
+    
+    reasons = []
+    if counts.ip - counts.pair >= OWASPAuthSecurity.SPRAY_THRESHOLD:
+        reasons.append(f"{counts.ip - counts.pair} failures against other accounts from this IP")
+    if counts.email - counts.pair >= OWASPAuthSecurity.MAX_FAILED_ATTEMPTS:
+        reasons.append(f"{counts.email - counts.pair} failures against this account from other IPs")
+    agent = (user_agent or '').lower()
+    if counts.pair >= OWASPAuthSecurity.SUSPICIOUS_ACTIVITY_THRESHOLD and (
+        agent in ('', 'unknown') or any(tool in agent for tool in AUTOMATED_USER_AGENTS)
+    ):
+        reasons.append(f"automated client '{user_agent}'")
+    
+    if reasons:
+        security_logger.warning(
+            f"Suspicious login pattern for {email} from IP: {ip_address}: {'; '.join(reasons)}"
+        )
+    return bool(reasons)
 
 def log_security_metrics():
     """Log security metrics for monitoring (for future enhancement)"""
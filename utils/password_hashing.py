@@ -0,0 +1,236 @@
+"""
+Password Hashing Service
+All Argon2 hashing and verification goes through one bounded worker pool per process.
+
+Each Argon2 operation uses 64 MB and ~3 passes of CPU. Run inline in request
+threads, a burst of logins multiplies that per concurrent request. Here at
+most PASSWORD_HASH_WORKERS operations run at once per process, so memory
+stays at workers x 64 MB. At most PASSWORD_HASH_MAX_PENDING callers may be
+queued or running. Beyond that, callers wait up to
+PASSWORD_HASH_QUEUE_TIMEOUT seconds for a slot and then get
+PasswordHashingBusy instead of piling up.
+
+argon2-cffi releases the GIL while hashing, so a thread pool is sufficient.
+stats() reports queue-wait and run times for monitoring, plus rehash
+counters: on login, hashes made with old parameters or by Werkzeug PBKDF2
+are re-hashed with HASHER. A login waits at most rehash_wait_seconds for
+that; a slower rehash is dropped and tried again on the next login.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, HashingError, InvalidHashError
+from werkzeug.security import check_password_hash as werkzeug_check_password_hash
+
+security_logger = logging.getLogger('security')
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 32
+DEFAULT_QUEUE_TIMEOUT = 10.0
+DEFAULT_REHASH_WAIT_SECONDS = 0.5
+
+# Current Argon2 parameters. Hashes made with other parameters still verify.
+HASHER = PasswordHasher(
+    memory_cost=65536,      # 64 MB memory usage
+    time_cost=3,            # 3 iterations
+    parallelism=2,          # 2 lanes
+    hash_len=32,            # 32-byte hash output
+    salt_len=16,            # 16-byte salt
+)
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout"""
+
+
+class PasswordHashingService:
+
+    def __init__(self, hasher=HASHER, max_workers=DEFAULT_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING, queue_timeout=DEFAULT_QUEUE_TIMEOUT,
+                 rehash_wait_seconds=DEFAULT_REHASH_WAIT_SECONDS):
+        self.hasher = hasher
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.rehash_wait_seconds = rehash_wait_seconds
+        # Each Argon2 run already uses `parallelism` cores, so only overlap
+        # multi-hash checks as far as the machine has cores to spare
+        self.check_window = max(1, min(max_workers, (os.cpu_count() or 1) // hasher.parallelism))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'completed': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'queue_seconds_total': 0.0,
+            'queue_seconds_max': 0.0,
+            'run_seconds_total': 0.0,
+            'run_seconds_max': 0.0,
+            'rehash_started': 0,
+            'rehash_applied': 0,
+            'rehash_skipped_busy': 0,
+            'rehash_skipped_slow': 0,
+        }
+
+    def hash(self, password):
+        try:
+            return self._run(self.hasher.hash, password)
+        except HashingError as e:
+            raise ValueError(f"Password hashing failed: {e}")
+
+    def verify(self, password_hash, password):
+        """Check a password against an Argon2 or legacy Werkzeug PBKDF2 hash"""
+        if not password_hash:
+            return False
+        return self._run(_verify, self.hasher, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True for legacy (non-Argon2) hashes and Argon2 hashes made with other parameters"""
+        if not password_hash or not password_hash.startswith('$argon2'):
+            return True
+        try:
+            return self.hasher.check_needs_rehash(password_hash)
+        except Exception:
+            return True
+
+    def hash_async(self, password):
+        """
+        Start hashing on the pool without waiting and return the Future.
+        Rehashing is opportunistic, so returns None instead of queueing when no slot is free.
+        """
+        if not self._slots.acquire(blocking=False):
+            self.count('rehash_skipped_busy')
+            return None
+        with self._stats_lock:
+            self._stats['in_flight'] += 1
+        future = self._executor.submit(self._timed, self.hasher.hash, time.monotonic(), password)
+        future.add_done_callback(lambda _: self._release_slot())
+        return future
+
+    def current_hash_prefix(self):
+        """Prefix shared by every hash made with the current parameters, for migration reporting"""
+        return (f"$argon2{self.hasher.type.name.lower()}$v=19$m={self.hasher.memory_cost},"
+                f"t={self.hasher.time_cost},p={self.hasher.parallelism}$")
+
+    def count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def verify_any(self, password_hashes, password):
+        """
+        True if password matches any of the hashes, e.g. the current password plus history.
+        Hashes are checked in order, up to check_window at a time on the pool, and no
+        further checks start after the first match. The batch takes one pending slot.
+        """
+        remaining = iter([h for h in password_hashes if h])
+        submitted_at = time.monotonic()
+        self._acquire_slot()
+        in_flight = set()
+        try:
+            while True:
+                for password_hash in remaining:
+                    in_flight.add(self._executor.submit(
+                        self._timed, _verify, submitted_at, self.hasher, password_hash, password
+                    ))
+                    if len(in_flight) >= self.check_window:
+                        break
+                if not in_flight:
+                    return False
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                if any(future.result() for future in done):
+                    return True
+        finally:
+            for future in in_flight:
+                future.cancel()
+            self._release_slot()
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        completed = snapshot['completed'] or 1
+        snapshot['queue_seconds_avg'] = snapshot['queue_seconds_total'] / completed
+        snapshot['run_seconds_avg'] = snapshot['run_seconds_total'] / completed
+        return snapshot
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, fn, *args):
+        submitted_at = time.monotonic()
+        self._acquire_slot()
+        try:
+            return self._executor.submit(self._timed, fn, submitted_at, *args).result()
+        finally:
+            self._release_slot()
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            security_logger.warning("Password hashing queue full; request rejected")
+            raise PasswordHashingBusy("Password hashing is busy, please try again shortly.")
+        with self._stats_lock:
+            self._stats['in_flight'] += 1
+
+    def _release_slot(self):
+        with self._stats_lock:
+            self._stats['in_flight'] -= 1
+        self._slots.release()
+
+    def _timed(self, fn, submitted_at, *args):
+        started_at = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.monotonic()
+            queued, ran = started_at - submitted_at, finished_at - started_at
+            with self._stats_lock:
+                self._stats['completed'] += 1
+                self._stats['queue_seconds_total'] += queued
+                self._stats['queue_seconds_max'] = max(self._stats['queue_seconds_max'], queued)
+                self._stats['run_seconds_total'] += ran
+                self._stats['run_seconds_max'] = max(self._stats['run_seconds_max'], ran)
+
+
+def _verify(hasher, password_hash, password):
+    if password_hash.startswith('$argon2'):
+        try:
+            return hasher.verify(password_hash, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False
+        except Exception:
+            # Fail closed - any other error means verification failed
+            return False
+    # Legacy PBKDF2 hashes from Werkzeug
+    try:
+        return werkzeug_check_password_hash(password_hash, password)
+    except Exception:
+        return False
+
+
+_service = None
+_service_pid = None
+_service_lock = threading.Lock()
+
+
+def get_password_service():
+    """Return this process's hashing service, configured from PASSWORD_HASH_* environment variables"""
+    global _service, _service_pid
+    if _service is None or _service_pid != os.getpid():
+        with _service_lock:
+            # Recreated after fork: the parent's pool threads do not exist in the child
+            if _service is None or _service_pid != os.getpid():
+                _service = PasswordHashingService(
+                    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)),
+                    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', DEFAULT_MAX_PENDING)),
+                    queue_timeout=float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT)),
+                    rehash_wait_seconds=float(os.getenv('PASSWORD_REHASH_WAIT_SECONDS', DEFAULT_REHASH_WAIT_SECONDS)),
+                )
+                _service_pid = os.getpid()
+    return _service
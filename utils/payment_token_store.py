@@ -0,0 +1,241 @@
+"""
+Payment Token Store
+Single-use, short-lived tokens that authorise one payment for one booking.
+
+Production runs several gunicorn workers, so tokens must live somewhere every
+worker can see: DatabasePaymentTokenStore keeps them in the payment_token table.
+InMemoryPaymentTokenStore is a per-process stand-in for tests and local runs.
+
+Both stores validate and consume a token in one atomic step, so a token can
+never be redeemed twice, and both evict expired tokens instead of growing forever.
+Used tokens are kept until they expire, so a re-submitted payment form can
+still be matched to the booking its token was for.
+"""
+
+import datetime
+import logging
+import secrets
+from abc import ABC, abstractmethod
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from blueprint.models import db, PaymentToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300
+PURGE_INTERVAL_SECONDS = 60  # Minimum gap between purges of expired tokens per worker
+
+
+class PaymentTokenStore(ABC):
+    """Interface shared by all payment token stores"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def new_token():
+        return secrets.token_urlsafe(32)
+
+    @abstractmethod
+    def issue(self, user_id, booking_id):
+        """Create a token for user_id to pay booking_id. Returns the token string."""
+
+    @abstractmethod
+    def get(self, token, user_id):
+        """Return the booking_id of a valid, unused token owned by user_id, else None"""
+
+    @abstractmethod
+    def consume(self, token, user_id, commit=True):
+        """
+        Atomically validate and mark a token used.
+        Returns the booking_id if this call consumed the token, else None.
+        """
+
+    @abstractmethod
+    def booking_of(self, token, user_id):
+        """Return the booking_id of an unexpired token owned by user_id, used or not, else None"""
+
+    @abstractmethod
+    def revoke(self, token):
+        """Mark a token used regardless of owner, e.g. when its booking changes"""
+
+    @abstractmethod
+    def purge_expired(self):
+        """Remove expired tokens. Returns the number removed."""
+
+
+class InMemoryPaymentTokenStore(PaymentTokenStore):
+    """Per-process store with TTL eviction - for tests and single-worker development"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        super().__init__(ttl_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = {}  # token -> (user_id, booking_id, expires_at, used)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def issue(self, user_id, booking_id):
+        token = self.new_token()
+        with self._lock:
+            self._evict_expired()
+            self._tokens[token] = (user_id, booking_id, self._clock() + self.ttl_seconds, False)
+        return token
+
+    def _entry(self, token, user_id):
+        """The unexpired entry for token if user_id owns it; call with the lock held"""
+        entry = self._tokens.get(token)
+        if not entry or entry[0] != user_id:
+            return None
+        if self._clock() >= entry[2]:
+            del self._tokens[token]
+            return None
+        return entry
+
+    def get(self, token, user_id):
+        with self._lock:
+            entry = self._entry(token, user_id)
+            return entry[1] if entry and not entry[3] else None
+
+    def consume(self, token, user_id, commit=True):
+        with self._lock:
+            entry = self._entry(token, user_id)
+            if not entry or entry[3]:
+                return None
+            self._tokens[token] = entry[:3] + (True,)
+            return entry[1]
+
+    def booking_of(self, token, user_id):
+        with self._lock:
+            entry = self._entry(token, user_id)
+            return entry[1] if entry else None
+
+    def revoke(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry:
+                self._tokens[token] = entry[:3] + (True,)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._evict_expired()
+
+    def _evict_expired(self):
+        now = self._clock()
+        expired = [token for token, entry in self._tokens.items() if now >= entry[2]]
+        for token in expired:
+            del self._tokens[token]
+        return len(expired)
+
+
+class DatabasePaymentTokenStore(PaymentTokenStore):
+    """Store backed by the payment_token table, shared across workers and hosts"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, purge_interval=PURGE_INTERVAL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def issue(self, user_id, booking_id):
+        self._maybe_purge()
+        token = self.new_token()
+        now = datetime.datetime.utcnow()
+        db.session.add(PaymentToken(
+            token=token,
+            user_id=user_id,
+            booking_id=booking_id,
+            expires_at=now + datetime.timedelta(seconds=self.ttl_seconds),
+            created_at=now
+        ))
+        db.session.commit()
+        return token
+
+    def get(self, token, user_id):
+        if not token:
+            return None
+        return db.session.execute(
+            select(PaymentToken.booking_id).where(
+                PaymentToken.token == token,
+                PaymentToken.user_id == user_id,
+                PaymentToken.used.is_(False),
+                PaymentToken.expires_at > datetime.datetime.utcnow()
+            )
+        ).scalar()
+
+    def consume(self, token, user_id, commit=True):
+        if not token:
+            return None
+        # A single conditional UPDATE: concurrent requests race on the row lock
+        # and only the first one sees used = false.
+        booking_id = db.session.execute(
+            update(PaymentToken).where(
+                PaymentToken.token == token,
+                PaymentToken.user_id == user_id,
+                PaymentToken.used.is_(False),
+                PaymentToken.expires_at > datetime.datetime.utcnow()
+            ).values(used=True).returning(PaymentToken.booking_id)
+        ).scalar()
+        if commit:
+            db.session.commit()
+        return booking_id
+
+    def booking_of(self, token, user_id):
+        if not token:
+            return None
+        return db.session.execute(
+            select(PaymentToken.booking_id).where(
+                PaymentToken.token == token,
+                PaymentToken.user_id == user_id,
+                PaymentToken.expires_at > datetime.datetime.utcnow()
+            )
+        ).scalar()
+
+    def revoke(self, token):
+        db.session.execute(
+            update(PaymentToken).where(PaymentToken.token == token).values(used=True)
+        )
+        db.session.commit()
+
+    def purge_expired(self):
+        result = db.session.execute(
+            delete(PaymentToken).where(PaymentToken.expires_at <= datetime.datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            removed = self.purge_expired()
+            if removed:
+                logger.info(f"Purged {removed} expired payment tokens.")
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Payment token purge failed: {e}")
+
+
+STORES = {
+    'database': DatabasePaymentTokenStore,
+    'memory': InMemoryPaymentTokenStore,
+}
+
+
+def get_payment_token_store():
+    """Return the app's payment token store, created on first use from PAYMENT_TOKEN_STORE config"""
+    store = current_app.extensions.get('payment_token_store')
+    if store is None:
+        backend = current_app.config.get('PAYMENT_TOKEN_STORE', 'database')
+        ttl_seconds = current_app.config.get('PAYMENT_TOKEN_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+        if backend not in STORES:
+            raise ValueError(f"Unknown PAYMENT_TOKEN_STORE backend: {backend}")
+        store = STORES[backend](ttl_seconds=ttl_seconds)
+        current_app.extensions['payment_token_store'] = store
+    return store
@@ -0,0 +1,230 @@
+"""
+Request Profiling
+Opt-in sampling profiler for live requests, writing collapsed stacks per endpoint.
+
+A request is profiled if either of these holds:
+  - a random draw falls under PROFILING_SAMPLE_RATE
+  - its X-Profile header equals PROFILING_HEADER_TOKEN, a secret the
+    admins set, so they can profile a chosen request in production
+With neither set, profiling is off and requests pay nothing.
+
+While a request is profiled, a background thread in the worker reads the
+request thread's Python stack every PROFILING_INTERVAL_MS using
+sys._current_frames(). The profiled thread is never traced or
+instrumented, so the overhead is the sampler's own work, about one stack
+walk per interval. This is a statistical profiler: functions show up in
+proportion to the time spent in them, including time spent waiting on
+the database.
+
+Each profiled request is written to
+<PROFILING_DIR>/<endpoint>/<time>-<pid>-<id>.folded in collapsed-stack
+format: one "frame;frame;frame count" line per distinct stack, root
+first. Each endpoint keeps only its newest PROFILING_MAX_FILES files,
+so the directory stays bounded.
+
+`flask profile-merge` sums files into a single collapsed-stack file.
+flamegraph.pl, speedscope or inferno can render that file.
+"""
+
+import datetime
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, has_app_context, request, request_finished, request_started
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_MAX_FILES = 50
+PROFILE_HEADER = 'X-Profile'
+UNMATCHED_ENDPOINT = '_unmatched'
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+_PATH_PREFIXES = ('site-packages' + os.sep, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep)
+
+
+def frame_label(code):
+    """function (file:line) with the file relative to the app or site-packages"""
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        index = filename.rfind(prefix)
+        if index != -1:
+            filename = filename[index + len(prefix):]
+            break
+    # ';' separates frames in collapsed stacks
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+
+def collapse(frame):
+    """The stack ending at frame as 'root;...;leaf'"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def merge_collapsed(paths):
+    """Sum the samples of collapsed-stack files"""
+    total = Counter()
+    for path in paths:
+        try:
+            total.update(read_collapsed(path))
+        except OSError as e:
+            logger.warning(f"Skipping profile {path}: {e}")
+    return total
+
+
+def write_collapsed(stacks, out):
+    for stack, count in sorted(stacks.items()):
+        out.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+
+    def __init__(self, directory, sample_rate=0.0, header_token='', interval_ms=DEFAULT_INTERVAL_MS,
+                 max_files=DEFAULT_MAX_FILES):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.header_token = header_token
+        self.interval_seconds = interval_ms / 1000
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._active = {}  # Thread ident -> Counter of collapsed stacks
+        self._wake = threading.Event()
+        self._pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.header_token)
+
+    def wanted(self, headers):
+        """Whether to profile a request with these headers"""
+        if self.header_token:
+            supplied = headers.get(PROFILE_HEADER, '')
+            if supplied and hmac.compare_digest(supplied.encode(), self.header_token.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """Sample the calling thread until stop()"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use in this process (gunicorn forks workers after import)
+                self._pid = os.getpid()
+                self._active = {}
+                threading.Thread(target=self._sample_forever, name='request-profiler', daemon=True).start()
+            self._active[threading.get_ident()] = Counter()
+        self._wake.set()
+
+    def stop(self):
+        """The calling thread's samples since start()"""
+        with self._lock:
+            return self._active.pop(threading.get_ident(), Counter())
+
+    def _sample_forever(self):
+        own_ident = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval_seconds)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own_ident:
+                        stacks[collapse(frame)] += 1
+
+    def save(self, endpoint, stacks):
+        """Write one request's stacks to the endpoint's ring; returns the path"""
+        if not stacks:
+            return None
+        endpoint_dir = os.path.join(self.directory, _UNSAFE_NAME.sub('_', endpoint))
+        os.makedirs(endpoint_dir, exist_ok=True)
+        # Names sort oldest first, which the ring relies on
+        name = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S.%f}-{os.getpid()}-{uuid.uuid4().hex[:8]}.folded"
+        path = os.path.join(endpoint_dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            write_collapsed(stacks, f)
+        os.replace(tmp_path, path)
+        self._trim(endpoint_dir)
+        return path
+
+    def _trim(self, endpoint_dir):
+        profiles = sorted(name for name in os.listdir(endpoint_dir) if name.endswith('.folded'))
+        for name in profiles[:-self.max_files]:
+            try:
+                os.remove(os.path.join(endpoint_dir, name))
+            except FileNotFoundError:
+                pass  # Another worker trimmed it first
+
+    def profiles(self, endpoint=None):
+        """Paths of stored profiles, for one endpoint or all"""
+        paths = []
+        for root, _, names in os.walk(self.directory):
+            if endpoint and os.path.basename(root) != _UNSAFE_NAME.sub('_', endpoint):
+                continue
+            paths.extend(os.path.join(root, name) for name in names if name.endswith('.folded'))
+        return sorted(paths)
+
+
+def init_request_profiler(app):
+    """Profile sampled requests of app; returns None when profiling is off"""
+    profiler = RequestProfiler(
+        app.config['PROFILING_DIR'],
+        sample_rate=app.config.get('PROFILING_SAMPLE_RATE', 0.0),
+        header_token=app.config.get('PROFILING_HEADER_TOKEN', ''),
+        interval_ms=app.config.get('PROFILING_INTERVAL_MS', DEFAULT_INTERVAL_MS),
+        max_files=app.config.get('PROFILING_MAX_FILES', DEFAULT_MAX_FILES),
+    )
+    app.extensions['request_profiler'] = profiler
+    if not profiler.enabled:
+        return None
+
+    def started(sender, **extra):
+        if profiler.wanted(request.headers):
+            g.profiling = True
+            profiler.start()
+
+    def finished(sender, response, **extra):
+        if not g.pop('profiling', False):
+            return
+        stacks = profiler.stop()
+        try:
+            profiler.save(request.endpoint or UNMATCHED_ENDPOINT, stacks)
+        except OSError as e:
+            logger.warning(f"Could not save request profile: {e}")
+
+    # Same signals as the request metrics, so the whole request including hooks is sampled
+    request_started.connect(started, app, weak=False)
+    request_finished.connect(finished, app, weak=False)
+
+    @app.teardown_request
+    def discard_unfinished_profile(exception=None):
+        # request_finished is not sent when an exception propagates (TESTING), so stop sampling here
+        if has_app_context() and g.pop('profiling', False):
+            profiler.stop()
+
+    return profiler
@@ -0,0 +1,209 @@
+"""
+Query Stats
+Per-request SQL query counts, DB time and repeated statement shapes, from SQLAlchemy engine events.
+
+Every statement run through a SQLAlchemy engine (the ORM, replicas, the
+rate limit storage) during a request is counted and timed. Statements
+are fingerprinted with literals and parameters replaced by '?', so the
+same query run once per row of a loop (an N+1) shows up as one
+fingerprint repeated many times. Raw PostgresConnector cursors are not
+seen.
+
+After each request the counts are checked against a budget:
+QUERY_BUDGET_MAX_QUERIES and QUERY_BUDGET_MAX_REPEATS by default, or
+the view's own @query_budget(...). QUERY_BUDGET_MODE decides what an
+overrun does: 'warn' logs it, 'raise' raises QueryBudgetExceeded (tests
+fail), 'off' skips the check. With QUERY_STATS_HEADER on (the default
+outside production) responses carry the numbers in X-DB-Queries and
+Server-Timing headers.
+
+Tests can also measure any block with `with count_queries() as stats:`
+and `stats.check(QueryBudget(...))`.
+"""
+
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUERIES = 50
+DEFAULT_MAX_REPEATS = 10
+
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\?")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+_collectors = contextvars.ContextVar('query_collectors', default=())
+_statement_observers = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block ran more queries, or repeated a statement more often, than its budget allows"""
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    max_queries: Optional[int] = DEFAULT_MAX_QUERIES  # None = no limit
+    max_repeats: Optional[int] = DEFAULT_MAX_REPEATS  # Runs of one statement shape; None = no limit
+
+
+def fingerprint(statement):
+    """The statement's shape: literals and parameters as '?', IN lists collapsed, whitespace normalised"""
+    shape = _QUOTED.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PARAM.sub('?', shape)
+    shape = _PARAM_LIST.sub('(?...)', shape)
+    return ' '.join(shape.split())
+
+
+class QueryStats:
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.pool_wait_seconds = 0.0  # Waiting for a free pooled connection (see db.TimedQueuePool)
+        self.fingerprints = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def most_repeated(self):
+        """(fingerprint, runs) of the most repeated statement shape, or (None, 0)"""
+        return self.fingerprints.most_common(1)[0] if self.fingerprints else (None, 0)
+
+    def violations(self, budget):
+        problems = []
+        if budget.max_queries is not None and self.count > budget.max_queries:
+            problems.append(f"{self.count} queries (budget {budget.max_queries})")
+        if budget.max_repeats is not None:
+            for shape, runs in self.fingerprints.most_common():
+                if runs <= budget.max_repeats:
+                    break
+                problems.append(f"statement repeated {runs} times (budget {budget.max_repeats}), "
+                                f"possible N+1: {shape[:200]}")
+        return problems
+
+    def check(self, budget, context="Query budget exceeded"):
+        problems = self.violations(budget)
+        if problems:
+            raise QueryBudgetExceeded(f"{context}: " + "; ".join(problems))
+
+
+@contextmanager
+def count_queries():
+    """Collect stats for every statement run in this block (and requests it makes through the test client)"""
+    stats = QueryStats()
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+def query_budget(max_queries=DEFAULT_MAX_QUERIES, max_repeats=DEFAULT_MAX_REPEATS):
+    """Give a view its own budget, replacing the app-wide default"""
+    def decorator(view):
+        view.query_budget = QueryBudget(max_queries, max_repeats)
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+def request_query_stats():
+    """This request's stats, created on first use so queries in every before_request hook count"""
+    if 'query_stats' not in g:
+        g.query_stats = QueryStats()
+    return g.query_stats
+
+
+def _active_stats():
+    stats = list(_collectors.get())
+    if has_request_context():
+        stats.append(request_query_stats())
+    return stats
+
+
+def add_statement_observer(observer):
+    """Call observer(conn, statement, parameters, executemany, seconds) after every statement"""
+    _statement_observers.append(observer)
+
+
+def record_pool_wait(seconds):
+    for collector in _active_stats():
+        collector.pool_wait_seconds += seconds
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started_at'].pop()
+    stats = _active_stats()
+    if stats or _statement_observers:
+        seconds = time.perf_counter() - started
+        for collector in stats:
+            collector.record(statement, seconds)
+        for observer in _statement_observers:
+            try:
+                observer(conn, statement, parameters, executemany, seconds)
+            except Exception:
+                # Instrumentation must never fail the query it watched
+                logger.exception("Statement observer failed")
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_timer(exception_context):
+    # after_cursor_execute is not called for a failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started_at'):
+        connection.info['query_started_at'].pop()
+
+
+def _endpoint_budget():
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    return budget or QueryBudget(current_app.config.get('QUERY_BUDGET_MAX_QUERIES', DEFAULT_MAX_QUERIES),
+                                 current_app.config.get('QUERY_BUDGET_MAX_REPEATS', DEFAULT_MAX_REPEATS))
+
+
+def init_query_stats(app):
+    """Count queries for each request of app and check them against the budgets"""
+
+    @app.after_request
+    def check_query_stats(response):
+        stats = request_query_stats()
+        if app.config.get('QUERY_STATS_HEADER'):
+            _, runs = stats.most_repeated()
+            response.headers['X-DB-Queries'] = f"count={stats.count}; time_ms={stats.seconds * 1000:.1f}; max_repeats={runs}"
+            response.headers.add('Server-Timing', f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"')
+        mode = app.config.get('QUERY_BUDGET_MODE', 'warn')
+        if mode != 'off':
+            problems = stats.violations(_endpoint_budget())
+            if problems:
+                message = f"{request.method} {request.path} ({request.endpoint}): " + "; ".join(problems)
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def discard_query_stats(exception=None):
+        # Request metrics (utils/metrics.py) read the stats before this runs. A test client's
+        # preserved request context can be torn down after its app context is gone
+        if has_app_context():
+            g.pop('query_stats', None)
@@ -0,0 +1,208 @@
+"""
+Rate Limit Storage
+Flask-Limiter counters shared by every gunicorn worker and host.
+
+With memory:// each worker counts on its own, so four workers allow four
+times every limit, and a reload resets them all. PostgresRateLimitStorage
+keeps the counters in an UNLOGGED table. Counters are throwaway, so skipping
+the WAL makes writes cheap; the table is emptied after a Postgres crash.
+
+Every hit is a single atomic upsert (INSERT ... ON CONFLICT DO UPDATE ...
+RETURNING), so concurrent workers can never both take the last slot.
+Fixed-window and sliding-window-counter strategies are supported; the
+moving window needs one row per hit and is not.
+
+Registered with limits as the ratelimit+postgresql:// scheme. Any other
+limits backend (e.g. redis://) can be used through RATELIMIT_STORAGE_URI.
+
+The app passes its own engine (the `engine` storage option), so counters use
+the single per-process pool sized by DBConfig; each hit holds a connection
+only for its one statement. Without that option, e.g. in scripts and
+benchmarks, the storage opens a small pool of its own.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from limits.storage import Storage, SlidingWindowCounterSupport
+from limits.storage.base import TimestampedSlidingWindow
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+SCHEME = 'ratelimit+postgresql'
+TABLE = 'rate_limit_counter'
+PURGE_INTERVAL_SECONDS = 60  # Minimum gap between purges of expired counters per worker
+
+# Epoch seconds on the database clock, so every host agrees on when windows end
+_NOW = "extract(epoch from clock_timestamp())"
+
+_CREATE_TABLE = text(f"""
+    CREATE UNLOGGED TABLE IF NOT EXISTS {TABLE} (
+        key text PRIMARY KEY,
+        count integer NOT NULL,
+        expires_at double precision NOT NULL
+    )
+""")
+
+# A row past its expiry starts a new window instead of adding to the old one
+_INCR = text(f"""
+    INSERT INTO {TABLE} AS c (key, count, expires_at)
+    VALUES (:key, :amount, {_NOW} + :expiry)
+    ON CONFLICT (key) DO UPDATE SET
+        count = CASE WHEN c.expires_at <= {_NOW} THEN excluded.count ELSE c.count + excluded.count END,
+        expires_at = CASE WHEN c.expires_at <= {_NOW} THEN excluded.expires_at ELSE c.expires_at END
+    RETURNING count
+""")
+
+_DECR = text(f"UPDATE {TABLE} SET count = greatest(count - :amount, 0) WHERE key = :key AND expires_at > {_NOW} "
+             "RETURNING count")
+_GET = text(f"SELECT count, expires_at FROM {TABLE} WHERE key = :key AND expires_at > {_NOW}")
+_GET_MANY = text(f"SELECT key, count FROM {TABLE} WHERE key IN (:previous, :current) AND expires_at > {_NOW}")
+_CLEAR = text(f"DELETE FROM {TABLE} WHERE key = :key")
+_RESET = text(f"DELETE FROM {TABLE}")
+_PURGE = text(f"DELETE FROM {TABLE} WHERE expires_at <= {_NOW}")
+
+
+def database_storage_uri(database_url):
+    """Rate limit storage URI for the app database, e.g. from DATABASE_URL"""
+    return f"{SCHEME}://{database_url.split('://', 1)[1]}"
+
+
+class PostgresRateLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """limits storage backed by the UNLOGGED rate_limit_counter table"""
+
+    STORAGE_SCHEME = [SCHEME]
+
+    def __init__(self, uri, wrap_exceptions=False, pool_size=2, purge_interval=PURGE_INTERVAL_SECONDS, engine=None,
+                 **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.url = make_url(uri).set(drivername='postgresql+psycopg2')
+        # An Engine, or a callable returning one (e.g. the app's db.engine, resolved on first use)
+        self.engine_source = engine
+        self.pool_size = int(pool_size)
+        self.purge_interval = float(purge_interval)
+        self._last_purge = time.monotonic()
+        self._engine = None
+        self._engine_pid = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    @property
+    def engine(self):
+        # Resolved per process: connections inherited through a fork must not be shared with the parent
+        if self._engine is None or self._engine_pid != os.getpid():
+            with self._engine_lock:
+                if self._engine is None or self._engine_pid != os.getpid():
+                    engine = self._resolve_engine()
+                    with self._connect(engine) as conn:
+                        conn.execute(_CREATE_TABLE)
+                    self._engine, self._engine_pid = engine, os.getpid()
+        return self._engine
+
+    def _resolve_engine(self):
+        if isinstance(self.engine_source, Engine):
+            return self.engine_source
+        if self.engine_source is not None:
+            return self.engine_source()
+        # No shared engine given: a small pool of its own
+        return create_engine(self.url, pool_size=self.pool_size, max_overflow=self.pool_size, pool_pre_ping=True)
+
+    @staticmethod
+    def _connect(engine):
+        # Each statement commits on its own; the pool restores the isolation level on checkin
+        return engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+    def _execute(self, statement, **params):
+        with self._connect(self.engine) as conn:
+            return conn.execute(statement, params).fetchall()
+
+    def _execute_no_result(self, statement, **params):
+        with self._connect(self.engine) as conn:
+            conn.execute(statement, params)
+
+    def incr(self, key, expiry, amount=1):
+        self._maybe_purge()
+        return self._execute(_INCR, key=key, expiry=float(expiry), amount=amount)[0][0]
+
+    def decr(self, key, amount=1):
+        rows = self._execute(_DECR, key=key, amount=amount)
+        return rows[0][0] if rows else 0
+
+    def get(self, key):
+        rows = self._execute(_GET, key=key)
+        return rows[0][0] if rows else 0
+
+    def get_expiry(self, key):
+        rows = self._execute(_GET, key=key)
+        return rows[0][1] if rows else time.time()
+
+    def clear(self, key):
+        self._execute_no_result(_CLEAR, key=key)
+
+    def check(self):
+        try:
+            self._execute(text("SELECT 1"))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self):
+        with self._connect(self.engine) as conn:
+            return conn.execute(_RESET).rowcount
+
+    def purge_expired(self):
+        """Delete counters whose window has ended. Returns the number removed."""
+        with self._connect(self.engine) as conn:
+            return conn.execute(_PURGE).rowcount
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_count, previous_ttl, current_count, _ = self._sliding_window(key, expiry, now)
+        if int(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+            return False
+        # The previous window still weighs on this one, so keep the current
+        # counter for two windows
+        current_key = self.sliding_window_keys(key, expiry, now)[1]
+        current_count = self.incr(current_key, 2 * expiry, amount=amount)
+        if int(previous_count * previous_ttl / expiry + current_count) > limit:
+            # Another worker took the last slot between the read and the upsert
+            self.decr(current_key, amount)
+            return False
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        return self._sliding_window(key, expiry, time.time())
+
+    def _sliding_window(self, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(self._execute(_GET_MANY, previous=previous_key, current=current_key))
+        previous_count = counts.get(previous_key, 0)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, counts.get(current_key, 0), current_ttl
+
+    def clear_sliding_window(self, key, expiry):
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            removed = self.purge_expired()
+            if removed:
+                logger.info(f"Purged {removed} expired rate limit counters.")
+        except SQLAlchemyError as e:
+            logger.warning(f"Rate limit counter purge failed: {e}")
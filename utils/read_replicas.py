@@ -0,0 +1,202 @@
+"""
+Read Replicas
+Sends read-only ORM queries to Postgres streaming replicas, everything else to the primary.
+
+Reads only go to a replica inside an explicit read-only scope: a view or
+controller method decorated with @read_only, or a `with read_only():` block.
+@primary / `with primary():` ends the scope again, e.g. for results that are
+cached, which must not be built from data that is seconds old.
+Within a scope the session still uses the primary for:
+  - flushes, UPDATE/DELETE/INSERT, SELECT ... FOR UPDATE and text() SQL
+  - any query after the session has written in its current transaction
+  - requests within DATABASE_REPLICA_MAX_LAG_SECONDS of this browser
+    session's last committed write, so users read their own writes
+
+Each replica's replay lag is measured at most once per
+DATABASE_REPLICA_LAG_CHECK_SECONDS per worker. Replicas lagging more than
+DATABASE_REPLICA_MAX_LAG_SECONDS, or that cannot be reached, are skipped
+until they catch up; with none usable, reads fall back to the primary.
+Healthy replicas are used in turn.
+
+Lag is the age of the last replayed transaction while WAL is still being
+replayed. A replica that has not yet *received* recent WAL reports no lag,
+so the read-your-writes window above covers that case for the writer.
+"""
+
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql import Select
+
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_LAG_SECONDS = 5.0
+DEFAULT_LAG_CHECK_SECONDS = 1.0
+CONNECT_TIMEOUT_SECONDS = 3  # An unreachable replica must not stall requests for long
+STICKY_SESSION_KEY = '_db_primary_until'
+
+# NULL while the lag is unknown (no transaction replayed yet with WAL outstanding)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+_read_only = contextvars.ContextVar('read_only', default=False)
+
+
+@contextmanager
+def _scope(replica_allowed):
+    token = _read_only.set(replica_allowed)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def _scoped(replica_allowed, func):
+    if func is None:
+        return _scope(replica_allowed)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _scope(replica_allowed):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def read_only(func=None):
+    """Allow reads to use a replica: `@read_only` on a function, or `with read_only():`"""
+    return _scoped(True, func)
+
+
+def primary(func=None):
+    """Keep reads on the primary even inside a read-only scope: `@primary` or `with primary():`"""
+    return _scoped(False, func)
+
+
+class ReplicaRouter:
+
+    def __init__(self, urls, engine_options=None, max_lag_seconds=DEFAULT_MAX_LAG_SECONDS,
+                 lag_check_seconds=DEFAULT_LAG_CHECK_SECONDS):
+        options = dict(engine_options or {})
+        options['connect_args'] = {'connect_timeout': CONNECT_TIMEOUT_SECONDS, **options.get('connect_args', {})}
+        self.engines = [create_engine(url, **options) for url in urls]
+        self.max_lag_seconds = max_lag_seconds
+        self._lag = TTLCache(lag_check_seconds, max_entries=max(len(self.engines), 1))
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._counts = {'replica_reads': 0, 'primary_fallbacks': 0}
+
+    @classmethod
+    def from_config(cls, config, engine_options=None):
+        """Router for DATABASE_REPLICA_URLS, or None when no replicas are configured"""
+        urls = [url.strip() for url in (config.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+        if not urls:
+            return None
+        return cls(urls, engine_options,
+                   max_lag_seconds=config.get('DATABASE_REPLICA_MAX_LAG_SECONDS', DEFAULT_MAX_LAG_SECONDS),
+                   lag_check_seconds=config.get('DATABASE_REPLICA_LAG_CHECK_SECONDS', DEFAULT_LAG_CHECK_SECONDS))
+
+    def _measure_lag(self, engine):
+        try:
+            with engine.connect() as conn:
+                lag = conn.execute(REPLICA_LAG_SQL).scalar()
+        except Exception as e:
+            logger.warning(f"Read replica {engine.url.host}:{engine.url.port} unavailable: {e}")
+            return None
+        return float(lag) if lag is not None else None
+
+    def lag(self, index):
+        """Replay lag of replica `index` in seconds (cached), None if unknown or unreachable"""
+        engine = self.engines[index]
+        return self._lag.get_or_set(index, lambda: self._measure_lag(engine))
+
+    def usable(self):
+        return [engine for index, engine in enumerate(self.engines)
+                if (lag := self.lag(index)) is not None and lag <= self.max_lag_seconds]
+
+    def choose(self):
+        """A replica within the lag limit, taking turns between them; None to use the primary"""
+        engines = self.usable()
+        with self._lock:
+            if not engines:
+                self._counts['primary_fallbacks'] += 1
+                return None
+            self._counts['replica_reads'] += 1
+            return engines[next(self._turn) % len(engines)]
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['replica_lag_seconds'] = [self.lag(index) for index in range(len(self.engines))]
+        return counts
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
+
+
+def get_replica_router():
+    """The app's replica router, None when replicas are not configured"""
+    return current_app.extensions.get('read_replicas') if has_app_context() else None
+
+
+def _recently_wrote():
+    return has_request_context() and flask_session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+class RoutingSession(Session):
+    """db.session class: routes reads in a read-only scope to a replica (see module docstring)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+                self.info['wrote'] = True
+            elif (
+                _read_only.get()
+                and isinstance(clause, Select)
+                and clause._for_update_arg is None
+                and not self.info.get('wrote')
+                and not _recently_wrote()
+            ):
+                router = get_replica_router()
+                engine = router.choose() if router else None
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _keep_writer_on_primary(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        router = get_replica_router()
+        if router:
+            # Until replicas within the lag limit must have this commit
+            flask_session[STICKY_SESSION_KEY] = time.time() + router.max_lag_seconds
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_rolled_back_writes(session):
+    session.info.pop('wrote', None)
+
+
+def init_read_replicas(app, engine_options=None):
+    """Create the replica router from config, if DATABASE_REPLICA_URLS is set"""
+    router = ReplicaRouter.from_config(app.config, engine_options)
+    if router:
+        app.extensions['read_replicas'] = router
+        logger.info(f"Read replicas: {len(router.engines)}, max lag {router.max_lag_seconds}s")
+    return router
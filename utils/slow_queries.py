@@ -0,0 +1,244 @@
+"""
+Slow Query Log
+Statements slower than SLOW_QUERY_THRESHOLD_MS, with sampled EXPLAIN (ANALYZE, BUFFERS) plans.
+
+Each slow statement is written as one JSON line with:
+  - its fingerprint (see utils/query_stats.py)
+  - its parameters, redacted: strings and bytes become their type and
+    length; numbers, booleans, dates and NULLs are kept
+  - its duration, the database host, and the endpoint that ran it
+Request paths are not logged because they can carry tokens.
+
+Every worker writes to its own rotating file in SLOW_QUERY_LOG_DIR
+(slow-queries-<pid>.log, SLOW_QUERY_LOG_MAX_BYTES, with
+SLOW_QUERY_LOG_BACKUPS old files). A single file shared by processes
+cannot be rotated safely. The admin page reads them all.
+
+A SLOW_QUERY_EXPLAIN_SAMPLE_RATE fraction of slow plain SELECTs (never
+DML or locking reads) is re-run as EXPLAIN (ANALYZE, BUFFERS) by a
+background thread. Each one runs on its own connection, in a READ ONLY
+transaction with a statement timeout, and is then rolled back. The plan
+is written as a second line with the same id. The EXPLAIN queue is
+bounded; when it is full, samples are dropped rather than slowing
+requests.
+"""
+
+import datetime
+import decimal
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import has_request_context, request
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from utils.query_stats import add_statement_observer, fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+DEFAULT_EXPLAIN_TIMEOUT_MS = 10000
+EXPLAIN_QUEUE_SIZE = 100
+
+_READ_ONLY_SELECT = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES_OR_LOCKS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(NO\s+KEY\s+)?UPDATE|FOR\s+(KEY\s+)?SHARE)\b", re.IGNORECASE
+)
+
+
+def redact(value):
+    """A parameter value safe to log"""
+    if value is None or isinstance(value, (bool, int, float, decimal.Decimal)):
+        return value if not isinstance(value, decimal.Decimal) else float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters, executemany=False):
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+
+def explainable(statement):
+    return bool(_READ_ONLY_SELECT.match(statement)) and not _WRITES_OR_LOCKS.search(statement)
+
+
+class SlowQueryLog:
+
+    def __init__(self, directory, threshold_ms=DEFAULT_THRESHOLD_MS, max_bytes=DEFAULT_MAX_BYTES,
+                 backup_count=DEFAULT_BACKUPS, explain_sample_rate=0.0,
+                 explain_timeout_ms=DEFAULT_EXPLAIN_TIMEOUT_MS, connect_args=None):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_timeout_ms = explain_timeout_ms
+        self.connect_args = connect_args or {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file_logger = None
+        self._explain_queue = None
+        self._explain_engines = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _for_this_process(self):
+        """File and EXPLAIN thread of this process (gunicorn forks workers after import)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                handler = logging.handlers.RotatingFileHandler(
+                    os.path.join(self.directory, f"slow-queries-{self._pid}.log"),
+                    maxBytes=self.max_bytes, backupCount=self.backup_count, delay=True
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self._file_logger = logging.getLogger(f"{__name__}.{self._pid}")
+                self._file_logger.handlers = [handler]
+                self._file_logger.setLevel(logging.INFO)
+                self._file_logger.propagate = False
+                self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+                self._explain_engines = {}
+                if self.explain_sample_rate > 0:
+                    threading.Thread(target=self._explain_worker, name='slow-query-explain', daemon=True).start()
+            return self._file_logger, self._explain_queue
+
+    def _write(self, entry):
+        file_logger, _ = self._for_this_process()
+        file_logger.info(json.dumps(entry, default=str))
+
+    def observe(self, conn, statement, parameters, executemany, seconds):
+        """Statement observer: log statements over the threshold"""
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        url = conn.engine.url
+        entry = {
+            'type': 'query',
+            'id': uuid.uuid4().hex[:12],
+            'at': datetime.datetime.utcnow().isoformat(timespec='milliseconds'),
+            'pid': os.getpid(),
+            'duration_ms': round(duration_ms, 1),
+            'database': f"{url.host}:{url.port or 5432}/{url.database}",
+            'endpoint': request.endpoint if has_request_context() else None,
+            'method': request.method if has_request_context() else None,
+            'fingerprint': fingerprint(statement),
+            'params': redact_parameters(parameters, executemany),
+        }
+        if (not executemany and self.explain_sample_rate > 0 and explainable(statement)
+                and random.random() < self.explain_sample_rate):
+            _, explain_queue = self._for_this_process()
+            try:
+                explain_queue.put_nowait((entry['id'], url, statement, parameters))
+                entry['explain'] = 'pending'
+            except queue.Full:
+                entry['explain'] = 'skipped: queue full'
+        self._write(entry)
+
+    def _explain_engine(self, url):
+        key = url.render_as_string(hide_password=False)
+        if key not in self._explain_engines:
+            # One short-lived connection per plan; nothing held between samples
+            self._explain_engines[key] = create_engine(url, poolclass=NullPool, connect_args=self.connect_args)
+        return self._explain_engines[key]
+
+    def explain(self, url, statement, parameters):
+        """EXPLAIN (ANALYZE, BUFFERS) output for the statement as text"""
+        with self._explain_engine(url).connect() as conn:
+            # The DBAPI cursor bypasses engine events, so this is neither counted nor logged itself
+            dbapi_connection = conn.connection.dbapi_connection
+            try:
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+                    return "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                dbapi_connection.rollback()
+
+    def _explain_worker(self):
+        explain_queue = self._explain_queue
+        while True:
+            entry_id, url, statement, parameters = explain_queue.get()
+            started = time.perf_counter()
+            try:
+                plan = {'plan': self.explain(url, statement, parameters)}
+            except Exception as e:
+                plan = {'error': f"{type(e).__name__}: {e}"}
+            self._write({'type': 'explain', 'id': entry_id,
+                         'explain_ms': round((time.perf_counter() - started) * 1000, 1), **plan})
+
+    def recent(self, limit=100):
+        """Newest slow queries from every worker's files, each with its plan if one was captured"""
+        entries, plans = [], {}
+        for path in glob.glob(os.path.join(self.directory, 'slow-queries-*.log*')):
+            try:
+                with open(path) as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # Partly written line
+                if item.get('type') == 'explain':
+                    plans[item['id']] = item
+                elif item.get('type') == 'query':
+                    entries.append(item)
+        entries.sort(key=lambda item: item['at'], reverse=True)
+        entries = entries[:limit]
+        for entry in entries:
+            if entry['id'] in plans:
+                entry['explain'] = plans[entry['id']]
+        return entries
+
+    @staticmethod
+    def summarize(entries):
+        """Per fingerprint: count, total and max duration, slowest first"""
+        groups = {}
+        for entry in entries:
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['endpoints'].add(entry['endpoint'] or '-')
+        return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+
+def init_slow_query_log(app, connect_args=None):
+    """Log statements from every engine that take SLOW_QUERY_THRESHOLD_MS or longer"""
+    slow_query_log = SlowQueryLog(
+        app.config['SLOW_QUERY_LOG_DIR'],
+        threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'],
+        max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', DEFAULT_MAX_BYTES),
+        backup_count=app.config.get('SLOW_QUERY_LOG_BACKUPS', DEFAULT_BACKUPS),
+        explain_sample_rate=app.config.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.0),
+        explain_timeout_ms=app.config.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', DEFAULT_EXPLAIN_TIMEOUT_MS),
+        connect_args=connect_args,
+    )
+    add_statement_observer(slow_query_log.observe)
+    app.extensions['slow_query_log'] = slow_query_log
+    return slow_query_log
@@ -0,0 +1,74 @@
+"""
+TTL Cache
+Small thread-safe, per-process cache with time-based expiry and a size bound.
+Each gunicorn worker holds its own copy, so only cache data where a few
+seconds of staleness between workers is acceptable.
+"""
+
+import threading
+import time
+
+
+class TTLCache:
+
+    def __init__(self, ttl_seconds, max_entries=10000, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if self._clock() >= entry[0]:
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict()
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for key, computing and caching it with factory() on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        # Drop expired entries first; if still full, drop the entries closest to expiry
+        now = self._clock()
+        for key in [key for key, entry in self._entries.items() if now >= entry[0]]:
+            del self._entries[key]
+        overflow = len(self._entries) - self.max_entries + 1
+        if overflow > 0:
+            oldest = sorted(self._entries, key=lambda key: self._entries[key][0])[:overflow]
+            for key in oldest:
+                del self._entries[key]
+
+
+_MISSING = object()
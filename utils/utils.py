@@ -1,14 +1,12 @@
 # utils.py
-import smtplib
 import secrets
 import datetime
 import random
 import re
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from flask import url_for, current_app
 from blueprint.models import User, db
+from utils.email_outbox import enqueue_email
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 
 
@@ -98,10 +96,9 @@ def send_reset_email(user):
         reset_token = generate_verification_token()  # Reuse secure token generation
         expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)  # 1 hour expiry for security
         
-        # Update user with reset token
+        # Update user with reset token (committed below with the queued email)
         user.password_reset_token = reset_token
         user.password_reset_token_expires = expires_at
-        db.session.commit()
         
         # Create reset URL
         reset_url = url_for('auth.reset_password', token=reset_token, _external=True)
@@ -142,20 +139,9 @@ Safe Companion Team
         print(f"Token expires: {expires_at}")
         print(f"{'='*60}\n")
         
-        # In production, send actual email here
-        # For now, we'll use the same email function as verification
-        from flask import current_app
-        try:
-            # Try to use SES if available
-            from blueprint.auth import send_email_ses
-            success = send_email_ses(user.email, subject, body_text, body_html)
-            if success:
-                return True
-        except:
-            pass
-        
-        # Fallback to console output for development
-        print("📧 Password reset email would be sent via email system")
+        # Queued for the email worker, in the same transaction as the token
+        enqueue_email(user.email, subject, body_text, body_html)
+        db.session.commit()
         return True
         
     except Exception as e:
@@ -208,39 +194,16 @@ def verify_captcha(response):
 
 def send_email(to_email, subject, body):
     """
-    Send email using SMTP (for production use)
-    This is a placeholder implementation
+    Queue a plain-text email for the email worker (see utils/email_outbox.py).
+    Commits the current session.
     """
     try:
-        # Configure your SMTP settings - ALL VALUES MUST BE IN ENVIRONMENT VARIABLES
-        smtp_server = os.getenv('SMTP_SERVER')
-        smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        smtp_username = os.getenv('SMTP_USERNAME')
-        smtp_password = os.getenv('SMTP_PASSWORD')
-        
-        # Validate SMTP configuration
-        if not all([smtp_server, smtp_username, smtp_password]):
-            print("❌ WARNING: SMTP not configured. Email functionality disabled.")
-            print("Set SMTP_SERVER, SMTP_USERNAME, and SMTP_PASSWORD environment variables.")
-            return False
-        
-        msg = MIMEMultipart()
-        msg['From'] = smtp_username
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        text = msg.as_string()
-        server.sendmail(smtp_username, to_email, text)
-        server.quit()
-        
+        enqueue_email(to_email, subject, body)
+        db.session.commit()
         return True
     except Exception as e:
-        print(f"Error sending email: {e}")
+        db.session.rollback()
+        print(f"Error queueing email: {e}")
         return False
 
 